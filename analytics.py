@@ -0,0 +1,206 @@
+"""
+论文统计（物化视图）
+
+每篇论文拆解出的统计要素保存在 publication_facts 中，汇总结果保存在两张表里：
+    publication_stats  按维度计数：year / type / venue / author
+    coauthor_edges     合作者关系（author_a < author_b），weight 为合作论文数
+论文增删改时只对这一篇论文做增量：减去 publication_facts 中记录的旧贡献，再加上新贡献，
+因此通过路由、批量导入还是副本同步写入都能得到同样的结果。/api/analytics/publications 只读汇总表。
+"""
+
+import json
+import re
+from collections import Counter
+
+from database import get_db_connection, pooled_connection
+from resources import PUBLICATIONS, after_commit, on_write
+
+# 作者分隔符：逗号、分号、顿号以及英文 " and "
+_AUTHOR_SEPARATORS = re.compile(r'\s*(?:[,，;；、]|\band\b|&)\s*')
+# 通讯作者、共同一作等标记
+_AUTHOR_MARKS = re.compile(r'[*†‡#]+')
+# 超过该人数的大型合作论文不展开合作者关系（边数按作者数平方增长）
+MAX_AUTHORS_FOR_EDGES = 30
+
+def parse_authors(value):
+    """拆分作者字符串，去除标记和重复"""
+    if not value:
+        return []
+    authors = []
+    seen = set()
+    for part in _AUTHOR_SEPARATORS.split(str(value)):
+        name = ' '.join(_AUTHOR_MARKS.sub('', part).split())
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            authors.append(name)
+    return authors
+
+
+def _facts(row):
+    """从论文记录中提取统计要素"""
+    venue = ' '.join((row['journal'] or '').split())
+    return {
+        'year': row['year'],
+        'type': row['type'] or 'journal',
+        'venue': venue or None,
+        'authors': parse_authors(row['authors']),
+    }
+
+
+def _contributions(facts):
+    """一篇论文对各汇总表的贡献：(维度计数, 合作者边)"""
+    stats = Counter()
+    edges = Counter()
+    if facts is None:
+        return stats, edges
+    if facts['year'] is not None:
+        stats[('year', str(facts['year']))] += 1
+    stats[('type', facts['type'])] += 1
+    if facts['venue']:
+        stats[('venue', facts['venue'])] += 1
+    authors = facts['authors']
+    for author in authors:
+        stats[('author', author)] += 1
+    if len(authors) <= MAX_AUTHORS_FOR_EDGES:
+        for i, a in enumerate(authors):
+            for b in authors[i + 1:]:
+                edges[(a, b) if a < b else (b, a)] += 1
+    return stats, edges
+
+
+def _apply(conn, stats, edges):
+    """把增量写入汇总表，计数归零的行直接删除"""
+    if stats:
+        conn.executemany('''
+            INSERT INTO publication_stats (dimension, key, count) VALUES (?, ?, ?)
+            ON CONFLICT (dimension, key) DO UPDATE SET count = count + excluded.count
+        ''', [(d, k, n) for (d, k), n in stats.items() if n])
+        conn.executemany('DELETE FROM publication_stats WHERE dimension = ? AND key = ? AND count <= 0',
+                         [(d, k) for (d, k), n in stats.items() if n < 0])
+    if edges:
+        conn.executemany('''
+            INSERT INTO coauthor_edges (author_a, author_b, weight) VALUES (?, ?, ?)
+            ON CONFLICT (author_a, author_b) DO UPDATE SET weight = weight + excluded.weight
+        ''', [(a, b, n) for (a, b), n in edges.items() if n])
+        conn.executemany('DELETE FROM coauthor_edges WHERE author_a = ? AND author_b = ? AND weight <= 0',
+                         [(a, b) for (a, b), n in edges.items() if n < 0])
+
+
+def _load_facts(conn, publication_id):
+    row = conn.execute('SELECT year, type, venue, authors FROM publication_facts WHERE publication_id = ?',
+                       (publication_id,)).fetchone()
+    if row is None:
+        return None
+    return {'year': row[0], 'type': row[1], 'venue': row[2], 'authors': json.loads(row[3] or '[]')}
+
+
+def sync_publication(conn, publication_id, row):
+    """按论文的当前内容（row 为 None 表示已删除）增量更新汇总表"""
+    old = _load_facts(conn, publication_id)
+    new = _facts(row) if row is not None else None
+    if old == new:
+        return
+    old_stats, old_edges = _contributions(old)
+    stats, edges = _contributions(new)
+    stats.subtract(old_stats)
+    edges.subtract(old_edges)
+    _apply(conn, stats, edges)
+    if new is None:
+        conn.execute('DELETE FROM publication_facts WHERE publication_id = ?', (publication_id,))
+    else:
+        conn.execute('INSERT OR REPLACE INTO publication_facts (publication_id, year, type, venue, authors) '
+                     'VALUES (?, ?, ?, ?, ?)',
+                     (publication_id, new['year'], new['type'], new['venue'],
+                      json.dumps(new['authors'], ensure_ascii=False)))
+
+
+def rebuild(conn):
+    """从 publications 表全量重建（调用方负责提交）"""
+    conn.execute('DELETE FROM publication_facts')
+    conn.execute('DELETE FROM publication_stats')
+    conn.execute('DELETE FROM coauthor_edges')
+    stats = Counter()
+    edges = Counter()
+    facts_rows = []
+    cursor = conn.execute('SELECT id, year, type, journal, authors FROM publications')
+    for row in cursor:
+        facts = _facts(row)
+        row_stats, row_edges = _contributions(facts)
+        stats.update(row_stats)
+        edges.update(row_edges)
+        facts_rows.append((row['id'], facts['year'], facts['type'], facts['venue'],
+                           json.dumps(facts['authors'], ensure_ascii=False)))
+    conn.executemany('INSERT INTO publication_facts (publication_id, year, type, venue, authors) '
+                     'VALUES (?, ?, ?, ?, ?)', facts_rows)
+    _apply(conn, stats, edges)
+    return len(facts_rows)
+
+
+def _fetch_row(conn, publication_id):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    row = cursor.execute('SELECT year, type, journal, authors FROM publications WHERE id = ?',
+                         (publication_id,)).fetchone()
+    return dict(zip(('year', 'type', 'journal', 'authors'), row)) if row else None
+
+
+@on_write
+def _on_write(conn, resource, action, item_id, old, new):
+    if resource is PUBLICATIONS:
+        sync_publication(conn, item_id, new)
+
+
+@after_commit
+def _on_commit(resource, action, item_id):
+    if resource is not PUBLICATIONS or action not in ('import', 'replicate'):
+        return
+    with pooled_connection() as conn:
+        if item_id is None:
+            rebuild(conn)
+        else:
+            sync_publication(conn, item_id, _fetch_row(conn, item_id))
+
+
+def publication_summary(conn, top_venues=10, top_authors=50):
+    """汇总结果：按年份、类型计数，主要发表渠道，合作者网络（前 top_authors 位作者之间的关系）"""
+    def top(dimension, limit=-1):
+        return [tuple(row) for row in conn.execute(
+            'SELECT key, count FROM publication_stats WHERE dimension = ? ORDER BY count DESC, key LIMIT ?',
+            (dimension, limit)).fetchall()]
+
+    by_type = top('type')
+    authors = top('author', top_authors)
+    names = {name for name, _ in authors}
+    edges = []
+    if names:
+        placeholders = ', '.join('?' for _ in names)
+        edges = conn.execute(f'''
+            SELECT author_a, author_b, weight FROM coauthor_edges
+            WHERE author_a IN ({placeholders}) AND author_b IN ({placeholders})
+            ORDER BY weight DESC
+        ''', (*names, *names)).fetchall()
+
+    return {
+        'total': sum(count for _, count in by_type),
+        'by_year': [{'year': int(k) if k.isdigit() else k, 'count': n} for k, n in sorted(top('year'))],
+        'by_type': [{'type': k, 'count': n} for k, n in by_type],
+        'top_venues': [{'venue': k, 'count': n} for k, n in top('venue', top_venues)],
+        'coauthors': {
+            'nodes': [{'name': k, 'count': n} for k, n in authors],
+            'edges': [{'source': a, 'target': b, 'weight': w} for a, b, w in edges],
+        },
+    }
+
+
+def init_analytics():
+    """汇总表与论文数量不一致时（首次升级或直接写库生成的数据）重建"""
+    conn = get_db_connection()
+    try:
+        publications = conn.execute('SELECT COUNT(*) FROM publications').fetchone()[0]
+        facts = conn.execute('SELECT COUNT(*) FROM publication_facts').fetchone()[0]
+        if publications != facts:
+            count = rebuild(conn)
+            conn.commit()
+            print(f"Publication analytics rebuilt: {count} publications")
+    finally:
+        conn.close()
@@ -1,15 +1,34 @@
-from flask import Flask, request, jsonify, session, render_template, redirect, url_for, send_from_directory
-import hashlib
+from flask import Flask, request, jsonify, session, render_template, redirect, url_for, send_from_directory, Response, stream_with_context
 import os
 import random
 import string
 from io import BytesIO
 import base64
 from functools import wraps
-from database import get_db_connection, init_database, create_default_profile
+from database import get_db_connection, init_database, create_default_profile, pooled_connection
+from metrics import init_metrics, render_prometheus
+from ratelimit import init_rate_limits
+from passwords import HasherBusy, hash_password, verify_password, verify_dummy
+import query_trace
+from resources import register_resources
+import transfer
+import snapshots
+import changelog
+import live_events
+import tag_index
+import analytics
+import related
+import tenants
+import offline
+import rum
+import image_cache
+import syndication
+import jobs
+import doi
 import markdown
 import json
 from datetime import datetime
+from urllib.parse import urlencode
 
 # 尝试导入PIL用于生成验证码图片
 try:
@@ -20,28 +39,91 @@ except ImportError:
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+# 列表接口的序列化方式：sqlite（在SQLite内生成JSON）或 python（逐行组装后 jsonify）
+app.config['JSON_SERIALIZATION'] = os.environ.get('JSON_SERIALIZATION', 'sqlite')
+# 只读副本：拒绝所有写请求，数据由 run.py replicate 从主节点同步
+app.config['READ_ONLY'] = os.environ.get('READ_ONLY', '0') == '1'
+# 前台页面通过 /media/remote 显示外部图片（友情链接头像等），由服务器下载缓存
+app.config['IMAGE_PROXY'] = os.environ.get('IMAGE_PROXY', '1') == '1'
+
+def init_site():
+    """初始化当前数据库：默认站点在启动时调用，多站点模式下每个站点在首次访问时调用"""
+    init_database()
+    create_default_profile()
+
+    # 标签索引（首次升级时从已有的标签字段回填）
+    tag_index.init_tag_index()
+
+    # 论文统计物化表（与论文数量不一致时重建）
+    analytics.init_analytics()
+
+    # 相关论文/项目推荐的后台重算线程（启动时检查已有结果是否过期）
+    if os.environ.get('WERKZEUG_RUN_MAIN', 'true') == 'true':
+        related.init_related()
+
+        # 外部图片缓存：登记内容中的外部图片地址，后台下载尚未缓存或已过期的图片
+        if app.config['IMAGE_PROXY']:
+            image_cache.init_image_cache()
+
+        # 后台任务队列轮询该数据库（重启前未完成的任务继续执行）
+        jobs.runner.watch()
 
 # 确保数据库初始化
-init_database()
-create_default_profile()
+init_site()
+
+# 请求耗时、状态码、数据库耗时等指标采集
+init_metrics(app)
+
+# 按 IP / 用户名的令牌桶限流，登录和验证码接口的全局并发上限
+init_rate_limits(app)
+
+# 多站点托管（TENANT_MODE=host/path）：按域名或路径前缀把请求映射到各自的数据库文件
+tenants.init_tenants(app, init_site)
+
+# 接口响应附带内容版本号（前台 Service Worker 的缓存依据）
+offline.init_offline(app)
+
+# 后台任务队列的工作线程
+if os.environ.get('WERKZEUG_RUN_MAIN', 'true') == 'true':
+    jobs.runner.start()
+
+# 真实用户性能数据：上报接口只写内存缓冲区，由后台线程批量写入数据库
+rum.init_rum(app)
+if app.config['RUM_ENABLED'] and os.environ.get('WERKZEUG_RUN_MAIN', 'true') == 'true':
+    rum.collector.start()
+
+# SQL追踪与慢查询日志
+query_trace.init_query_trace()
+
+# 定时在线快照（SNAPSHOT_INTERVAL 秒，0 表示关闭）；调试模式下只在重载后的子进程中启动
+if int(os.environ.get('SNAPSHOT_INTERVAL', '0')) > 0 and os.environ.get('WERKZEUG_RUN_MAIN', 'true') == 'true':
+    snapshots.start_snapshot_scheduler(int(os.environ['SNAPSHOT_INTERVAL']))
+
+# 实时推送服务器（SSE_PORT，0 表示关闭，此时 /api/events 由 Flask 直接输出）
+if int(os.environ.get('SSE_PORT', '0')) > 0 and os.environ.get('WERKZEUG_RUN_MAIN', 'true') == 'true':
+    live_events.start_server(os.environ.get('SSE_HOST', '0.0.0.0'), int(os.environ['SSE_PORT']))
+
+@app.before_request
+def reject_writes_on_replica():
+    """只读副本不接受写请求"""
+    # 性能数据只写入本地的 rum_* 表，不进入变更日志，副本上同样接收
+    if app.config['READ_ONLY'] and request.method not in ('GET', 'HEAD', 'OPTIONS') \
+            and request.endpoint != 'collect_rum':
+        return jsonify({'error': 'This node is a read-only replica'}), 403
+
+def is_admin():
+    """当前会话是否已登录为本站点的管理员（多站点模式下会话只对登录时的站点有效）"""
+    return 'user_id' in session and session.get('tenant') == tenants.current_tenant()
 
 def login_required(f):
     """登录验证装饰器"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if not is_admin():
             return jsonify({'error': 'Authentication required'}), 401
         return f(*args, **kwargs)
     return decorated_function
 
-def hash_password(password):
-    """密码哈希函数"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def verify_password(password, hash_value):
-    """验证密码"""
-    return hash_password(password) == hash_value
-
 def generate_captcha_text():
     """生成验证码文本"""
     # 避免容易混淆的字符
@@ -140,9 +222,28 @@ def login():
     user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
     conn.close()
     
-    if user and verify_password(password, user['password_hash']):
+    # 慢哈希在有界线程池中计算，排队过多时直接拒绝
+    try:
+        if user:
+            valid, needs_rehash = verify_password(password, user['password_hash'])
+        else:
+            valid, needs_rehash = verify_dummy(password), False
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+    
+    if valid:
+        # 旧的 SHA-256 哈希（或代价因子已调整的哈希）在登录成功后升级
+        if needs_rehash:
+            try:
+                conn = get_db_connection()
+                conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (hash_password(password), user['id']))
+                conn.commit()
+                conn.close()
+            except HasherBusy:
+                pass
         session['user_id'] = user['id']
         session['username'] = user['username']
+        session['tenant'] = tenants.current_tenant()
         return jsonify({'message': 'Login successful', 'user': user['username']})
     
     return jsonify({'error': 'Invalid credentials'}), 401
@@ -156,450 +257,297 @@ def logout():
 @app.route('/api/check-auth')
 def check_auth():
     """检查登录状态"""
-    if 'user_id' in session:
+    if is_admin():
         return jsonify({'authenticated': True, 'username': session.get('username')})
     return jsonify({'authenticated': False})
 
-# 个人信息API
-@app.route('/api/profile')
-def get_profile():
-    """获取个人信息"""
-    conn = get_db_connection()
-    profile = conn.execute('SELECT * FROM profile WHERE id = 1').fetchone()
-    conn.close()
-    
-    if profile:
-        return jsonify(dict(profile))
-    return jsonify({'error': 'Profile not found'}), 404
-
-@app.route('/api/profile', methods=['PUT'])
-@login_required
-def update_profile():
-    """更新个人信息"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    # 构建更新SQL
-    fields = ['name', 'title', 'bio', 'avatar_url', 'email', 'phone', 'address', 
-              'website', 'linkedin', 'github', 'orcid', 'research_interests']
-    
-    update_fields = []
-    values = []
-    
-    for field in fields:
-        if field in data:
-            update_fields.append(f"{field} = ?")
-            values.append(data[field])
-    
-    if update_fields:
-        update_fields.append("updated_at = CURRENT_TIMESTAMP")
-        values.append(1)  # WHERE id = 1
-        
-        sql = f"UPDATE profile SET {', '.join(update_fields)} WHERE id = ?"
-        conn.execute(sql, values)
-        conn.commit()
-    
-    conn.close()
-    return jsonify({'message': 'Profile updated successfully'})
+# 内容资源API（个人信息、教育背景、论文、项目、经历、奖项、友链、设置）
+# 字段、默认值和排序定义在 resources.py 的注册表中，CRUD 路由由注册表统一生成
+register_resources(app, login_required)
+
+# 标签云：每个标签在各类内容中的使用次数
+@app.route('/api/tags')
+def get_tags():
+    """获取标签及使用次数（?resource= 只统计某类内容）"""
+    resource = request.args.get('resource')
+    if resource and resource not in {r.name for r in tag_index.TAGGED_RESOURCES}:
+        return jsonify({'error': 'Invalid resource'}), 400
+    with pooled_connection() as conn:
+        return jsonify(tag_index.tag_counts(conn, resource))
+
+# 论文统计：按年份/类型计数、主要发表渠道、合作者网络
+@app.route('/api/analytics/publications')
+def get_publication_analytics():
+    """获取论文统计（由写钩子增量维护的物化表）"""
+    top_venues = min(max(request.args.get('venues', 10, type=int), 1), 100)
+    top_authors = min(max(request.args.get('authors', 50, type=int), 1), 500)
+    with pooled_connection() as conn:
+        return jsonify(analytics.publication_summary(conn, top_venues, top_authors))
+
+# 相关论文/项目：按主键读取后台预先计算的结果
+@app.route('/api/<any(publications, projects):resource>/<int:item_id>/related')
+def get_related(resource, item_id):
+    """获取与某篇论文（或某个项目）内容相似的条目，按相似度降序"""
+    with pooled_connection() as conn:
+        body = related.related_json(conn, resource, item_id)
+    if body is None:
+        return jsonify({'error': 'Item not found'}), 404
+    return Response(body, mimetype='application/json')
+
+# 离线缓存：内容版本号和 Service Worker 脚本
+@app.route('/api/version')
+def get_content_version():
+    """获取当前内容版本号（任何内容写入后都会变化）"""
+    with pooled_connection() as conn:
+        return jsonify({'version': offline.current_version(conn)})
+
+@app.route('/sw.js')
+def service_worker():
+    """前台主页的 Service Worker（作用域为站点根路径）"""
+    if not app.config['OFFLINE_CACHE']:
+        return jsonify({'error': 'Offline cache disabled'}), 404
+    # 路径模式下默认站点的 Service Worker 不接管其他站点的路径
+    excluded = [tenants.TENANT_PATH_PREFIX] if tenants.TENANT_MODE == 'path' and not tenants.current_tenant() else []
+    return offline.service_worker_response(excluded)
 
-# 教育背景API
-@app.route('/api/education')
-def get_education():
-    """获取教育背景"""
-    conn = get_db_connection()
-    education = conn.execute('SELECT * FROM education ORDER BY order_index, start_year DESC').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in education])
-
-@app.route('/api/education', methods=['POST'])
-@login_required
-def create_education():
-    """创建教育记录"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        INSERT INTO education (degree, institution, field, start_year, end_year, description, tags, order_index)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (data.get('degree'), data.get('institution'), data.get('field'),
-          data.get('start_year'), data.get('end_year'), data.get('description'),
-          data.get('tags', ''), data.get('order_index', 0)))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Education record created successfully'})
-
-@app.route('/api/education/<int:education_id>', methods=['PUT'])
-@login_required
-def update_education(education_id):
-    """更新教育记录"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        UPDATE education 
-        SET degree = ?, institution = ?, field = ?, start_year = ?, 
-            end_year = ?, description = ?, tags = ?, order_index = ?
-        WHERE id = ?
-    ''', (data.get('degree'), data.get('institution'), data.get('field'),
-          data.get('start_year'), data.get('end_year'), data.get('description'),
-          data.get('tags', ''), data.get('order_index', 0), education_id))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Education record updated successfully'})
-
-@app.route('/api/education/<int:education_id>', methods=['DELETE'])
-@login_required
-def delete_education(education_id):
-    """删除教育记录"""
-    conn = get_db_connection()
-    conn.execute('DELETE FROM education WHERE id = ?', (education_id,))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Education record deleted successfully'})
-
-# 论文发表API
-@app.route('/api/publications')
-def get_publications():
-    """获取论文列表"""
-    conn = get_db_connection()
-    publications = conn.execute('SELECT * FROM publications ORDER BY order_index, year DESC').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in publications])
-
-@app.route('/api/publications', methods=['POST'])
-@login_required
-def create_publication():
-    """创建论文记录"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        INSERT INTO publications (title, authors, journal, year, volume, pages, 
-                                doi, url, abstract, keywords, type, order_index)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (data.get('title'), data.get('authors'), data.get('journal'),
-          data.get('year'), data.get('volume'), data.get('pages'),
-          data.get('doi'), data.get('url'), data.get('abstract'),
-          data.get('keywords'), data.get('type', 'journal'), data.get('order_index', 0)))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Publication created successfully'})
-
-@app.route('/api/publications/<int:pub_id>', methods=['PUT'])
-@login_required
-def update_publication(pub_id):
-    """更新论文记录"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        UPDATE publications 
-        SET title = ?, authors = ?, journal = ?, year = ?, volume = ?, 
-            pages = ?, doi = ?, url = ?, abstract = ?, keywords = ?, 
-            type = ?, order_index = ?
-        WHERE id = ?
-    ''', (data.get('title'), data.get('authors'), data.get('journal'),
-          data.get('year'), data.get('volume'), data.get('pages'),
-          data.get('doi'), data.get('url'), data.get('abstract'),
-          data.get('keywords'), data.get('type', 'journal'), 
-          data.get('order_index', 0), pub_id))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Publication updated successfully'})
-
-@app.route('/api/publications/<int:pub_id>', methods=['DELETE'])
-@login_required
-def delete_publication(pub_id):
-    """删除论文记录"""
-    conn = get_db_connection()
-    conn.execute('DELETE FROM publications WHERE id = ?', (pub_id,))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Publication deleted successfully'})
-
-# 项目经历API
-@app.route('/api/projects')
-def get_projects():
-    """获取项目列表"""
-    conn = get_db_connection()
-    projects = conn.execute('SELECT * FROM projects ORDER BY order_index, start_date DESC').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in projects])
-
-@app.route('/api/projects', methods=['POST'])
-@login_required
-def create_project():
-    """创建项目记录"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        INSERT INTO projects (title, description, detailed_description, role, start_date, end_date, 
-                            technologies, url, github_url, status, tags, order_index)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (data.get('title'), data.get('description'), data.get('detailed_description', ''),
-          data.get('role'), data.get('start_date'), data.get('end_date'), data.get('technologies'),
-          data.get('url'), data.get('github_url'), data.get('status', 'completed'),
-          data.get('tags', ''), data.get('order_index', 0)))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Project created successfully'})
-
-@app.route('/api/projects/<int:project_id>', methods=['PUT'])
-@login_required
-def update_project(project_id):
-    """更新项目记录"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        UPDATE projects 
-        SET title = ?, description = ?, detailed_description = ?, role = ?, start_date = ?, end_date = ?,
-            technologies = ?, url = ?, github_url = ?, status = ?, tags = ?, order_index = ?
-        WHERE id = ?
-    ''', (data.get('title'), data.get('description'), data.get('detailed_description', ''), data.get('role'),
-          data.get('start_date'), data.get('end_date'), data.get('technologies'),
-          data.get('url'), data.get('github_url'), data.get('status', 'completed'),
-          data.get('tags', ''), data.get('order_index', 0), project_id))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Project updated successfully'})
-
-@app.route('/api/projects/<int:project_id>', methods=['DELETE'])
-@login_required
-def delete_project(project_id):
-    """删除项目记录"""
-    conn = get_db_connection()
-    conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Project deleted successfully'})
-
-# 工作经历API
-@app.route('/api/experience')
-def get_experience():
-    """获取工作经历"""
-    conn = get_db_connection()
-    experience = conn.execute('SELECT * FROM experience ORDER BY order_index, start_date DESC').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in experience])
-
-@app.route('/api/experience', methods=['POST'])
-@login_required
-def create_experience():
-    """创建工作经历"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        INSERT INTO experience (position, organization, start_date, end_date, 
-                              description, location, tags, order_index)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (data.get('position'), data.get('organization'), data.get('start_date'),
-          data.get('end_date'), data.get('description'), data.get('location'),
-          data.get('tags', ''), data.get('order_index', 0)))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Experience created successfully'})
-
-@app.route('/api/experience/<int:exp_id>', methods=['PUT'])
-@login_required
-def update_experience(exp_id):
-    """更新工作经历"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        UPDATE experience 
-        SET position = ?, organization = ?, start_date = ?, end_date = ?,
-            description = ?, location = ?, tags = ?, order_index = ?
-        WHERE id = ?
-    ''', (data.get('position'), data.get('organization'), data.get('start_date'),
-          data.get('end_date'), data.get('description'), data.get('location'),
-          data.get('tags', ''), data.get('order_index', 0), exp_id))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Experience updated successfully'})
+# 前端页面路由
+@app.route('/')
+def index():
+    """学术主页首页"""
+    with pooled_connection() as conn:
+        json_ld = syndication.request_artifact(conn, 'jsonld', request.host, request.url_root)[0].decode()
+    return render_template('index.html', json_ld=json_ld, offline_cache=app.config['OFFLINE_CACHE'],
+                           image_proxy=app.config['IMAGE_PROXY'],
+                           rum_enabled=app.config['RUM_ENABLED'], rum_page='home')
 
-@app.route('/api/experience/<int:exp_id>', methods=['DELETE'])
+@app.route('/admin')
+def admin():
+    """管理后台页面"""
+    return render_template('admin.html', rum_enabled=app.config['RUM_ENABLED'], rum_page='admin')
+
+# 搜索引擎与订阅：生成一次后保存，来源表有写入时才重新生成
+def artifact_response(name):
+    with pooled_connection() as conn:
+        body, content_type, etag, last_modified = syndication.request_artifact(
+            conn, name, request.host, request.url_root)
+    response = Response(body, mimetype=content_type)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = syndication.MAX_AGE
+    return response.make_conditional(request)
+
+@app.route('/sitemap.xml')
+def sitemap():
+    return artifact_response('sitemap')
+
+@app.route('/feed.xml')
+def atom_feed():
+    """最新论文和项目（Atom）"""
+    return artifact_response('atom')
+
+@app.route('/rss.xml')
+def rss_feed():
+    """最新论文和项目（RSS 2.0）"""
+    return artifact_response('rss')
+
+@app.route('/robots.txt')
+def robots_txt():
+    body = f'User-agent: *\nDisallow: /admin\nSitemap: {syndication.site_url(request.host) or request.url_root}sitemap.xml\n'
+    return Response(body, mimetype='text/plain')
+
+# 后台任务队列
+@app.route('/api/admin/jobs')
 @login_required
-def delete_experience(exp_id):
-    """删除工作经历"""
-    conn = get_db_connection()
-    conn.execute('DELETE FROM experience WHERE id = ?', (exp_id,))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Experience deleted successfully'})
-
-# 荣誉奖项API
-@app.route('/api/awards')
-def get_awards():
-    """获取荣誉奖项"""
-    conn = get_db_connection()
-    awards = conn.execute('SELECT * FROM awards ORDER BY order_index, year DESC').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in awards])
-
-@app.route('/api/awards', methods=['POST'])
+def get_jobs():
+    """各状态的任务数和最近的任务（status 过滤状态）"""
+    state = request.args.get('status')
+    if state and state not in jobs.STATUSES:
+        return jsonify({'error': 'Invalid status'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    with pooled_connection() as conn:
+        return jsonify(jobs.status(conn, state, limit))
+
+@app.route('/api/admin/jobs/<int:job_id>/retry', methods=['POST'])
 @login_required
-def create_award():
-    """创建奖项记录"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        INSERT INTO awards (title, organization, year, description, tags, order_index)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (data.get('title'), data.get('organization'), data.get('year'),
-          data.get('description'), data.get('tags', ''), data.get('order_index', 0)))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Award created successfully'})
-
-@app.route('/api/awards/<int:award_id>', methods=['PUT'])
+def retry_job(job_id):
+    """立即重试一个失败的任务"""
+    with pooled_connection() as conn:
+        retried = jobs.retry(conn, job_id)
+    if not retried:
+        return jsonify({'error': 'Job is not failed, or an identical job is already pending'}), 409
+    jobs.runner.wake()
+    return jsonify({'message': 'Job queued for retry'})
+
+# 按 DOI 补全论文信息
+@app.route('/api/admin/publications/enrich', methods=['POST'])
 @login_required
-def update_award(award_id):
-    """更新奖项记录"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        UPDATE awards 
-        SET title = ?, organization = ?, year = ?, description = ?, tags = ?, order_index = ?
-        WHERE id = ?
-    ''', (data.get('title'), data.get('organization'), data.get('year'),
-          data.get('description'), data.get('tags', ''), data.get('order_index', 0), award_id))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Award updated successfully'})
-
-@app.route('/api/awards/<int:award_id>', methods=['DELETE'])
+def enrich_publications():
+    """提交按 DOI 补全论文字段的后台任务（overwrite 覆盖已有内容，refresh 忽略缓存）"""
+    data = request.get_json(silent=True) or {}
+    payload = {'overwrite': bool(data.get('overwrite')), 'refresh': bool(data.get('refresh'))}
+    with pooled_connection() as conn:
+        job_id = jobs.enqueue(conn, 'doi.enrich', payload)
+    jobs.runner.wake()
+    return jsonify({'message': 'Enrichment queued', 'job_id': job_id}), 202
+
+# 外部图片的本地缓存（友情链接头像等）
+@app.route('/media/remote')
+def remote_image():
+    """从本站返回已缓存的外部图片；尚未下载完成时跳转到原地址"""
+    url = request.args.get('url', '')
+    with pooled_connection() as conn:
+        cached = image_cache.lookup(conn, url)
+    if cached is None:
+        return jsonify({'error': 'Image not found'}), 404
+    data, content_type, etag, due = cached
+    if due:
+        image_cache.fetcher.schedule(url)
+    if data is None:
+        response = redirect(url, code=302)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    response = Response(data, mimetype=content_type)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = image_cache.IMAGE_CACHE_MAX_AGE
+    response.headers['Content-Security-Policy'] = image_cache.IMAGE_CSP
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response.make_conditional(request)
+
+# 全库导出/导入（NDJSON）
+@app.route('/api/export')
 @login_required
-def delete_award(award_id):
-    """删除奖项记录"""
-    conn = get_db_connection()
-    conn.execute('DELETE FROM awards WHERE id = ?', (award_id,))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Award deleted successfully'})
-
-# 友情链接API
-@app.route('/api/friends')
-def get_friends():
-    """获取友情链接"""
-    conn = get_db_connection()
-    friends = conn.execute('SELECT * FROM friends WHERE is_active = 1 ORDER BY order_index, created_at DESC').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in friends])
-
-@app.route('/api/friends', methods=['POST'])
+def export_data():
+    """流式导出全部内容表"""
+    tables = request.args.get('tables')
+    tables = [t.strip() for t in tables.split(',') if t.strip()] if tables else None
+    if tables and any(t not in transfer.EXPORT_TABLES for t in tables):
+        return jsonify({'error': 'Invalid table name'}), 400
+    filename = f"academic_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson"
+    return Response(stream_with_context(transfer.iter_export(tables)), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/api/import', methods=['POST'])
 @login_required
-def create_friend():
-    """创建友情链接"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        INSERT INTO friends (name, url, description, avatar, order_index, is_active)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (data.get('name'), data.get('url'), data.get('description'),
-          data.get('avatar'), data.get('order_index', 0), data.get('is_active', 1)))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Friend link created successfully'})
+def import_data():
+    """分批导入 NDJSON 数据（请求体即导出文件内容）"""
+    mode = request.args.get('mode', 'merge')
+    if mode not in ('merge', 'replace'):
+        return jsonify({'error': 'Invalid import mode'}), 400
+    try:
+        counts = transfer.import_ndjson(request.stream, mode=mode)
+    except transfer.ImportFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'Import completed successfully', 'rows': counts})
+
+# 增量同步（只读副本拉取变更日志）
+def replication_authorized():
+    """设置了 REPLICATION_TOKEN 时需要 Bearer 令牌或管理员登录"""
+    token = os.environ.get('REPLICATION_TOKEN')
+    return not token or request.headers.get('Authorization') == f'Bearer {token}' or is_admin()
+
+@app.route('/api/changes')
+def get_changes():
+    """返回 since 之后的变更；wait > 0 时没有新变更会长轮询等待"""
+    if not replication_authorized():
+        return jsonify({'error': 'Authentication required'}), 401
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', changelog.DEFAULT_LIMIT, type=int), 1), 10000)
+    wait = request.args.get('wait', 0, type=float)
+    with pooled_connection() as conn:
+        if wait > 0:
+            changelog.wait_for_changes(conn, since, wait)
+        try:
+            result = changelog.changes_since(conn, since, limit)
+        except changelog.ChangeLogGap as e:
+            return jsonify({'error': str(e), 'resync': True}), 410
+    return jsonify(result)
+
+@app.route('/api/changes/snapshot')
+def get_changes_snapshot():
+    """副本初始化用的全量快照（NDJSON，header 中的 seq 为增量起点）"""
+    if not replication_authorized():
+        return jsonify({'error': 'Authentication required'}), 401
+    return Response(stream_with_context(transfer.iter_export()), mimetype='application/x-ndjson')
+
+# 实时更新推送
+@app.route('/api/events')
+def events():
+    """订阅内容变更事件（Server-Sent Events）"""
+    url = live_events.server_url(request)
+    tenant = tenants.current_tenant()
+    if url:
+        # 频道由服务端按当前站点指定并签名，忽略客户端自带的 tenant / sig 参数
+        params = [(k, v) for k, v in request.args.items(multi=True) if k not in ('tenant', 'sig')]
+        if tenant:
+            params += [('tenant', tenant), ('sig', live_events.sign_channel(tenant))]
+        query = urlencode(params)
+        return redirect(f'{url}?{query}' if query else url, code=307)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    stream = live_events.stream_events(live_events.parse_last_event_id(last_event_id), tenant)
+    if stream is None:
+        return jsonify({'error': 'Too many subscribers'}), 503
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# 性能指标（Prometheus 文本格式）
+@app.route('/metrics')
+def metrics():
+    """导出性能指标"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}' and not is_admin():
+        return jsonify({'error': 'Authentication required'}), 401
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+# 真实用户性能数据（RUM）
+@app.route('/api/rum', methods=['POST'])
+def collect_rum():
+    """接收页面上报的性能样本（navigator.sendBeacon），只追加到内存缓冲区"""
+    body = request.stream.read(rum.MAX_BEACON_BYTES + 1)
+    if len(body) > rum.MAX_BEACON_BYTES:
+        return jsonify({'error': 'Beacon too large'}), 413
+    if not app.config['RUM_ENABLED']:
+        return '', 204
+    try:
+        samples = rum.parse_beacon(json.loads(body or b'null'))
+    except ValueError as e:
+        return jsonify({'error': str(e) if isinstance(e, rum.BeaconError) else 'Invalid JSON'}), 400
+    rum.collector.add(samples)
+    return '', 204
 
-@app.route('/api/friends/<int:friend_id>', methods=['PUT'])
+@app.route('/api/admin/rum')
 @login_required
-def update_friend(friend_id):
-    """更新友情链接"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    conn.execute('''
-        UPDATE friends 
-        SET name = ?, url = ?, description = ?, avatar = ?, order_index = ?, is_active = ?
-        WHERE id = ?
-    ''', (data.get('name'), data.get('url'), data.get('description'),
-          data.get('avatar'), data.get('order_index', 0), data.get('is_active', 1), friend_id))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Friend link updated successfully'})
-
-@app.route('/api/friends/<int:friend_id>', methods=['DELETE'])
+def get_rum_summary():
+    """最近 hours 小时（默认 24）每小时的 TTFB、FCP、LCP 和各接口耗时百分位数"""
+    hours = min(max(request.args.get('hours', 24, type=int), 1), rum.RUM_ROLLUP_DAYS * 24)
+    with pooled_connection() as conn:
+        return jsonify(rum.summary(conn, hours))
+
+# SQL追踪与慢查询日志（运行时开关）
+@app.route('/api/admin/query-trace')
 @login_required
-def delete_friend(friend_id):
-    """删除友情链接"""
-    conn = get_db_connection()
-    conn.execute('DELETE FROM friends WHERE id = ?', (friend_id,))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Friend link deleted successfully'})
-
-# 系统设置API
-@app.route('/api/settings')
-def get_settings():
-    """获取系统设置"""
-    conn = get_db_connection()
-    settings = conn.execute('SELECT * FROM settings WHERE id = 1').fetchone()
-    conn.close()
-    
-    if settings:
-        return jsonify(dict(settings))
-    return jsonify({'beian': '', 'site_title': '个人学术主页', 'site_description': ''})
-
-@app.route('/api/settings', methods=['PUT'])
+def get_query_trace():
+    """获取SQL语句统计和最近的慢查询"""
+    limit = request.args.get('limit', 50, type=int)
+    order_by = request.args.get('order_by', 'total_ms')
+    if order_by not in ('total_ms', 'count', 'max_ms', 'avg_ms', 'rows', 'slow'):
+        return jsonify({'error': 'Invalid order_by'}), 400
+    return jsonify(query_trace.report(limit, order_by))
+
+@app.route('/api/admin/query-trace', methods=['PUT'])
 @login_required
-def update_settings():
-    """更新系统设置"""
-    data = request.get_json()
-    conn = get_db_connection()
-    
-    # 检查设置是否存在
-    existing = conn.execute('SELECT id FROM settings WHERE id = 1').fetchone()
-    
-    if existing:
-        # 更新现有设置
-        conn.execute('''
-            UPDATE settings 
-            SET beian = ?, site_title = ?, site_description = ?, keywords = ?, 
-                analytics_code = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = 1
-        ''', (data.get('beian'), data.get('site_title'), data.get('site_description'),
-              data.get('keywords'), data.get('analytics_code')))
-    else:
-        # 创建新设置
-        conn.execute('''
-            INSERT INTO settings (id, beian, site_title, site_description, keywords, analytics_code)
-            VALUES (1, ?, ?, ?, ?, ?)
-        ''', (data.get('beian'), data.get('site_title'), data.get('site_description'),
-              data.get('keywords'), data.get('analytics_code')))
-    
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Settings updated successfully'})
-
-# 前端页面路由
-@app.route('/')
-def index():
-    """学术主页首页"""
-    return render_template('index.html')
-
-@app.route('/admin')
-def admin():
-    """管理后台页面"""
-    return render_template('admin.html')
+def update_query_trace():
+    """修改SQL追踪配置，reset=true 时清空统计"""
+    data = request.get_json() or {}
+    if data.get('reset'):
+        query_trace.reset()
+    try:
+        config = query_trace.configure(enabled=data.get('enabled'), slow_ms=data.get('slow_ms'),
+                                       explain=data.get('explain'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid query trace configuration'}), 400
+    return jsonify({'message': 'Query trace updated successfully', 'config': config})
 
 # 文件上传处理（头像等）
 @app.route('/api/upload', methods=['POST'])
@@ -617,13 +565,15 @@ def upload_file():
     allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
     if '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() in allowed_extensions:
         filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        filepath = os.path.join('static', 'uploads', filename)
+        # 多站点模式下每个站点的文件放在各自的子目录中
+        subdir = f'{tenants.current_tenant()}/' if tenants.current_tenant() else ''
+        filepath = os.path.join('static', 'uploads', subdir, filename)
         
         # 确保上传目录存在
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         file.save(filepath)
         
-        return jsonify({'message': 'File uploaded successfully', 'url': f'/static/uploads/{filename}'})
+        return jsonify({'message': 'File uploaded successfully', 'url': f'/static/uploads/{subdir}{filename}'})
     
     return jsonify({'error': 'Invalid file type'}), 400
 
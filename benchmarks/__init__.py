@@ -0,0 +1,9 @@
+"""
+API 性能基准测试套件
+
+用法示例：
+    python -m benchmarks --mode both --concurrency 1,8 --requests 400 --save results.json
+    python -m benchmarks --baseline results.json --threshold 0.15
+
+基准测试在临时目录中使用独立的数据库运行，不会修改项目自带的 academic_homepage.db。
+"""
@@ -0,0 +1,72 @@
+"""
+命令行入口：python -m benchmarks --help
+"""
+
+import argparse
+import sys
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='API 路由性能基准测试')
+    parser.add_argument('--mode', choices=['inproc', 'socket', 'both'], default='inproc',
+                        help='inproc: Flask 测试客户端；socket: 真实 HTTP 服务器；both: 两者都运行')
+    parser.add_argument('--concurrency', default='1,8', help='逗号分隔的并发度列表，例如 1,8,32')
+    parser.add_argument('--requests', type=int, default=200, help='每个场景、每个并发度的请求数')
+    parser.add_argument('--warmup', type=int, default=10, help='计时前的预热请求数')
+    parser.add_argument('--only', action='append', help='只运行名称包含该子串的场景，可重复指定')
+    parser.add_argument('--group', action='append', choices=['page', 'read', 'auth', 'write'],
+                        help='只运行指定分组的场景，可重复指定')
+    parser.add_argument('--save', help='保存 JSON 结果的路径')
+    parser.add_argument('--baseline', help='用于对比的基线 JSON 结果')
+    parser.add_argument('--threshold', type=float, default=0.15, help='回归阈值（比例），默认 0.15')
+    parser.add_argument('--preset', choices=['small-lab', 'prolific-professor', 'department-portal'],
+                        help='使用合成数据预设填充数据库（默认只有少量示例数据）')
+    parser.add_argument('--seed', type=int, default=42, help='合成数据随机种子')
+    parser.add_argument('--json-mode', choices=['sqlite', 'python'],
+                        help='列表接口的序列化方式（默认使用应用配置）')
+    parser.add_argument('--workdir', help='运行目录（默认创建临时目录）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from benchmarks.harness import load_app, TRANSPORTS
+    from benchmarks.scenarios import build_scenarios, select_scenarios
+    from benchmarks.runner import run_suite
+    from benchmarks.report import (build_report, save_report, load_report, compare_reports,
+                                   format_result, format_regression)
+
+    app, workdir = load_app(args.workdir, args.preset, args.seed)
+    print(f"工作目录: {workdir}")
+    if args.json_mode:
+        app.config['JSON_SERIALIZATION'] = args.json_mode
+
+    concurrency_levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+    modes = ['inproc', 'socket'] if args.mode == 'both' else [args.mode]
+    scenarios = select_scenarios(build_scenarios(), args.only, args.group)
+
+    results = []
+    for mode in modes:
+        transport = TRANSPORTS[mode](app)
+        results.extend(run_suite(app, transport, scenarios, concurrency_levels, args.requests,
+                                 args.warmup, progress=lambda r: print(format_result(r), flush=True)))
+
+    report = build_report(results, {k: v for k, v in vars(args).items()})
+    if args.save:
+        save_report(report, args.save)
+        print(f"结果已保存: {args.save}")
+
+    if args.baseline:
+        regressions = compare_reports(report, load_report(args.baseline), args.threshold)
+        for regression in regressions:
+            print(format_regression(regression))
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能回归（阈值 {args.threshold:.0%}）")
+            return 1
+        print("与基线相比未发现性能回归")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
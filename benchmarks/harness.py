@@ -0,0 +1,148 @@
+"""
+基准测试运行环境：隔离的应用实例、会话伪造以及两种请求传输方式
+"""
+
+import http.client
+import os
+import sys
+import tempfile
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench-password'
+BENCH_CAPTCHA = 'ABCD'
+
+
+def load_app(workdir=None, preset=None, seed=42):
+    """在临时工作目录中加载应用，返回 (app, workdir)
+
+    指定 preset 时使用 data_generator 的预设规模填充数据，否则只写入默认示例数据。
+
+    必须在导入 app 之前调用：数据库路径和上传目录都是相对当前目录解析的，
+    切换工作目录可以保证基准测试不会污染项目目录。
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix='academic-bench-')
+    os.makedirs(os.path.join(workdir, 'static', 'uploads'), exist_ok=True)
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    os.chdir(workdir)
+
+    import database
+    database.DATABASE_PATH = os.path.join(workdir, 'academic_homepage.db')
+
+    from app import app
+    # 压测的是处理函数本身的开销，关闭限流
+    app.config['RATE_LIMIT_ENABLED'] = False
+    database.create_default_data()
+    # 示例数据直接写库，和批量导入一样在提交后通知各派生数据（统计、标签索引、订阅等）整表重建
+    from resources import REGISTRY, notify_commit
+    for resource in REGISTRY.values():
+        notify_commit(resource, 'import', None)
+    if preset:
+        from data_generator import resolve_counts, generate_data
+        generate_data(resolve_counts(preset), seed=seed)
+    database.create_admin_user(BENCH_USERNAME, BENCH_PASSWORD)
+    return app, workdir
+
+
+def session_cookie(app, **values):
+    """生成带签名的会话 Cookie，用于跳过登录和验证码流程"""
+    serializer = app.session_interface.get_signing_serializer(app)
+    return f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps(dict(values))}"
+
+
+def auth_cookie(app):
+    """已登录管理员的会话 Cookie"""
+    return session_cookie(app, user_id=1, username=BENCH_USERNAME)
+
+
+def captcha_cookie(app):
+    """包含已知验证码的会话 Cookie，用于压测登录接口"""
+    return session_cookie(app, captcha=BENCH_CAPTCHA)
+
+
+class InProcessTransport:
+    """通过 Flask 测试客户端在进程内发送请求（不经过网络栈）"""
+
+    name = 'inproc'
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client(use_cookies=False)
+        response = client.open(path, method=method, data=body, headers=headers or {})
+        payload = response.get_data()
+        return response.status_code, len(payload)
+
+
+class SocketTransport:
+    """启动真实的 HTTP 服务器，通过 TCP 套接字发送请求（保持长连接）"""
+
+    name = 'socket'
+
+    def __init__(self, app, host='127.0.0.1'):
+        self.app = app
+        self.host = host
+        self.port = None
+        self._server = None
+        self._thread = None
+        self._local = threading.local()
+
+    def start(self):
+        from werkzeug.serving import make_server, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self._server = make_server(self.host, 0, self.app, threaded=True, request_handler=QuietHandler)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return conn
+
+    def request(self, method, path, body=None, headers=None):
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            # 服务器关闭了长连接，重连后重试一次
+            conn.close()
+            self._local.conn = None
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+        payload = response.read()
+        if response.getheader('Connection', '').lower() == 'close':
+            conn.close()
+            self._local.conn = None
+        return response.status, len(payload)
+
+
+TRANSPORTS = {
+    InProcessTransport.name: InProcessTransport,
+    SocketTransport.name: SocketTransport,
+}
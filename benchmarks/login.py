@@ -0,0 +1,97 @@
+"""
+登录吞吐量（每核）基准测试
+
+对每个 bcrypt 代价因子：先把基准用户的密码哈希重置为该代价，测量单独一次校验的耗时，
+再以不同并发度压测 /api/login（验证码通过签名 Cookie 预置），按哈希线程池实际可用的核数折算为每核吞吐量。
+
+用法：
+    python -m benchmarks.login --rounds 10,12 --concurrency 1,4,16 --requests 40
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from benchmarks.harness import BENCH_PASSWORD, BENCH_USERNAME, TRANSPORTS, load_app
+from benchmarks.runner import run_scenario
+from benchmarks.scenarios import build_scenarios, select_scenarios
+
+
+def _parse_int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def _set_rounds(rounds):
+    """修改代价因子并按新代价重置基准用户的密码哈希"""
+    import passwords
+    from database import get_db_connection
+
+    passwords.BCRYPT_ROUNDS = rounds
+    conn = get_db_connection()
+    conn.execute('UPDATE users SET password_hash = ? WHERE username = ?',
+                 (passwords.hash_password(BENCH_PASSWORD), BENCH_USERNAME))
+    conn.commit()
+    conn.close()
+
+
+def _single_verify_ms(repeat=5):
+    import passwords
+    from database import get_db_connection
+
+    conn = get_db_connection()
+    stored = conn.execute('SELECT password_hash FROM users WHERE username = ?', (BENCH_USERNAME,)).fetchone()[0]
+    conn.close()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        passwords.verify_password(BENCH_PASSWORD, stored)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.login',
+                                     description='测量不同 bcrypt 代价因子下的登录吞吐量（每核）')
+    parser.add_argument('--rounds', default='10,12', help='bcrypt 代价因子列表，逗号分隔')
+    parser.add_argument('--concurrency', default='1,4,16', help='并发度列表，逗号分隔')
+    parser.add_argument('--requests', type=int, default=40, help='每个并发度的登录请求数')
+    parser.add_argument('--mode', choices=list(TRANSPORTS), default='inproc')
+    parser.add_argument('--save', help='保存 JSON 结果的路径')
+    args = parser.parse_args(argv)
+
+    app, workdir = load_app()
+    import passwords
+
+    cores = min(passwords.HASH_WORKERS, os.cpu_count() or 1)
+    print(f"工作目录: {workdir}")
+    print(f"哈希线程池: {passwords.HASH_WORKERS} 线程, 可用核数 {cores}, "
+          f"{'bcrypt' if passwords.BCRYPT_AVAILABLE else 'pbkdf2_sha256'}")
+
+    scenario = select_scenarios(build_scenarios(), names=['POST /api/login'])[0]
+    transport = TRANSPORTS[args.mode](app)
+    transport.start()
+    results = []
+    try:
+        for rounds in _parse_int_list(args.rounds):
+            _set_rounds(rounds)
+            verify_ms = _single_verify_ms()
+            for concurrency in _parse_int_list(args.concurrency):
+                stats = run_scenario(app, transport, scenario, concurrency, args.requests, warmup=1)
+                per_core = stats['throughput_rps'] / cores
+                results.append({'mode': transport.name, 'scenario': scenario.name, 'rounds': rounds,
+                                'concurrency': concurrency, 'verify_ms': round(verify_ms, 2),
+                                'cores': cores, 'logins_per_core': round(per_core, 2), **stats})
+                print(f"rounds={rounds:<3} c={concurrency:<3} verify {verify_ms:>7.1f}ms  "
+                      f"{stats['throughput_rps']:>7.2f} login/s  {per_core:>7.2f} login/s/core  "
+                      f"p50 {stats['p50_ms']:>8.1f}ms  p95 {stats['p95_ms']:>8.1f}ms  err {stats['errors']}")
+    finally:
+        transport.stop()
+
+    if args.save:
+        from benchmarks.report import build_report, save_report
+        save_report(build_report(results, vars(args)), args.save)
+        print(f"结果已保存: {args.save}")
+    return 0 if all(r['errors'] == 0 for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
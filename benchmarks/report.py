@@ -0,0 +1,93 @@
+"""
+基准测试结果的保存、展示以及与基线的对比
+"""
+
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+from datetime import datetime
+
+from benchmarks.harness import PROJECT_ROOT
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def build_report(results, options):
+    """组装可保存的结果文档"""
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': options,
+        },
+        'results': results,
+    }
+
+
+def save_report(report, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _key(result):
+    return result['mode'], result['concurrency'], result['scenario']
+
+
+def format_result(result):
+    return (f"{result['mode']:<7} c={result['concurrency']:<3} {result['scenario']:<36} "
+            f"{result['throughput_rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f}ms  "
+            f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  err {result['errors']}")
+
+
+def compare_reports(current, baseline, threshold):
+    """与基线对比，返回回归列表
+
+    p95 延迟上升或吞吐量下降超过 threshold（比例，例如 0.15 表示 15%）即视为回归。
+    """
+    baseline_results = {_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        base = baseline_results.get(_key(result))
+        if base is None:
+            continue
+        if base['p95_ms'] > 0 and result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append({
+                'key': _key(result), 'metric': 'p95_ms',
+                'baseline': base['p95_ms'], 'current': result['p95_ms'],
+            })
+        if base['throughput_rps'] > 0 and result['throughput_rps'] < base['throughput_rps'] * (1 - threshold):
+            regressions.append({
+                'key': _key(result), 'metric': 'throughput_rps',
+                'baseline': base['throughput_rps'], 'current': result['throughput_rps'],
+            })
+        if result['errors'] > base['errors']:
+            regressions.append({
+                'key': _key(result), 'metric': 'errors',
+                'baseline': base['errors'], 'current': result['errors'],
+            })
+    return regressions
+
+
+def format_regression(regression):
+    mode, concurrency, scenario = regression['key']
+    return (f"REGRESSION {mode} c={concurrency} {scenario}: {regression['metric']} "
+            f"{regression['baseline']} -> {regression['current']}")
@@ -0,0 +1,105 @@
+"""
+并发执行场景并统计吞吐量与延迟分位数
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(sorted_values, pct):
+    """最近秩法计算分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, wall_time, errors, total_bytes):
+    """汇总一次场景运行的结果，延迟单位为毫秒"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'requests': count,
+        'errors': errors,
+        'wall_time_s': round(wall_time, 4),
+        'throughput_rps': round(count / wall_time, 2) if wall_time > 0 else 0.0,
+        'mean_ms': round(sum(values) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if count else 0.0,
+        'bytes': total_bytes,
+    }
+
+
+def run_scenario(app, transport, scenario, concurrency, total_requests, warmup=0):
+    """以给定并发度执行 total_requests 次请求"""
+    scenario.setup(app, total_requests + warmup)
+
+    for i in range(warmup):
+        method, path, body, headers = scenario.build(app, i)
+        transport.request(method, path, body, headers)
+
+    latencies = []
+    errors = 0
+    total_bytes = 0
+    lock = threading.Lock()
+    counter = iter(range(warmup, warmup + total_requests))
+
+    def worker():
+        nonlocal errors, total_bytes
+        local_latencies = []
+        local_errors = 0
+        local_bytes = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            method, path, body, headers = scenario.build(app, i)
+            start = time.perf_counter()
+            try:
+                status, size = transport.request(method, path, body, headers)
+            except Exception:
+                status, size = None, 0
+            local_latencies.append(time.perf_counter() - start)
+            local_bytes += size
+            if status != scenario.expected_status:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+            total_bytes += local_bytes
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(worker) for _ in range(concurrency)]
+        for future in futures:
+            future.result()
+    wall_time = time.perf_counter() - start
+
+    return summarize(latencies, wall_time, errors, total_bytes)
+
+
+def run_suite(app, transport, scenarios, concurrency_levels, total_requests, warmup=0, progress=None):
+    """对每个并发度依次执行所有场景，返回结果列表"""
+    results = []
+    transport.start()
+    try:
+        for concurrency in concurrency_levels:
+            for scenario in scenarios:
+                stats = run_scenario(app, transport, scenario, concurrency, total_requests, warmup)
+                result = {
+                    'mode': transport.name,
+                    'concurrency': concurrency,
+                    'scenario': scenario.name,
+                    'group': scenario.group,
+                    **stats,
+                }
+                results.append(result)
+                if progress:
+                    progress(result)
+    finally:
+        transport.stop()
+    return results
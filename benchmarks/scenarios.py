@@ -0,0 +1,201 @@
+"""
+基准测试场景：覆盖 app.py 中的每一个路由
+"""
+
+import itertools
+import json
+import threading
+import uuid
+
+from benchmarks.harness import auth_cookie, captcha_cookie, BENCH_USERNAME, BENCH_PASSWORD, BENCH_CAPTCHA
+
+# 1x1 像素的 PNG，用于上传接口
+TINY_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082'
+)
+
+# 各内容表的示例写入数据，键为 API 路径中的资源名
+SAMPLE_PAYLOADS = {
+    'education': lambda i: {
+        'degree': '博士学位', 'institution': f'Benchmark University {i}', 'field': '计算机科学',
+        'start_year': 2015, 'end_year': 2019, 'description': '**基准测试**记录', 'tags': '基准,测试',
+    },
+    'publications': lambda i: {
+        'title': f'Benchmark Paper {i}', 'authors': 'Dr. Academic, 李研究员', 'journal': 'Journal of Benchmarks',
+        'year': 2023, 'volume': '1', 'pages': '1-10', 'doi': f'10.0000/bench.{i}',
+        'abstract': '用于性能测试的论文摘要。' * 5, 'keywords': '基准, 测试', 'type': 'journal',
+    },
+    'projects': lambda i: {
+        'title': f'Benchmark Project {i}', 'description': '性能测试项目',
+        'detailed_description': '# 项目\n\n' + '详细描述。' * 50, 'role': '负责人',
+        'start_date': '2023-01-01', 'end_date': '2023-12-31', 'technologies': 'Python, SQLite',
+        'status': 'completed', 'tags': '基准,测试',
+    },
+    'experience': lambda i: {
+        'position': '研究员', 'organization': f'Benchmark Lab {i}', 'start_date': '2020-01-01',
+        'end_date': '2022-01-01', 'description': '工作描述', 'location': '北京', 'tags': '基准,测试',
+    },
+    'awards': lambda i: {
+        'title': f'Benchmark Award {i}', 'organization': 'Benchmark Society', 'year': 2023,
+        'description': '奖项描述', 'tags': '基准,测试',
+    },
+    'friends': lambda i: {
+        'name': f'Benchmark Friend {i}', 'url': 'https://example.com', 'description': '友情链接',
+        'avatar': '', 'is_active': 1,
+    },
+}
+
+
+class Scenario:
+    """一个基准测试场景：每次调用 build(i) 生成一个请求"""
+
+    def __init__(self, name, method, path, expected_status=200, group='read', body=None,
+                 content_type=None, cookie=None, prepare=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.expected_status = expected_status
+        self.group = group
+        self.body = body
+        self.content_type = content_type
+        self.cookie = cookie
+        self.prepare = prepare
+        self._ids = None
+        self._lock = threading.Lock()
+
+    def setup(self, app, total_requests):
+        """在计时开始前准备数据（例如预先创建待删除的记录）"""
+        if self.prepare is not None:
+            self._ids = iter(self.prepare(app, total_requests))
+
+    def next_id(self):
+        with self._lock:
+            return next(self._ids)
+
+    def build(self, app, i):
+        """返回 (method, path, body, headers)"""
+        path = self.path(self, i) if callable(self.path) else self.path
+        body = self.body(i) if callable(self.body) else self.body
+        headers = {}
+        if self.cookie is not None:
+            headers['Cookie'] = self.cookie(app)
+        if self.content_type is not None:
+            headers['Content-Type'] = self.content_type(body) if callable(self.content_type) else self.content_type
+        return self.method, path, body, headers
+
+
+def _json_body(factory):
+    return lambda i: json.dumps(factory(i)).encode('utf-8')
+
+
+def _multipart_upload(i):
+    boundary = f'bench{uuid.uuid4().hex}'
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="bench_{i}.png"\r\n'
+        'Content-Type: image/png\r\n\r\n'
+    ).encode('utf-8') + TINY_PNG + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return boundary, body
+
+
+class _UploadBody:
+    """multipart 请求体和 Content-Type 需要使用同一个 boundary"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def body(self, i):
+        boundary, body = _multipart_upload(i)
+        self._local.boundary = boundary
+        return body
+
+    def content_type(self, body):
+        return f'multipart/form-data; boundary={self._local.boundary}'
+
+
+def _insert_rows(resource):
+    """预先插入记录，返回新记录 ID 列表"""
+    def prepare(app, count):
+        from database import get_db_connection
+        factory = SAMPLE_PAYLOADS[resource]
+        conn = get_db_connection()
+        ids = []
+        for i in range(count):
+            data = factory(i)
+            columns = ', '.join(data)
+            placeholders = ', '.join('?' for _ in data)
+            cursor = conn.execute(f'INSERT INTO {resource} ({columns}) VALUES ({placeholders})',
+                                  tuple(data.values()))
+            ids.append(cursor.lastrowid)
+        conn.commit()
+        conn.close()
+        return ids
+    return prepare
+
+
+def _existing_ids(resource):
+    """更新场景循环使用少量已存在的记录"""
+    def prepare(app, count):
+        ids = _insert_rows(resource)(app, min(count, 16))
+        return itertools.cycle(ids)
+    return prepare
+
+
+def _item_path(resource):
+    return lambda scenario, i: f'/api/{resource}/{scenario.next_id()}'
+
+
+def build_scenarios():
+    """构建覆盖全部路由的场景列表"""
+    scenarios = [
+        Scenario('GET /', 'GET', '/', group='page'),
+        Scenario('GET /admin', 'GET', '/admin', group='page'),
+        Scenario('GET /api/profile', 'GET', '/api/profile'),
+        Scenario('GET /api/settings', 'GET', '/api/settings'),
+        Scenario('GET /api/check-auth', 'GET', '/api/check-auth'),
+        # 由物化表提供：论文数量再多也只读汇总行
+        Scenario('GET /api/analytics/publications', 'GET', '/api/analytics/publications'),
+        Scenario('GET /api/tags', 'GET', '/api/tags'),
+        Scenario('GET /api/captcha', 'GET', '/api/captcha', group='auth'),
+        Scenario('POST /api/login', 'POST', '/api/login', group='auth',
+                 body=lambda i: json.dumps({'username': BENCH_USERNAME, 'password': BENCH_PASSWORD,
+                                            'captcha': BENCH_CAPTCHA}).encode('utf-8'),
+                 content_type='application/json', cookie=captcha_cookie),
+        Scenario('POST /api/logout', 'POST', '/api/logout', group='auth', cookie=auth_cookie),
+        Scenario('PUT /api/profile', 'PUT', '/api/profile', group='write',
+                 body=lambda i: json.dumps({'title': f'Research Scientist {i}'}).encode('utf-8'),
+                 content_type='application/json', cookie=auth_cookie),
+        Scenario('PUT /api/settings', 'PUT', '/api/settings', group='write',
+                 body=lambda i: json.dumps({'site_title': f'个人学术主页 {i}', 'beian': '',
+                                            'site_description': '', 'keywords': '',
+                                            'analytics_code': ''}).encode('utf-8'),
+                 content_type='application/json', cookie=auth_cookie),
+    ]
+
+    for resource, factory in SAMPLE_PAYLOADS.items():
+        scenarios.extend([
+            Scenario(f'GET /api/{resource}', 'GET', f'/api/{resource}'),
+            Scenario(f'POST /api/{resource}', 'POST', f'/api/{resource}', group='write',
+                     body=_json_body(factory), content_type='application/json', cookie=auth_cookie),
+            Scenario(f'PUT /api/{resource}/<id>', 'PUT', _item_path(resource), group='write',
+                     body=_json_body(factory), content_type='application/json', cookie=auth_cookie,
+                     prepare=_existing_ids(resource)),
+            Scenario(f'DELETE /api/{resource}/<id>', 'DELETE', _item_path(resource), group='write',
+                     cookie=auth_cookie, prepare=_insert_rows(resource)),
+        ])
+
+    upload = _UploadBody()
+    scenarios.append(Scenario('POST /api/upload', 'POST', '/api/upload', group='write',
+                              body=upload.body, content_type=upload.content_type, cookie=auth_cookie))
+    return scenarios
+
+
+def select_scenarios(scenarios, names=None, groups=None):
+    """按名称子串或分组筛选场景"""
+    selected = scenarios
+    if groups:
+        selected = [s for s in selected if s.group in groups]
+    if names:
+        selected = [s for s in selected if any(n in s.name for n in names)]
+    return selected
@@ -0,0 +1,74 @@
+"""
+列表接口序列化方式对比：python（逐行组装 + jsonify）与 sqlite（在 SQLite 内生成 JSON）
+
+用法：
+    python -m benchmarks.serialization --preset department-portal --repeat 50
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.harness import load_app
+from benchmarks.runner import percentile
+
+
+def _time_mode(app, path, mode, repeat):
+    app.config['JSON_SERIALIZATION'] = mode
+    client = app.test_client(use_cookies=False)
+    client.get(path)
+    latencies = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        body = response.get_data()
+        latencies.append(time.perf_counter() - start)
+        size = len(body)
+    latencies.sort()
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'bytes': size,
+        'body': body,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.serialization',
+                                     description='对比两种列表序列化方式的耗时和响应大小')
+    parser.add_argument('--preset', default='prolific-professor',
+                        choices=['small-lab', 'prolific-professor', 'department-portal'])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=30, help='每种方式的请求次数')
+    parser.add_argument('--save', help='保存 JSON 结果的路径')
+    args = parser.parse_args(argv)
+
+    from resources import RESOURCES, SINGLETONS
+
+    app, workdir = load_app(preset=args.preset, seed=args.seed)
+    print(f"工作目录: {workdir}")
+
+    results = []
+    for resource in RESOURCES + SINGLETONS:
+        path = f'/api/{resource.name}'
+        python_stats = _time_mode(app, path, 'python', args.repeat)
+        sqlite_stats = _time_mode(app, path, 'sqlite', args.repeat)
+        same = json.loads(python_stats.pop('body')) == json.loads(sqlite_stats.pop('body'))
+        speedup = python_stats['p50_ms'] / sqlite_stats['p50_ms'] if sqlite_stats['p50_ms'] else 0.0
+        results.append({'route': path, 'python': python_stats, 'sqlite': sqlite_stats,
+                        'speedup_p50': round(speedup, 2), 'identical': same})
+        print(f"{path:<22} python p50 {python_stats['p50_ms']:>8.2f}ms {python_stats['bytes']:>9}B   "
+              f"sqlite p50 {sqlite_stats['p50_ms']:>8.2f}ms {sqlite_stats['bytes']:>9}B   "
+              f"x{speedup:.2f}{'' if same else '  (内容不一致!)'}")
+
+    if args.save:
+        from benchmarks.report import build_report, save_report
+        save_report(build_report(results, vars(args)), args.save)
+        print(f"结果已保存: {args.save}")
+    return 0 if all(r['identical'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
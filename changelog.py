@@ -0,0 +1,169 @@
+"""
+变更日志与增量同步源
+
+每次通过资源注册表写入时，在同一个事务内向 change_log 追加一条记录（seq 单调递增）：
+    upsert    data 为写入后整行的 JSON
+    delete    data 为空
+    truncate  整表被清空（replace 模式导入），row_id 为空
+只读副本通过 /api/changes?since=<seq> 拉取增量，同一行的多次修改只返回最新的一条；
+请求可以携带 wait 参数长轮询，有新的提交时立即返回，副本因此能在毫秒级追上主节点。
+日志只保留最近 CHANGE_LOG_RETENTION 条，副本落后太多时需要重新拉取全量快照。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from resources import REGISTRY, SQLITE_JSON_AVAILABLE, after_commit, on_write
+
+CHANGE_LOG_RETENTION = int(os.environ.get('CHANGE_LOG_RETENTION', '100000'))
+# 每写入多少条检查一次是否需要清理
+PRUNE_EVERY = 1000
+DEFAULT_LIMIT = 1000
+MAX_WAIT = 30.0
+
+_columns = {}
+_new_commit = threading.Condition()
+_generation = 0
+
+
+class ChangeLogGap(Exception):
+    """请求的 seq 之后的部分日志已被清理，副本需要重新拉取全量快照"""
+
+
+def _table_columns(conn, table):
+    columns = _columns.get(table)
+    if columns is None:
+        columns = _columns[table] = [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+    return columns
+
+
+def _row_json_expr(columns):
+    return 'json_object(' + ', '.join(f"'{c}', {c}" for c in columns) + ')'
+
+
+def _prune(conn, seq, count=1):
+    # 批量写入的 seq 可能跨过检查点，用本次写入的条数判断
+    if seq % PRUNE_EVERY < count:
+        conn.execute('DELETE FROM change_log WHERE seq <= ?', (seq - CHANGE_LOG_RETENTION,))
+
+
+def record_rows(conn, table, ids):
+    """记录若干行的当前内容（upsert），ids 为 None 时记录整张表"""
+    columns = _table_columns(conn, table)
+    where = '' if ids is None else ' WHERE id IN (SELECT value FROM json_each(?))'
+    params = () if ids is None else (json.dumps(list(ids)),)
+    if SQLITE_JSON_AVAILABLE:
+        cursor = conn.execute(f"INSERT INTO change_log (table_name, row_id, op, data) "
+                              f"SELECT '{table}', id, 'upsert', {_row_json_expr(columns)} FROM {table}{where} "
+                              f"ORDER BY id", params)
+    else:
+        if ids is not None:
+            where = f' WHERE id IN ({", ".join("?" for _ in ids)})'
+            params = tuple(ids)
+        rows = conn.execute(f'SELECT {", ".join(columns)} FROM {table}{where} ORDER BY id', params).fetchall()
+        cursor = conn.executemany(
+            'INSERT INTO change_log (table_name, row_id, op, data) VALUES (?, ?, ?, ?)',
+            [(table, row[0], 'upsert', json.dumps(dict(zip(columns, row)), ensure_ascii=False)) for row in rows])
+    if cursor.rowcount > 0:
+        _prune(conn, cursor.lastrowid, cursor.rowcount)
+
+
+def record_delete(conn, table, row_id):
+    seq = conn.execute('INSERT INTO change_log (table_name, row_id, op) VALUES (?, ?, ?)',
+                       (table, row_id, 'delete')).lastrowid
+    _prune(conn, seq)
+
+
+def record_truncate(conn, table):
+    seq = conn.execute('INSERT INTO change_log (table_name, op) VALUES (?, ?)', (table, 'truncate')).lastrowid
+    _prune(conn, seq)
+
+
+@on_write
+def _on_write(conn, resource, action, item_id, old, new):
+    if action == 'delete':
+        record_delete(conn, resource.table, item_id)
+    else:
+        record_rows(conn, resource.table, [item_id])
+
+
+@after_commit
+def _on_commit(resource, action, item_id):
+    # 唤醒正在长轮询的副本
+    global _generation
+    with _new_commit:
+        _generation += 1
+        _new_commit.notify_all()
+
+
+def current_seq(conn):
+    try:
+        return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+    except sqlite3.OperationalError:
+        # 尚未升级的数据库没有变更日志表
+        return 0
+
+
+def changes_since(conn, since, limit=DEFAULT_LIMIT):
+    """返回 since 之后的变更（每行只保留最新一条，按 seq 升序）
+
+    结果包含 last_seq（下一次请求的 since）和 more（是否还有未返回的变更）。
+    """
+    oldest, newest = conn.execute('SELECT MIN(seq), COALESCE(MAX(seq), 0) FROM change_log').fetchone()
+    if since > newest:
+        raise ChangeLogGap(f'Seq {since} is ahead of the change log ({newest})')
+    if since > 0 and oldest is not None and since < oldest - 1:
+        raise ChangeLogGap(f'Changes after seq {since} are no longer available')
+
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute('''
+        SELECT seq, table_name, row_id, op, data FROM change_log
+        WHERE seq IN (SELECT MAX(seq) FROM change_log WHERE seq > ? GROUP BY table_name, row_id)
+        ORDER BY seq LIMIT ?
+    ''', (since, limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = [{
+        'seq': seq, 'table': table, 'id': row_id, 'op': op,
+        'data': json.loads(data) if data else None,
+    } for seq, table, row_id, op, data in rows]
+    last_seq = rows[-1][0] if rows else newest
+    return {'changes': changes, 'last_seq': last_seq, 'more': more}
+
+
+def wait_for_changes(conn, since, timeout):
+    """阻塞直到出现 seq 大于 since 的变更或超时，返回当前最大 seq"""
+    timeout = min(max(timeout, 0.0), MAX_WAIT)
+    generation = _generation
+    seq = current_seq(conn)
+    if seq > since or timeout == 0:
+        return seq
+    with _new_commit:
+        # 检查和等待之间发生的提交也会被看到，不会白等到超时
+        _new_commit.wait_for(lambda: _generation != generation, timeout)
+    return current_seq(conn)
+
+
+def apply_changes(conn, changes):
+    """在副本上应用一批变更（调用方负责提交），返回受影响的表名集合"""
+    touched = set()
+    for change in changes:
+        table = change['table']
+        if table not in REGISTRY:
+            continue
+        if change['op'] == 'truncate':
+            conn.execute(f'DELETE FROM {table}')
+        elif change['op'] == 'delete':
+            conn.execute(f'DELETE FROM {table} WHERE id = ?', (change['id'],))
+        else:
+            local = set(_table_columns(conn, table))
+            columns = [c for c in change['data'] if c in local]
+            conn.execute(f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) '
+                         f'VALUES ({", ".join("?" for _ in columns)})',
+                         tuple(change['data'][c] for c in columns))
+        touched.add(table)
+    return touched
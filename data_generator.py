@@ -0,0 +1,244 @@
+"""
+大规模合成数据生成器
+
+按预设规模（小型实验室、高产教授、院系门户）向数据库批量写入论文、项目、经历、奖项和友情链接，
+字段长度分布尽量贴近真实数据：长篇 Markdown 详细描述、多作者列表、中英文混合文本。
+同一个随机种子总是生成完全相同的数据，便于基准测试前后对比。
+"""
+
+import random
+from datetime import date, timedelta
+
+import changelog
+from database import get_db_connection
+from resources import REGISTRY, notify_commit
+
+PRESETS = {
+    'small-lab': {
+        'publications': 40, 'projects': 10, 'experience': 5, 'education': 3, 'awards': 8, 'friends': 10,
+    },
+    'prolific-professor': {
+        'publications': 800, 'projects': 120, 'experience': 15, 'education': 4, 'awards': 60, 'friends': 40,
+    },
+    'department-portal': {
+        'publications': 5000, 'projects': 600, 'experience': 80, 'education': 30, 'awards': 400, 'friends': 200,
+    },
+}
+
+CONTENT_TABLES = ['publications', 'projects', 'experience', 'education', 'awards', 'friends']
+
+EN_WORDS = (
+    'learning deep neural network graph attention transformer efficient scalable robust adaptive '
+    'representation language vision multimodal retrieval generation reasoning knowledge benchmark '
+    'optimization federated contrastive self-supervised sparse quantization inference distributed '
+    'causal generative diffusion reinforcement policy embedding semantic temporal spatial hierarchical'
+).split()
+
+CJK_WORDS = (
+    '深度学习 神经网络 知识图谱 自然语言处理 计算机视觉 多模态 预训练模型 强化学习 推荐系统 '
+    '信息抽取 语义理解 图神经网络 联邦学习 对比学习 生成模型 因果推断 模型压缩 分布式训练 '
+    '可解释性 鲁棒性 大语言模型 检索增强 情感分析 机器翻译 问答系统 时空数据 医学影像'
+).split()
+
+SURNAMES = '王李张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗'
+GIVEN_NAMES = ['伟', '芳', '娜', '敏', '静', '磊', '洋', '勇', '艳', '杰', '涛', '明', '超', '霞', '平', '刚']
+EN_FIRST = ['Alice', 'Bob', 'Carol', 'David', 'Emma', 'Frank', 'Grace', 'Henry', 'Iris', 'Jack', 'Kate', 'Leo']
+EN_LAST = ['Smith', 'Johnson', 'Brown', 'Garcia', 'Miller', 'Davis', 'Wilson', 'Moore', 'Taylor', 'Lee', 'Chen']
+
+VENUES = [
+    ('Advances in Neural Information Processing Systems (NeurIPS)', 'conference'),
+    ('International Conference on Machine Learning (ICML)', 'conference'),
+    ('Annual Meeting of the Association for Computational Linguistics (ACL)', 'conference'),
+    ('IEEE Conference on Computer Vision and Pattern Recognition (CVPR)', 'conference'),
+    ('ACM SIGKDD Conference on Knowledge Discovery and Data Mining', 'conference'),
+    ('IEEE Transactions on Knowledge and Data Engineering', 'journal'),
+    ('IEEE Transactions on Pattern Analysis and Machine Intelligence', 'journal'),
+    ('Journal of Machine Learning Research', 'journal'),
+    ('计算机学报', 'journal'),
+    ('软件学报', 'journal'),
+    ('中国科学：信息科学', 'journal'),
+    ('arXiv preprint', 'preprint'),
+]
+
+INSTITUTIONS = ['清华大学', '北京大学', '浙江大学', 'Stanford University', 'MIT', 'Carnegie Mellon University',
+                'University of Oxford', '上海交通大学', '中国科学院', 'ETH Zurich']
+
+
+class _Generator:
+    """封装随机源的字段生成器"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def length(self, median, sigma=0.6, minimum=1, maximum=None):
+        """对数正态分布的长度：多数接近中位数，少数很长"""
+        value = int(self.rng.lognormvariate(0, sigma) * median)
+        value = max(minimum, value)
+        return min(value, maximum) if maximum else value
+
+    def cjk_text(self, words):
+        return '，'.join(''.join(self.rng.sample(CJK_WORDS, 2)) for _ in range(max(1, words // 2))) + '。'
+
+    def en_text(self, words):
+        text = ' '.join(self.rng.choice(EN_WORDS) for _ in range(words))
+        return text[:1].upper() + text[1:] + '.'
+
+    def text(self, words):
+        """中英文混合正文"""
+        if self.rng.random() < 0.5:
+            return self.cjk_text(words)
+        return self.en_text(words)
+
+    def title(self):
+        if self.rng.random() < 0.4:
+            return '面向' + self.rng.choice(CJK_WORDS) + '的' + ''.join(self.rng.sample(CJK_WORDS, 2)) + '方法研究'
+        return self.en_text(self.length(8, sigma=0.3, minimum=4, maximum=20)).rstrip('.').title()
+
+    def person(self):
+        if self.rng.random() < 0.5:
+            return self.rng.choice(SURNAMES) + ''.join(self.rng.sample(GIVEN_NAMES, self.rng.randint(1, 2)))
+        return f'{self.rng.choice(EN_FIRST)} {self.rng.choice(EN_LAST)}'
+
+    def authors(self):
+        # 作者数量长尾分布：多数 2-6 人，少量大型合作论文几十人
+        count = self.length(4, sigma=0.7, minimum=1, maximum=60)
+        names = [self.person() for _ in range(count)]
+        names.insert(self.rng.randint(0, min(count, 3)), 'Dr. Academic')
+        return ', '.join(names)
+
+    def tags(self, count=None):
+        count = count or self.rng.randint(1, 5)
+        return ','.join(self.rng.sample(CJK_WORDS, count))
+
+    def keywords(self):
+        return ', '.join(self.rng.sample(CJK_WORDS + EN_WORDS, self.rng.randint(2, 6)))
+
+    def day(self, start_year=2005, end_year=2025):
+        start = date(start_year, 1, 1)
+        return start + timedelta(days=self.rng.randint(0, (end_year - start_year) * 365))
+
+    def markdown(self):
+        """生成带标题、列表、代码块和表格的长篇 Markdown"""
+        sections = [f'# {self.title()}', '', '## 项目概述', self.text(self.length(60, minimum=10))]
+        for _ in range(self.length(3, sigma=0.5, maximum=12)):
+            sections += ['', f'## {self.rng.choice(CJK_WORDS)}']
+            sections += [f'- **{self.rng.choice(CJK_WORDS)}**：{self.text(self.length(12))}'
+                         for _ in range(self.rng.randint(2, 6))]
+            roll = self.rng.random()
+            if roll < 0.2:
+                sections += ['', '```python', 'def train(model, data):',
+                             '    for batch in data:', '        model.step(batch)', '```']
+            elif roll < 0.4:
+                sections += ['', '| 数据集 | 基线 | 本文 |', '|------|------|------|']
+                sections += [f'| {self.rng.choice(EN_WORDS).upper()} | {self.rng.uniform(50, 80):.1f}% '
+                             f'| **{self.rng.uniform(80, 95):.1f}%** |' for _ in range(self.rng.randint(2, 5))]
+            sections += ['', self.text(self.length(40))]
+        return '\n'.join(sections)
+
+
+def _publication(gen, i):
+    venue, pub_type = gen.rng.choice(VENUES)
+    year = gen.rng.randint(2005, 2025)
+    doi = f'10.{gen.rng.randint(1000, 9999)}/synthetic.{year}.{i:05d}' if gen.rng.random() < 0.8 else ''
+    first_page = gen.rng.randint(1, 3000)
+    return (gen.title(), gen.authors(), venue, year, str(gen.rng.randint(1, 60)),
+            f'{first_page}-{first_page + gen.rng.randint(5, 20)}', doi,
+            f'https://doi.org/{doi}' if doi else '', gen.text(gen.length(120, minimum=20)),
+            gen.keywords(), pub_type, 0)
+
+
+def _project(gen, i):
+    start = gen.day()
+    end = start + timedelta(days=gen.rng.randint(90, 1500))
+    status = gen.rng.choice(['completed', 'completed', 'ongoing', 'planned'])
+    return (gen.title(), gen.text(gen.length(30, minimum=5)), gen.markdown(), gen.rng.choice(['项目负责人', '核心成员', '算法工程师', '技术负责人']),
+            start.isoformat(), end.isoformat() if status == 'completed' else None,
+            ', '.join(gen.rng.sample(['Python', 'PyTorch', 'TensorFlow', 'CUDA', 'Redis', 'Neo4j', 'FastAPI', 'Rust', 'C++'], 3)),
+            f'https://project{i}.example.com' if gen.rng.random() < 0.5 else '',
+            f'https://github.com/researcher/project-{i}', status, gen.tags(), 0)
+
+
+def _experience(gen, i):
+    start = gen.day(2000, 2024)
+    end = start + timedelta(days=gen.rng.randint(180, 2000))
+    return (gen.rng.choice(['研究科学家', '博士后研究员', '访问学者', '研究助理', '副教授', '教授']),
+            gen.rng.choice(INSTITUTIONS) + gen.rng.choice(['', '计算机系', '人工智能实验室']),
+            start.isoformat(), end.isoformat() if gen.rng.random() < 0.85 else None,
+            gen.text(gen.length(50, minimum=10)), gen.rng.choice(['北京', '上海', '杭州', 'Boston', 'Zurich']),
+            gen.tags(), 0)
+
+
+def _education(gen, i):
+    start_year = gen.rng.randint(1995, 2020)
+    return (gen.rng.choice(['学士学位', '硕士学位', '博士学位']), gen.rng.choice(INSTITUTIONS),
+            gen.rng.choice(['计算机科学', '人工智能', '软件工程', '数学', '统计学']),
+            start_year, start_year + gen.rng.randint(2, 6), gen.text(gen.length(30, minimum=5)), gen.tags(), 0)
+
+
+def _award(gen, i):
+    return (gen.rng.choice(['优秀青年学者奖', '最佳论文奖', 'Outstanding Paper Award', '青年科学基金', '教学成果奖']) + f' #{i}',
+            gen.rng.choice(['IEEE', 'ACM', '国家自然科学基金委员会', '中国计算机学会', 'AAAI']),
+            gen.rng.randint(2005, 2025), gen.text(gen.length(20, minimum=5)), gen.tags(), 0)
+
+
+def _friend(gen, i):
+    return (f'{gen.person()} 的主页', f'https://friend{i}.example.com', gen.text(gen.length(10, minimum=3)),
+            f'https://friend{i}.example.com/avatar.png', 0, 1)
+
+
+TABLE_SPECS = {
+    'publications': (_publication, '(title, authors, journal, year, volume, pages, doi, url, abstract, keywords, type, order_index)'),
+    'projects': (_project, '(title, description, detailed_description, role, start_date, end_date, technologies, url, github_url, status, tags, order_index)'),
+    'experience': (_experience, '(position, organization, start_date, end_date, description, location, tags, order_index)'),
+    'education': (_education, '(degree, institution, field, start_year, end_year, description, tags, order_index)'),
+    'awards': (_award, '(title, organization, year, description, tags, order_index)'),
+    'friends': (_friend, '(name, url, description, avatar, order_index, is_active)'),
+}
+
+
+def resolve_counts(preset=None, **overrides):
+    """合并预设规模与单独指定的数量"""
+    counts = dict(PRESETS[preset]) if preset else {table: 0 for table in CONTENT_TABLES}
+    counts.update({k: v for k, v in overrides.items() if v is not None})
+    return counts
+
+
+def generate_data(counts, seed=0, clear=False, batch_size=1000):
+    """在一个事务中批量写入合成数据，返回每张表写入的行数
+
+    写入的行（以及 clear 的清空）同时记入变更日志，只读副本可以同步到；提交后按批量导入通知写钩子，
+    标签索引、统计、订阅、外部图片等派生数据由各自的提交后钩子重建。
+    """
+    conn = get_db_connection()
+    inserted = {}
+    try:
+        if clear:
+            for table in CONTENT_TABLES:
+                conn.execute(f'DELETE FROM {table}')
+                changelog.record_truncate(conn, table)
+
+        for table in CONTENT_TABLES:
+            count = counts.get(table, 0)
+            if not count:
+                continue
+            # 每张表使用独立的随机源，调整某一张表的数量不会改变其他表的数据
+            gen = _Generator(f'{seed}:{table}')
+            factory, columns = TABLE_SPECS[table]
+            placeholders = ', '.join('?' for _ in columns.strip('()').split(','))
+            sql = f'INSERT INTO {table} {columns} VALUES ({placeholders})'
+            first_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}').fetchone()[0]
+            for start in range(0, count, batch_size):
+                conn.executemany(sql, (factory(gen, i) for i in range(start, min(count, start + batch_size))))
+            ids = [row[0] for row in conn.execute(f'SELECT id FROM {table} WHERE id >= ?', (first_id,)).fetchall()]
+            changelog.record_rows(conn, table, ids)
+            inserted[table] = count
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for table in CONTENT_TABLES if clear else inserted:
+        notify_commit(REGISTRY[table], 'import', None)
+    return inserted
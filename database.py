@@ -1,21 +1,248 @@
 import sqlite3
-import hashlib
+import contextvars
 import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 
 DATABASE_PATH = 'academic_homepage.db'
 
+# SQL执行监听器，签名为 listener(event)，event 为 QueryEvent
+_query_listeners = []
+
+def add_query_listener(listener):
+    """注册SQL执行监听器（用于统计查询次数、耗时与行数）"""
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+
+def remove_query_listener(listener):
+    """移除SQL执行监听器"""
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+class QueryEvent:
+    """一条SQL语句的执行记录
+
+    对于 SELECT，duration 包含读取结果行的时间，rows 为实际读取的行数；
+    对于写语句，rows 为受影响的行数。
+    """
+
+    __slots__ = ('sql', 'parameters', 'duration', 'rows', 'connection', 'error')
+
+    def __init__(self, sql, parameters, duration, connection):
+        self.sql = sql
+        self.parameters = parameters
+        self.duration = duration
+        self.rows = 0
+        self.connection = connection
+        self.error = None
+
+def _notify_query(event):
+    for listener in _query_listeners:
+        try:
+            listener(event)
+        except Exception:
+            # 监听器异常不能影响正常查询
+            pass
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """执行SQL时通知监听器的游标
+
+    SELECT 语句在结果读取完毕、游标关闭或被回收时才上报，以便统计读取耗时和行数。
+    """
+
+    _event = None
+
+    def _finish(self):
+        event = self._event
+        if event is not None:
+            self._event = None
+            _notify_query(event)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        if not _query_listeners:
+            return super().execute(sql, parameters)
+        event = QueryEvent(sql, parameters, 0.0, self.connection)
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except Exception as e:
+            event.duration = time.perf_counter() - start
+            event.error = str(e)
+            _notify_query(event)
+            raise
+        event.duration = time.perf_counter() - start
+        if self.description is None:
+            event.rows = self.rowcount
+            _notify_query(event)
+        else:
+            self._event = event
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        if not _query_listeners:
+            return super().executemany(sql, seq_of_parameters)
+        event = QueryEvent(sql, (), 0.0, self.connection)
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+            event.rows = self.rowcount
+        except Exception as e:
+            event.error = str(e)
+            raise
+        finally:
+            event.duration = time.perf_counter() - start
+            _notify_query(event)
+        return self
+
+    def fetchone(self):
+        event = self._event
+        if event is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        event.duration += time.perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            event.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        event = self._event
+        if event is None:
+            return super().fetchmany(size or self.arraysize)
+        start = time.perf_counter()
+        rows = super().fetchmany(size or self.arraysize)
+        event.duration += time.perf_counter() - start
+        event.rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        event = self._event
+        if event is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        event.duration += time.perf_counter() - start
+        event.rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        event = self._event
+        if event is None:
+            return super().__next__()
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            event.duration += time.perf_counter() - start
+            self._finish()
+            raise
+        event.duration += time.perf_counter() - start
+        event.rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+class InstrumentedConnection(sqlite3.Connection):
+    """默认使用 InstrumentedCursor 的连接
+
+    sqlite3.Connection.execute 不经过 cursor() 方法创建游标，因此需要同时重写 execute/executemany。
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# 每个线程复用的连接可以缓存的预编译语句数量
+STATEMENT_CACHE_SIZE = 256
+# 每个线程最多保留的连接数（多站点模式下每个站点一个连接），超出时关闭最久未用的连接
+MAX_POOLED_CONNECTIONS = max(2, int(os.environ.get('TENANT_CONNECTIONS_PER_THREAD', '4')))
+# 站点数据库（DATABASE_PATH 以外的文件）连接的页缓存大小（KB）和预编译语句缓存数量
+TENANT_PAGE_CACHE_KB = int(os.environ.get('TENANT_PAGE_CACHE_KB', '1024'))
+TENANT_STATEMENT_CACHE_SIZE = 64
+
+_local = threading.local()
+
+# 当前上下文使用的数据库文件（多站点模式下由 tenants 按请求切换，未设置时为 DATABASE_PATH）
+_current_path = contextvars.ContextVar('database_path', default=None)
+
+def current_database_path():
+    """当前上下文使用的数据库文件路径"""
+    return _current_path.get() or DATABASE_PATH
+
+@contextmanager
+def use_database(path):
+    """在 with 块内（包括其中调用的所有函数）使用另一个数据库文件"""
+    token = _current_path.set(path)
+    try:
+        yield
+    finally:
+        _current_path.reset(token)
+
 def get_db_connection():
     """获取数据库连接"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    path = current_database_path()
+    tenant = path != DATABASE_PATH
+    conn = sqlite3.connect(path, factory=InstrumentedConnection,
+                           cached_statements=TENANT_STATEMENT_CACHE_SIZE if tenant else STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    if tenant:
+        conn.execute(f'PRAGMA cache_size = -{TENANT_PAGE_CACHE_KB}')
     return conn
 
+@contextmanager
+def pooled_connection():
+    """获取当前线程复用的数据库连接
+
+    连接在同一线程内跨请求保留，SQLite 的预编译语句缓存因此可以持续命中。
+    每个线程按数据库文件各保留一个连接，最多 MAX_POOLED_CONNECTIONS 个（LRU）。
+    退出时成功则提交，异常则回滚，连接本身不会关闭。
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = OrderedDict()
+    path = current_database_path()
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = get_db_connection()
+        while len(connections) > MAX_POOLED_CONNECTIONS:
+            connections.popitem(last=False)[1].close()
+    else:
+        connections.move_to_end(path)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
 def init_database():
     """初始化数据库表结构"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # WAL 模式：读操作（包括长时间的流式导出）不阻塞写操作
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # 用户表（管理员账户）
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -164,6 +391,197 @@ def init_database():
         )
     ''')
     
+    # 标签表与内容-标签关联表（由 tags / keywords 字段派生）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS item_tags (
+            tag_id INTEGER NOT NULL,
+            resource TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            PRIMARY KEY (tag_id, resource, item_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_item_tags_item ON item_tags (resource, item_id)')
+    
+    # 论文统计物化表：每篇论文的统计要素，以及按维度汇总的计数和合作者关系
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS publication_facts (
+            publication_id INTEGER PRIMARY KEY,
+            year INTEGER,
+            type TEXT,
+            venue TEXT,
+            authors TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS publication_stats (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (dimension, key)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS coauthor_edges (
+            author_a TEXT NOT NULL,
+            author_b TEXT NOT NULL,
+            weight INTEGER NOT NULL,
+            PRIMARY KEY (author_a, author_b)
+        ) WITHOUT ROWID
+    ''')
+    
+    # 相关论文/项目推荐：每条记录预先计算的相关条目（JSON），以及计算时的语料摘要
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS related_items (
+            resource TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            related TEXT NOT NULL,
+            PRIMARY KEY (resource, item_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS related_state (
+            resource TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            updated_at TIMESTAMP
+        )
+    ''')
+    
+    # 内容版本号（任何内容写入都会加一，前台 Service Worker 据此判断缓存是否过期）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS content_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO content_version (id, version) VALUES (1, 0)')
+    
+    # 后台任务队列：等待中的相同任务（kind + dedup_key）只保留一条；heartbeat_at 为执行中任务最后一次续租的时间
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            dedup_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_at REAL NOT NULL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL,
+            last_error TEXT
+        )
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (kind, dedup_key) "
+                   "WHERE status = 'pending'")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_at)')
+    
+    # 每张内容表的版本号和最后修改时间，以及据此缓存的 sitemap、订阅和 JSON-LD（version 为生成时的来源表版本）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            changed_at INTEGER NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS artifacts (
+            name TEXT NOT NULL,
+            base_url TEXT NOT NULL,
+            version TEXT NOT NULL,
+            body BLOB NOT NULL,
+            etag TEXT NOT NULL,
+            last_modified INTEGER NOT NULL,
+            generated_at INTEGER NOT NULL,
+            PRIMARY KEY (name, base_url)
+        )
+    ''')
+    
+    # 外部图片缓存：内容中引用的外部图片地址、缩放后的图片数据、上游的 ETag / Last-Modified 和下次获取时间
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_cache (
+            url TEXT PRIMARY KEY,
+            data BLOB,
+            content_type TEXT,
+            etag TEXT,
+            upstream_etag TEXT,
+            upstream_last_modified TEXT,
+            fetched_at INTEGER,
+            next_fetch_at INTEGER NOT NULL,
+            failures INTEGER NOT NULL DEFAULT 0,
+            error TEXT
+        )
+    ''')
+    
+    # 真实用户性能数据：固定行数的环形样本表（slot = seq % 行数）、写入序号和汇总进度、每小时百分位数汇总
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rum_samples (
+            slot INTEGER PRIMARY KEY,
+            recorded_at INTEGER NOT NULL,
+            page TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rum_samples_recorded_at ON rum_samples (recorded_at)')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rum_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            next_seq INTEGER NOT NULL,
+            rolled_up_to INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO rum_state (id, next_seq, rolled_up_to) VALUES (1, 0, 0)')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rum_hourly (
+            hour INTEGER NOT NULL,
+            page TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            name TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            p50 REAL,
+            p75 REAL,
+            p95 REAL,
+            p99 REAL,
+            PRIMARY KEY (hour, page, metric, name)
+        ) WITHOUT ROWID
+    ''')
+    
+    # 变更日志表（只读副本按 seq 增量同步）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER,
+            op TEXT NOT NULL,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # 副本同步状态（仅在只读副本上使用）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS replication_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    
     conn.commit()
     conn.close()
     print("Database initialized successfully!")
@@ -180,8 +598,9 @@ def create_admin_user(username, password, email=None):
         conn.close()
         return False
     
-    # 创建密码哈希
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    # 创建密码哈希（bcrypt）
+    from passwords import hash_password
+    password_hash = hash_password(password)
     
     try:
         cursor.execute('''
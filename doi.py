@@ -0,0 +1,250 @@
+"""
+按 DOI 补全论文信息（期刊、卷、页码、年份、作者）
+
+publications 中填写了 doi 的论文，缺少的字段从 DOI 元数据服务获取：
+    DOI_RESOLVER_URL + DOI   默认 https://doi.org/，以 Accept: application/vnd.citationstyles.csl+json
+                              请求 CSL JSON；也接受 Crossref REST API（https://api.crossref.org/works/）的
+                              {"message": {...}} 格式，测试时可以指向本地的 HTTP 服务
+需要获取的 DOI 每 DOI_BATCH_SIZE 个一批，由最多 DOI_FETCH_CONCURRENCY 个并发请求解析。
+解析结果（包括不存在的 DOI）按 DOI 保存在 DOI_CACHE_DIR 下的 JSON 文件中，DOI_CACHE_TTL 秒内
+不再访问网络（不存在的 DOI 缓存 DOI_NOT_FOUND_TTL 秒）；缓存与数据库无关，多个站点共用。
+
+所有 DOI 解析完成后在一个事务内写回：默认只填写为空的字段，overwrite=True 时用元数据覆盖已有内容。
+写入经过资源注册表（Resource.update），变更日志、统计、订阅等派生数据和普通保存一样在同一事务内更新。
+可以用 run.py enrich 直接执行，或通过 POST /api/admin/publications/enrich 作为后台任务（doi.enrich）执行；
+后台任务中有 DOI 因网络错误未能解析时任务失败并按任务队列的退避重试，已解析的部分命中缓存。
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from database import pooled_connection
+from jobs import job
+from resources import PUBLICATIONS, notify_commit
+
+DOI_RESOLVER_URL = os.environ.get('DOI_RESOLVER_URL', 'https://doi.org/')
+# 同时进行的请求数
+DOI_FETCH_CONCURRENCY = int(os.environ.get('DOI_FETCH_CONCURRENCY', '8'))
+DOI_FETCH_TIMEOUT = float(os.environ.get('DOI_FETCH_TIMEOUT', '10'))
+# 每批解析的 DOI 数
+DOI_BATCH_SIZE = int(os.environ.get('DOI_BATCH_SIZE', '100'))
+DOI_CACHE_DIR = os.environ.get('DOI_CACHE_DIR', os.path.join('cache', 'doi'))
+# 缓存有效期（秒）
+DOI_CACHE_TTL = int(os.environ.get('DOI_CACHE_TTL', str(30 * 24 * 3600)))
+DOI_NOT_FOUND_TTL = int(os.environ.get('DOI_NOT_FOUND_TTL', str(24 * 3600)))
+MAX_RESPONSE_BYTES = 2 * 1024 * 1024
+
+USER_AGENT = 'AcademicHomepage-DOI/1.0'
+ACCEPT = 'application/vnd.citationstyles.csl+json, application/json;q=0.9'
+FIELDS = ('journal', 'volume', 'pages', 'year', 'authors')
+
+_DOI_PATTERN = re.compile(r'^10\.\d{4,9}/\S+$')
+_DOI_PREFIX = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+
+
+class DoiError(Exception):
+    """DOI 元数据获取失败（网络错误、服务器错误或响应格式错误）"""
+
+
+def normalize_doi(value):
+    """去掉 https://doi.org/、doi: 前缀并转为小写（DOI 不区分大小写）；不是有效 DOI 时返回 None"""
+    if not value:
+        return None
+    doi = _DOI_PREFIX.sub('', str(value).strip()).strip().lower()
+    return doi if _DOI_PATTERN.match(doi) else None
+
+
+def _first(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return str(value).strip() if value not in (None, '') else None
+
+
+def _year(item):
+    for key in ('issued', 'published-print', 'published-online', 'published'):
+        parts = (item.get(key) or {}).get('date-parts') or []
+        if parts and parts[0] and parts[0][0]:
+            try:
+                return int(parts[0][0])
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def _author_name(author):
+    if author.get('literal') or author.get('name'):
+        return author.get('literal') or author.get('name')
+    return ' '.join(part for part in (author.get('given'), author.get('family')) if part)
+
+
+def parse_metadata(item):
+    """CSL JSON 转换为 publications 的字段，只返回有值的字段"""
+    if not isinstance(item, dict):
+        raise DoiError('Metadata must be a JSON object')
+    authors = ', '.join(name for name in (_author_name(a) for a in item.get('author') or []
+                                          if isinstance(a, dict)) if name)
+    fields = {
+        'journal': _first(item.get('container-title')),
+        'volume': _first(item.get('volume')),
+        'pages': _first(item.get('page')),
+        'year': _year(item),
+        'authors': authors or None,
+    }
+    return {field: value for field, value in fields.items() if value is not None}
+
+
+def fetch(doi):
+    """从元数据服务获取一个 DOI；返回字段字典，DOI 不存在时返回 None"""
+    url = DOI_RESOLVER_URL + urllib.parse.quote(doi, safe='/')
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, 'Accept': ACCEPT})
+    try:
+        with urllib.request.urlopen(request, timeout=DOI_FETCH_TIMEOUT) as response:
+            body = response.read(MAX_RESPONSE_BYTES + 1)
+    except urllib.error.HTTPError as e:
+        if e.code in (404, 410):
+            return None
+        raise DoiError(f'HTTP {e.code}')
+    except (urllib.error.URLError, OSError) as e:
+        raise DoiError(str(getattr(e, 'reason', e)))
+    if len(body) > MAX_RESPONSE_BYTES:
+        raise DoiError('Response too large')
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise DoiError('Invalid JSON response')
+    if isinstance(data, dict) and isinstance(data.get('message'), dict):
+        data = data['message']
+    return parse_metadata(data)
+
+
+def _cache_path(doi):
+    digest = hashlib.sha1(doi.encode()).hexdigest()
+    return os.path.join(DOI_CACHE_DIR, digest[:2], f'{digest}.json')
+
+
+def cache_get(doi, now=None):
+    """返回 (是否命中, 字段字典或 None)；过期或损坏的缓存视为未命中"""
+    now = time.time() if now is None else now
+    try:
+        with open(_cache_path(doi), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return False, None
+    metadata = entry.get('metadata')
+    ttl = DOI_CACHE_TTL if metadata is not None else DOI_NOT_FOUND_TTL
+    if entry.get('doi') != doi or now - entry.get('fetched_at', 0) > ttl:
+        return False, None
+    return True, metadata
+
+
+def cache_put(doi, metadata, now=None):
+    """写入缓存（先写临时文件再替换，并发读取不会看到写了一半的文件）"""
+    path = _cache_path(doi)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {'doi': doi, 'fetched_at': time.time() if now is None else now, 'metadata': metadata}
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _fetch_one(doi):
+    try:
+        return doi, fetch(doi), None
+    except DoiError as e:
+        return doi, None, str(e)
+
+
+def resolve(dois, refresh=False):
+    """解析一组 DOI（已规范化）；返回 ({doi: 字段字典或 None}, 统计)，获取失败的 DOI 不在结果中"""
+    results = {}
+    stats = {'cached': 0, 'fetched': 0, 'not_found': 0, 'failed': 0}
+    missing = []
+    for doi in dict.fromkeys(dois):
+        hit, metadata = (False, None) if refresh else cache_get(doi)
+        if hit:
+            results[doi] = metadata
+            stats['cached'] += 1
+        else:
+            missing.append(doi)
+    if not missing:
+        return results, stats
+    with ThreadPoolExecutor(max_workers=max(1, min(DOI_FETCH_CONCURRENCY, len(missing))),
+                            thread_name_prefix='doi-fetch') as executor:
+        for start in range(0, len(missing), DOI_BATCH_SIZE):
+            for doi, metadata, error in executor.map(_fetch_one, missing[start:start + DOI_BATCH_SIZE]):
+                if error is not None:
+                    print(f"DOI lookup failed ({doi}): {error}")
+                    stats['failed'] += 1
+                    continue
+                stats['fetched'] += 1
+                if metadata is None:
+                    stats['not_found'] += 1
+                cache_put(doi, metadata)
+                results[doi] = metadata
+    return results, stats
+
+
+def _is_empty(value):
+    return value is None or (isinstance(value, str) and not value.strip()) or value == 0
+
+
+def _changes(row, metadata, overwrite):
+    return {field: value for field, value in metadata.items()
+            if (overwrite or _is_empty(row.get(field))) and row.get(field) != value}
+
+
+def enrich(overwrite=False, refresh=False):
+    """补全当前数据库中论文的字段，返回统计；overwrite 覆盖已有内容，refresh 忽略缓存重新获取"""
+    missing = ' OR '.join(f"{field} IS NULL OR {field} = ''" for field in FIELDS)
+    where = "doi IS NOT NULL AND doi != ''" + ('' if overwrite else f' AND ({missing} OR year = 0)')
+    with pooled_connection() as conn:
+        rows = conn.execute(f'SELECT id, doi FROM publications WHERE {where}').fetchall()
+
+    targets = {}
+    for item_id, value in rows:
+        doi = normalize_doi(value)
+        if doi:
+            targets[item_id] = doi
+    results, stats = resolve(targets.values(), refresh=refresh)
+    stats.update({'publications': len(rows), 'invalid': len(rows) - len(targets), 'updated': 0})
+
+    # 网络请求期间内容可能被修改过，按写入时的当前值判断
+    updated = []
+    with pooled_connection() as conn:
+        for item_id, doi in targets.items():
+            metadata = results.get(doi)
+            if not metadata:
+                continue
+            row = PUBLICATIONS.fetch_one(conn, item_id)
+            if row is None or normalize_doi(row['doi']) != doi:
+                continue
+            changes = _changes(row, metadata, overwrite)
+            if changes:
+                PUBLICATIONS.update(conn, item_id, {**row, **changes})
+                updated.append(item_id)
+    for item_id in updated:
+        notify_commit(PUBLICATIONS, 'update', item_id)
+    stats['updated'] = len(updated)
+    return stats
+
+
+@job('doi.enrich', max_attempts=3)
+def enrich_job(payload):
+    stats = enrich(overwrite=bool(payload.get('overwrite')), refresh=bool(payload.get('refresh')))
+    print(f"DOI enrichment: {stats}")
+    if stats['failed']:
+        # 已解析的部分已经写入；重试时只有失败的 DOI 需要访问网络
+        raise DoiError(f"{stats['failed']} DOIs could not be resolved")
@@ -0,0 +1,356 @@
+"""
+外部图片的本地缓存（友情链接头像、个人头像）
+
+内容中引用的外部图片地址（friends.avatar、profile.avatar_url 中以 http:// 或 https:// 开头的地址）
+登记在 image_cache 表中，由后台线程池（最多 IMAGE_FETCH_CONCURRENCY 个并发请求）各下载一次，
+用 Pillow 统一方向、缩小到 IMAGE_MAX_SIZE 像素以内并重新编码（WebP，不支持时用 PNG），图片数据直接存入表中。
+SVG 不做转换，原样保存，返回时带有禁止脚本执行的 CSP。
+
+前台页面通过 /media/remote?url=<原地址> 显示这些图片：
+    已缓存      从本站返回，Cache-Control 为 IMAGE_CACHE_MAX_AGE，带 ETag（再次验证返回 304）
+    尚未下载    302 跳转到原地址，同时安排下载
+    未登记      404（只下载内容中出现过的地址，不是任意地址的代理）
+缓存超过 IMAGE_CACHE_TTL 后，下一次访问照常返回旧图片，并在后台带 If-None-Match / If-Modified-Since 重新获取；
+下载失败按指数退避重试。内容中不再引用的地址在写入时一并删除。
+
+下载器只连接公网地址：连接前解析主机名，拒绝回环、私有、链路本地（如 169.254.169.254）等非公网地址，
+跳转后的地址在连接时同样检查，且不经过 HTTP 代理（否则无法检查实际连接的地址）。多站点模式下任何站点管理员
+都能填写头像地址，不能借此让服务器访问内网。测试时设置 IMAGE_FETCH_ALLOW_PRIVATE=1 后可以指向本机的 HTTP 服务。
+"""
+
+import hashlib
+import http.client
+import ipaddress
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from database import current_database_path, pooled_connection, use_database
+from resources import FRIENDS, PROFILE, after_commit, on_write
+
+try:
+    from PIL import Image, ImageOps, features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# 同时进行的下载数
+IMAGE_FETCH_CONCURRENCY = int(os.environ.get('IMAGE_FETCH_CONCURRENCY', '4'))
+IMAGE_FETCH_TIMEOUT = float(os.environ.get('IMAGE_FETCH_TIMEOUT', '10'))
+# 允许下载本机和内网地址（只用于测试）
+IMAGE_FETCH_ALLOW_PRIVATE = os.environ.get('IMAGE_FETCH_ALLOW_PRIVATE', '0') == '1'
+# 缓存多久之后在后台重新获取（秒）
+IMAGE_CACHE_TTL = int(os.environ.get('IMAGE_CACHE_TTL', str(7 * 24 * 3600)))
+# 浏览器缓存时间（秒）
+IMAGE_CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+# 缩放后的最大边长（像素）
+IMAGE_MAX_SIZE = int(os.environ.get('IMAGE_MAX_SIZE', '256'))
+# 下载大小和原图像素数上限
+IMAGE_MAX_BYTES = 5 * 1024 * 1024
+MAX_PIXELS = 40_000_000
+# 下载失败后的重试间隔：RETRY_BASE × 2^失败次数，最长 IMAGE_CACHE_TTL
+RETRY_BASE = 60
+
+USER_AGENT = 'AcademicHomepage-ImageCache/1.0'
+ALLOWED_FORMATS = {'PNG', 'JPEG', 'GIF', 'WEBP', 'BMP', 'ICO'}
+# 未安装 Pillow 时按文件头识别格式，原样保存
+_MAGIC = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'\x00\x00\x01\x00', 'image/x-icon'),
+]
+SVG_TYPE = 'image/svg+xml'
+# SVG 可能包含脚本，从本站返回时禁止执行
+IMAGE_CSP = "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+
+
+class ImageFetchError(Exception):
+    """图片下载或解码失败"""
+
+
+def is_remote(url):
+    return isinstance(url, str) and url[:8].lower().startswith(('http://', 'https://'))
+
+
+def _referenced_urls(conn):
+    urls = set()
+    for (url,) in conn.execute('SELECT avatar FROM friends WHERE avatar IS NOT NULL '
+                               'UNION SELECT avatar_url FROM profile WHERE avatar_url IS NOT NULL'):
+        if is_remote(url):
+            urls.add(url.strip())
+    return urls
+
+
+def sync(conn):
+    """按当前内容登记新出现的外部图片地址，删除不再引用的（调用方负责提交）；返回新登记的数量"""
+    urls = _referenced_urls(conn)
+    cached = {row[0] for row in conn.execute('SELECT url FROM image_cache').fetchall()}
+    conn.executemany('DELETE FROM image_cache WHERE url = ?', [(url,) for url in cached - urls])
+    added = urls - cached
+    conn.executemany('INSERT INTO image_cache (url, next_fetch_at) VALUES (?, 0)', [(url,) for url in added])
+    return len(added)
+
+
+def _sniff(data):
+    head = data[:256].lstrip()
+    if head.startswith(b'<svg') or (head.startswith(b'<?xml') and b'<svg' in data[:4096]):
+        return SVG_TYPE
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    for magic, content_type in _MAGIC:
+        if data.startswith(magic):
+            return content_type
+    return None
+
+
+def normalize(data):
+    """统一方向、缩放并重新编码，返回 (图片数据, Content-Type)"""
+    content_type = _sniff(data)
+    if content_type == SVG_TYPE:
+        return data, content_type
+    if not PIL_AVAILABLE:
+        if content_type is None:
+            raise ImageFetchError('Unsupported image format')
+        return data, content_type
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise ImageFetchError(f'Unsupported image format: {image.format}')
+            if image.width * image.height > MAX_PIXELS:
+                raise ImageFetchError('Image dimensions too large')
+            image = ImageOps.exif_transpose(image)
+            alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if alpha else 'RGB')
+            image.thumbnail((IMAGE_MAX_SIZE, IMAGE_MAX_SIZE), Image.LANCZOS)
+            out = BytesIO()
+            if features.check('webp'):
+                image.save(out, 'WEBP', quality=85)
+                return out.getvalue(), 'image/webp'
+            image.save(out, 'PNG', optimize=True)
+            return out.getvalue(), 'image/png'
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageFetchError(f'Invalid image: {e}')
+
+
+def is_public_address(address):
+    """是否为公网地址（排除回环、私有、链路本地、保留、组播等）"""
+    try:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """socket.create_connection 的替代：只连接解析结果中的公网地址，检查和连接使用同一个地址"""
+    host, port = address
+    try:
+        candidates = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ImageFetchError(f'Cannot resolve {host}: {e}')
+    blocked = [sockaddr[0] for *_, sockaddr in candidates if not is_public_address(sockaddr[0])]
+    if blocked:
+        raise ImageFetchError(f'Refusing to fetch from non-public address {blocked[0]}')
+    error = None
+    for family, type_, proto, _, sockaddr in candidates:
+        sock = socket.socket(family, type_, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error or OSError(f'Cannot connect to {host}')
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+# 跳转由同一个 opener 跟随，每一跳的连接都经过地址检查；不使用环境变量中的代理
+_public_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}),
+                                             _PublicHTTPHandler, _PublicHTTPSHandler)
+
+
+def _open(request):
+    if IMAGE_FETCH_ALLOW_PRIVATE:
+        return urllib.request.urlopen(request, timeout=IMAGE_FETCH_TIMEOUT)
+    return _public_opener.open(request, timeout=IMAGE_FETCH_TIMEOUT)
+
+
+def fetch(url, etag=None, last_modified=None):
+    """下载图片；返回 (ETag, Last-Modified, 数据)，服务器返回 304 时返回 None"""
+    if not is_remote(url):
+        raise ImageFetchError('Only http(s) URLs are fetched')
+    headers = {'User-Agent': USER_AGENT, 'Accept': 'image/*'}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        with _open(urllib.request.Request(url, headers=headers)) as response:
+            data = response.read(IMAGE_MAX_BYTES + 1)
+            if len(data) > IMAGE_MAX_BYTES:
+                raise ImageFetchError('Image too large')
+            return response.headers.get('ETag'), response.headers.get('Last-Modified'), data
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise ImageFetchError(f'HTTP {e.code}')
+    except (urllib.error.URLError, OSError) as e:
+        raise ImageFetchError(str(getattr(e, 'reason', e)))
+
+
+def refresh(conn, url, now=None):
+    """下载（或按 ETag 重新验证）一张图片并写入缓存（调用方负责提交）；返回 True 表示成功"""
+    now = int(time.time() if now is None else now)
+    # fetchall 读完结果，下载期间不占用读事务
+    rows = conn.execute('SELECT upstream_etag, upstream_last_modified, data IS NOT NULL, failures '
+                        'FROM image_cache WHERE url = ?', (url,)).fetchall()
+    if not rows:
+        return False
+    upstream_etag, upstream_last_modified, has_data, failures = rows[0]
+    try:
+        if has_data:
+            result = fetch(url, upstream_etag, upstream_last_modified)
+        else:
+            result = fetch(url)
+        if result is None:
+            conn.execute('UPDATE image_cache SET fetched_at = ?, next_fetch_at = ?, failures = 0, error = NULL '
+                         'WHERE url = ?', (now, now + IMAGE_CACHE_TTL, url))
+            return True
+        new_etag, new_last_modified, data = result
+        data, content_type = normalize(data)
+    except ImageFetchError as e:
+        # 已有缓存时继续使用旧图片，稍后重试
+        delay = min(IMAGE_CACHE_TTL, RETRY_BASE * 2 ** min(failures, 16))
+        conn.execute('UPDATE image_cache SET failures = failures + 1, error = ?, next_fetch_at = ? WHERE url = ?',
+                     (str(e)[:500], now + delay, url))
+        return False
+    conn.execute('''
+        UPDATE image_cache SET data = ?, content_type = ?, etag = ?, upstream_etag = ?, upstream_last_modified = ?,
+            fetched_at = ?, next_fetch_at = ?, failures = 0, error = NULL
+        WHERE url = ?
+    ''', (data, content_type, hashlib.sha1(data).hexdigest()[:20], new_etag, new_last_modified,
+          now, now + IMAGE_CACHE_TTL, url))
+    return True
+
+
+def lookup(conn, url):
+    """返回 (数据, Content-Type, ETag, 是否需要重新获取)；未登记返回 None，尚未下载时数据为 None"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    row = cursor.execute('SELECT data, content_type, etag, next_fetch_at FROM image_cache WHERE url = ?',
+                         (url,)).fetchone()
+    if row is None:
+        return None
+    data, content_type, etag, next_fetch_at = row
+    return data, content_type, etag, next_fetch_at <= time.time()
+
+
+class Fetcher:
+    """后台下载：线程池限制并发，同一 (数据库文件, 地址) 同时只下载一次"""
+
+    def __init__(self, concurrency=IMAGE_FETCH_CONCURRENCY):
+        self._concurrency = concurrency
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._executor = None
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._concurrency,
+                                                    thread_name_prefix='image-fetch')
+
+    def schedule(self, url, path=None):
+        """安排下载一个地址（未启动时忽略）"""
+        key = (path or current_database_path(), url)
+        with self._lock:
+            if self._executor is None or key in self._in_flight:
+                return
+            self._in_flight.add(key)
+            self._executor.submit(self._fetch, key)
+
+    def schedule_due(self, path=None):
+        """安排下载当前数据库中所有到期的地址（新登记、缓存过期、失败后到了重试时间）"""
+        path = path or current_database_path()
+        with use_database(path), pooled_connection() as conn:
+            due = [row[0] for row in conn.execute('SELECT url FROM image_cache WHERE next_fetch_at <= ?',
+                                                  (int(time.time()),)).fetchall()]
+        for url in due:
+            self.schedule(url, path)
+
+    def _fetch(self, key):
+        path, url = key
+        try:
+            with use_database(path), pooled_connection() as conn:
+                refresh(conn, url)
+        except Exception as e:
+            print(f"Image fetch failed ({url}): {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+
+fetcher = Fetcher()
+
+
+@on_write
+def _on_write(conn, resource, action, item_id, old, new):
+    if resource is FRIENDS and (old or {}).get('avatar') != (new or {}).get('avatar'):
+        sync(conn)
+    elif resource is PROFILE and (old or {}).get('avatar_url') != (new or {}).get('avatar_url'):
+        sync(conn)
+
+
+@after_commit
+def _on_commit(resource, action, item_id):
+    if resource is not FRIENDS and resource is not PROFILE:
+        return
+    if action in ('import', 'replicate'):
+        # 批量导入和副本同步不经过写钩子
+        with pooled_connection() as conn:
+            sync(conn)
+    fetcher.schedule_due()
+
+
+def init_image_cache():
+    """启动下载线程池，登记已有内容中的外部图片（首次升级或直接写库生成的数据），并安排下载到期的图片"""
+    fetcher.start()
+    with pooled_connection() as conn:
+        added = sync(conn)
+    if added:
+        print(f"Image cache: {added} remote images registered")
+    fetcher.schedule_due()
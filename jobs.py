@@ -0,0 +1,365 @@
+"""
+后台任务队列（SQLite jobs 表 + 工作线程池，不需要外部消息队列）
+
+写入路径上耗时的后续工作（生成缓存、刷新索引、导出等）不在请求中执行，而是作为任务入队：
+    @job('syndication.warm')                      注册任务类型和处理函数（参数为入队时的 payload）
+    enqueue(conn, 'syndication.warm', delay=2)    在调用方的事务内入队，随写入一起提交或回滚
+相同类型、相同 payload 的任务在等待执行时只保留一条（jobs 表上 status = 'pending' 的部分唯一索引），
+连续保存多次只执行一次。
+
+JOB_WORKERS 个工作线程以 BEGIN IMMEDIATE 事务认领到期的任务（多个进程同时运行也不会重复认领），
+在任务所属的数据库上下文中执行处理函数：
+    成功      status = 'done'
+    抛出异常  未超过 max_attempts 时按 JOB_RETRY_BASE × 2^(attempts-1) 秒（最长 JOB_RETRY_MAX）退避后重试，
+              否则 status = 'failed'，错误信息保存在 last_error 中
+任务保存在数据库中，进程重启后继续执行。执行中的任务每 JOB_HEARTBEAT_INTERVAL 秒续租一次（heartbeat_at），
+超过 JOB_TIMEOUT 秒没有续租的 running 任务视为工作进程已退出，重新入队；执行时间再长的任务只要进程还在就不会被回收。
+记录结果时以认领时的尝试次数为条件，任务被回收并重新认领后，原来的工作线程不会再改写它的状态。
+已完成和失败的任务保留 JOB_RETENTION_DAYS 天。多站点模式下每个站点的任务在各自的数据库中，
+站点初始化时加入轮询（watch，同时记下站点名），任务在该站点的上下文（tenants.activate）中执行，
+提交后钩子发出的实时推送等因此发往正确的站点；站点被淘汰出 LRU 时停止轮询，再次访问时重新加入。
+工作线程只检查需要检查的站点：每个站点在内存中记一个下次检查时间，写入提交后（wake）立即检查，
+之后是最早的等待中任务到期时，有执行中的任务时每 MAINTENANCE_INTERVAL 秒检查一次以回收中断的任务；
+没有等待或执行中任务的站点在下次写入前不再访问其数据库。
+"""
+
+import contextvars
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import traceback
+
+import tenants
+from database import current_database_path, pooled_connection
+from resources import after_commit
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+# 工作线程最长的睡眠时间，以及检查数据库出错后重试的间隔（秒）
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '5'))
+# 重试退避（秒）
+JOB_RETRY_BASE = float(os.environ.get('JOB_RETRY_BASE', '5'))
+JOB_RETRY_MAX = 3600
+# 执行中的任务续租间隔（秒）
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', '30'))
+# running 任务超过该时间（秒）没有续租视为进程已退出，重新入队
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', '600'))
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))
+DEFAULT_MAX_ATTEMPTS = 5
+# 清理过期任务、回收中断任务的间隔（秒）
+MAINTENANCE_INTERVAL = 60
+
+STATUSES = ('pending', 'running', 'done', 'failed')
+
+_handlers = {}
+
+
+def job(kind, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """注册任务处理函数：fn(payload)，在任务所属的数据库上下文中执行"""
+    def decorator(fn):
+        _handlers[kind] = (fn, max_attempts)
+        return fn
+    return decorator
+
+
+def _dedup_key(kind, payload):
+    return hashlib.sha1(f'{kind}\n{payload}'.encode()).hexdigest()
+
+
+def enqueue(conn, kind, payload=None, delay=0):
+    """任务入队（调用方负责提交）；已有相同的等待中任务时不重复入队，返回该任务的 ID"""
+    if kind not in _handlers:
+        raise ValueError(f'Unknown job kind: {kind}')
+    payload = json.dumps(payload or {}, sort_keys=True, ensure_ascii=False)
+    key = _dedup_key(kind, payload)
+    now = time.time()
+    cursor = conn.execute('''
+        INSERT OR IGNORE INTO jobs (kind, payload, dedup_key, status, attempts, max_attempts, run_at, created_at)
+        VALUES (?, ?, ?, 'pending', 0, ?, ?, ?)
+    ''', (kind, payload, key, _handlers[kind][1], now + delay, now))
+    if cursor.rowcount:
+        return cursor.lastrowid
+    return conn.execute("SELECT id FROM jobs WHERE kind = ? AND dedup_key = ? AND status = 'pending'",
+                        (kind, key)).fetchone()[0]
+
+
+def claim(conn, now=None):
+    """认领一个到期的任务并标记为 running，返回 (id, kind, payload, attempts)；没有到期任务时返回 None"""
+    now = time.time() if now is None else now
+    due_sql = "SELECT id, kind, payload FROM jobs WHERE status = 'pending' AND run_at <= ? ORDER BY run_at, id LIMIT 1"
+    # 先用读查询判断，没有到期任务时不取写锁
+    if conn.execute(due_sql, (now,)).fetchone() is None:
+        return None
+    conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(due_sql, (now,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                         "heartbeat_at = ? WHERE id = ?", (now, now, row[0]))
+            attempts = conn.execute('SELECT attempts FROM jobs WHERE id = ?', (row[0],)).fetchone()[0]
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return (*row, attempts) if row is not None else None
+
+
+def heartbeat(conn, job_id, attempts, now=None):
+    """为执行中的任务续租（调用方负责提交）；任务已被回收时返回 False"""
+    now = time.time() if now is None else now
+    return conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                        (now, job_id, attempts)).rowcount > 0
+
+
+def next_run_at(conn):
+    """最早的等待中任务的执行时间，没有时返回 None"""
+    return conn.execute("SELECT MIN(run_at) FROM jobs WHERE status = 'pending'").fetchone()[0]
+
+
+def next_check_at(conn, now=None):
+    """需要再次检查该数据库的时间：最早的等待中任务到期时，有执行中的任务时不晚于下次回收检查；
+    都没有时返回 None"""
+    now = time.time() if now is None else now
+    pending_at, running = conn.execute(
+        "SELECT MIN(CASE WHEN status = 'pending' THEN run_at END), "
+        "COUNT(CASE WHEN status = 'running' THEN 1 END) FROM jobs WHERE status IN ('pending', 'running')"
+    ).fetchone()
+    if running:
+        return min(pending_at or math.inf, now + MAINTENANCE_INTERVAL)
+    return pending_at
+
+
+# 只修改仍处于本次认领状态的任务
+_CLAIMED = "id = ? AND status = 'running' AND attempts = ?"
+
+
+def _requeue(conn, job_id, attempts, run_at, error):
+    """任务重新进入等待；已有相同的等待中任务时不再重试（由那个任务完成同样的工作）"""
+    kind, key = conn.execute('SELECT kind, dedup_key FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    duplicate = conn.execute("SELECT id FROM jobs WHERE kind = ? AND dedup_key = ? AND status = 'pending'",
+                             (kind, key)).fetchone()
+    if duplicate is not None:
+        conn.execute(f"UPDATE jobs SET status = 'failed', finished_at = ?, last_error = ? WHERE {_CLAIMED}",
+                     (time.time(), f'{error} (superseded by pending job #{duplicate[0]})', job_id, attempts))
+    else:
+        conn.execute(f"UPDATE jobs SET status = 'pending', run_at = ?, last_error = ? WHERE {_CLAIMED}",
+                     (run_at, error, job_id, attempts))
+
+
+def finish(conn, job_id, attempts, error=None, now=None):
+    """记录第 attempts 次执行的结果（调用方负责提交）：成功、退避后重试或失败；
+    任务已被回收（可能已重新认领）时不做修改，返回 False"""
+    now = time.time() if now is None else now
+    row = conn.execute(f'SELECT max_attempts FROM jobs WHERE {_CLAIMED}', (job_id, attempts)).fetchone()
+    if row is None:
+        return False
+    if error is None:
+        conn.execute(f"UPDATE jobs SET status = 'done', finished_at = ?, last_error = NULL WHERE {_CLAIMED}",
+                     (now, job_id, attempts))
+    elif attempts >= row[0]:
+        conn.execute(f"UPDATE jobs SET status = 'failed', finished_at = ?, last_error = ? WHERE {_CLAIMED}",
+                     (now, error, job_id, attempts))
+    else:
+        _requeue(conn, job_id, attempts, now + min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (attempts - 1)), error)
+    return True
+
+
+def maintain(conn, now=None):
+    """回收中断的任务（超过 JOB_TIMEOUT 没有续租），删除过期的已完成和失败任务（调用方负责提交）"""
+    now = time.time() if now is None else now
+    for job_id, attempts in conn.execute(
+            "SELECT id, attempts FROM jobs WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ?",
+            (now - JOB_TIMEOUT,)).fetchall():
+        finish(conn, job_id, attempts, 'Interrupted (worker exited or stopped renewing its lease)', now)
+    conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                 (now - JOB_RETENTION_DAYS * 86400,))
+
+
+def retry(conn, job_id):
+    """立即重试一个失败的任务（调用方负责提交）；任务不存在、不是失败状态或已有相同的等待中任务时返回 False"""
+    row = conn.execute('SELECT status, kind, dedup_key FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if row is None or row[0] != 'failed':
+        return False
+    if conn.execute("SELECT 1 FROM jobs WHERE kind = ? AND dedup_key = ? AND status = 'pending'",
+                    (row[1], row[2])).fetchone():
+        return False
+    conn.execute("UPDATE jobs SET status = 'pending', attempts = 0, run_at = ?, finished_at = NULL WHERE id = ?",
+                 (time.time(), job_id))
+    return True
+
+
+def _row_dict(row):
+    item = dict(row)
+    item['payload'] = json.loads(item['payload'])
+    for field in ('run_at', 'created_at', 'started_at', 'heartbeat_at', 'finished_at'):
+        if item[field] is not None:
+            item[field] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(item[field]))
+    return item
+
+
+def status(conn, state=None, limit=50):
+    """各状态的任务数和最近的任务（state 过滤状态）"""
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+    where = 'WHERE status = ?' if state else ''
+    rows = conn.execute(f'''
+        SELECT id, kind, payload, status, attempts, max_attempts, run_at, created_at, started_at, heartbeat_at,
+               finished_at, last_error
+        FROM jobs {where} ORDER BY id DESC LIMIT ?
+    ''', (state, limit) if state else (limit,)).fetchall()
+    return {'counts': counts, 'workers': runner.workers, 'jobs': [_row_dict(row) for row in rows]}
+
+
+def _renew_lease(job_id, attempts, stop):
+    while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+        try:
+            with pooled_connection() as conn:
+                if not heartbeat(conn, job_id, attempts):
+                    return
+        except Exception as e:
+            print(f"Job #{job_id} heartbeat failed: {e}")
+
+
+def execute(job_id, kind, payload, attempts):
+    """执行一个已认领的任务并记录结果（在任务所属的站点上下文中调用）；执行期间由后台线程续租"""
+    handler = _handlers.get(kind)
+    error = None
+    if handler is None:
+        error = f'Unknown job kind: {kind}'
+    else:
+        stop = threading.Event()
+        # 续租线程复制当前上下文，写入任务所在的数据库
+        renewer = threading.Thread(target=contextvars.copy_context().run,
+                                   args=(_renew_lease, job_id, attempts, stop), name=f'job-lease-{job_id}', daemon=True)
+        renewer.start()
+        try:
+            handler[0](json.loads(payload))
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            traceback.print_exc()
+        finally:
+            stop.set()
+            renewer.join()
+    with pooled_connection() as conn:
+        if handler is None:
+            conn.execute(f'UPDATE jobs SET max_attempts = attempts WHERE {_CLAIMED}', (job_id, attempts))
+        if not finish(conn, job_id, attempts, error):
+            print(f"Job #{job_id} was reclaimed while running; result of attempt {attempts} discarded")
+    return error is None
+
+
+class Runner:
+    """工作线程池：检查已加入的数据库中到期的任务，认领并执行"""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # 数据库文件 → 站点名（默认站点为 None）
+        self._sites = {}
+        # 数据库文件 → 下次检查时间；None 表示没有需要处理的任务（或正在被某个工作线程检查），等待唤醒
+        self._due = {}
+        self._threads = []
+        self._last_maintenance = {}
+
+    def watch(self, path=None, tenant=None):
+        """把数据库加入轮询（站点初始化时在站点上下文中调用，默认取当前数据库和站点名）"""
+        path = path or current_database_path()
+        with self._lock:
+            self._sites[path] = tenant or tenants.current_tenant()
+            # 重启前未完成的任务立即检查
+            self._due[path] = 0
+        self._wakeup.set()
+
+    def forget(self, path):
+        """停止轮询数据库（站点被淘汰时）"""
+        with self._lock:
+            self._sites.pop(path, None)
+            self._due.pop(path, None)
+            self._last_maintenance.pop(path, None)
+
+    def wake(self, path=None):
+        """数据库（默认为当前数据库）有新提交的任务，立即检查"""
+        self._reschedule(path or current_database_path(), 0)
+        self._wakeup.set()
+
+    def _reschedule(self, path, at):
+        """把下次检查时间提前到 at（at 为 None 时不变）；已经停止轮询的数据库忽略"""
+        with self._lock:
+            if path not in self._sites or at is None:
+                return
+            current = self._due.get(path)
+            if current is None or at < current:
+                self._due[path] = at
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _maintain(self, path):
+        now = time.time()
+        with self._lock:
+            if now - self._last_maintenance.get(path, 0) < MAINTENANCE_INTERVAL:
+                return
+            self._last_maintenance[path] = now
+        with pooled_connection() as conn:
+            maintain(conn, now)
+
+    def _run_one(self, path, tenant):
+        """执行一个到期任务；返回该数据库下次需要检查的时间（None 表示等待唤醒）"""
+        with tenants.activate(tenant, path):
+            self._maintain(path)
+            with pooled_connection() as conn:
+                claimed = claim(conn)
+                if claimed is None:
+                    return next_check_at(conn)
+            # 执行期间其他工作线程可以认领同一数据库中的下一个任务
+            self._reschedule(path, 0)
+            execute(*claimed)
+            return 0
+
+    def _run(self):
+        while True:
+            # 先清除再检查：检查期间提交的任务会再次设置事件，不会错过
+            self._wakeup.clear()
+            now = time.time()
+            with self._lock:
+                sites = [(path, tenant) for path, tenant in sorted(self._sites.items())
+                         if self._due.get(path) is not None and self._due[path] <= now]
+                for path, _ in sites:
+                    self._due[path] = None
+            for path, tenant in sites:
+                try:
+                    next_at = self._run_one(path, tenant)
+                except Exception as e:
+                    print(f"Job worker error ({path}): {e}")
+                    next_at = time.time() + JOB_POLL_INTERVAL
+                self._reschedule(path, next_at)
+            with self._lock:
+                next_due = min((at for at in self._due.values() if at is not None), default=math.inf)
+            # 睡到下一个任务到期（重试退避、延迟执行），有新任务提交时提前唤醒
+            timeout = min(next_due - time.time(), JOB_POLL_INTERVAL)
+            if timeout > 0:
+                self._wakeup.wait(timeout)
+
+
+runner = Runner()
+
+
+@after_commit
+def _on_commit(resource, action, item_id):
+    # 写钩子可能在同一事务内入队了任务
+    runner.wake()
+
+
+@tenants.on_evict
+def _on_evict(name, path):
+    runner.forget(path)
@@ -0,0 +1,372 @@
+"""
+实时更新推送（Server-Sent Events）
+
+写操作提交后广播一条简短的事件：
+    id: 1729345678123
+    event: change
+    data: {"resource": "publications", "action": "update", "id": 5, "version": 1729345678123}
+客户端只需重新获取发生变化的资源，不必轮询所有接口。
+
+推送服务器运行在独立端口（SSE_PORT）上，由单个线程里的 asyncio 事件循环处理所有订阅者，
+空闲的连接不占用任何工作线程；/api/events 会把浏览器重定向到这里。
+未启用独立端口时（开发环境）由 Flask 直接输出事件流，每个订阅者占用一个线程，数量受 MAX_FALLBACK_SUBSCRIBERS 限制。
+
+多站点模式下事件按站点分频道：订阅者只收到自己站点的事件，版本号也按站点分别记录。
+推送服务器不知道请求属于哪个站点，频道由 /api/events 按请求的站点确定后写入重定向地址（tenant=<站点名>&sig=<签名>），
+签名用 SECRET_KEY 派生的密钥计算（未设置时使用进程启动时生成的随机密钥），签名不符的频道一律拒绝，
+客户端不能自行指定其他站点的频道。
+
+每个订阅者有一个有界队列，客户端读得太慢导致队列溢出时清空队列并发送一条 resync 事件，
+客户端收到后重新加载全部内容；断线重连时按 Last-Event-ID 补发错过的事件，太旧时同样发送 resync。
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import tenants
+from resources import after_commit
+
+# 每个订阅者队列的容量
+QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', '64'))
+# 心跳间隔（秒），也用于及时发现已断开的连接
+HEARTBEAT_INTERVAL = float(os.environ.get('SSE_HEARTBEAT', '15'))
+# 断线重连时每个频道可以补发的事件数
+HISTORY_SIZE = 256
+MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', '10000'))
+MAX_FALLBACK_SUBSCRIBERS = 16
+# 频道签名密钥：由 SECRET_KEY 派生；未设置时（应用使用公开的默认值）每个进程随机生成，推送服务器与应用在同一进程中
+_CHANNEL_KEY = hashlib.sha256(
+    b'sse-channel:' + (os.environ.get('SECRET_KEY') or os.urandom(32).hex()).encode()).digest()
+# 客户端重连间隔（毫秒）
+RETRY_MS = 3000
+EVENTS_PATH = '/api/events'
+
+
+def sign_channel(channel):
+    """站点频道的签名（/api/events 重定向到推送服务器时附带）"""
+    return hmac.new(_CHANNEL_KEY, channel.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_channel(channel, signature):
+    return bool(signature) and hmac.compare_digest(sign_channel(channel), signature)
+
+
+def format_event(event):
+    """把事件编码为 SSE 文本"""
+    data = json.dumps(event['data'], ensure_ascii=False, separators=(',', ':'))
+    lines = f"event: {event['type']}\ndata: {data}\n\n"
+    if event.get('id') is not None:
+        lines = f"id: {event['id']}\n" + lines
+    return lines.encode('utf-8')
+
+
+HEARTBEAT = b': ping\n\n'
+
+
+class EventHub:
+    """事件广播中心：分配递增的事件ID并分发给订阅者（线程安全）
+
+    channel 为站点名（默认站点为 None），事件ID在所有频道间共享同一个递增序列；
+    补发用的历史记录按频道分别保存，其他站点的事件再多也不会挤掉本站点的记录。
+    """
+
+    def __init__(self, history=HISTORY_SIZE):
+        self._lock = threading.Lock()
+        # 以毫秒时间戳为起点，重启后事件ID仍然递增
+        self._last_id = self._start_id = int(time.time() * 1000)
+        self._history_size = history
+        # 频道 → 最近的事件；频道 → 已经不在历史记录中的最新事件ID
+        self._history = {}
+        self._trimmed = {}
+        self._versions = {}
+        self._subscribers = {}
+        self._count = 0
+
+    def versions(self, channel=None):
+        with self._lock:
+            return dict(self._versions.get(channel, {}))
+
+    def subscriber_count(self):
+        return self._count
+
+    def publish(self, resource, action, item_id, channel=None):
+        with self._lock:
+            self._last_id += 1
+            event = {'id': self._last_id, 'type': 'change', 'data': {
+                'resource': resource, 'action': action, 'id': item_id, 'version': self._last_id,
+            }}
+            history = self._history.get(channel)
+            if history is None:
+                history = self._history[channel] = deque(maxlen=self._history_size)
+            elif len(history) == history.maxlen:
+                self._trimmed[channel] = history[0]['id']
+            history.append(event)
+            self._versions.setdefault(channel, {})[resource] = self._last_id
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.push(event)
+        return event
+
+    def subscribe(self, subscriber, last_event_id=None, channel=None):
+        """登记订阅者并返回需要先发送的事件（问候事件 + 补发的事件）"""
+        with self._lock:
+            if self._count >= MAX_SUBSCRIBERS:
+                return None
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+            self._count += 1
+            backlog = [{'id': None, 'type': 'hello', 'data': {'versions': dict(self._versions.get(channel, {}))}}]
+            if last_event_id is not None and last_event_id < self._last_id:
+                # 本频道的历史记录已经不能覆盖 last_event_id 之后的全部事件（已被淘汰，或发生在进程启动之前）时
+                # 只能让客户端全量刷新
+                if last_event_id < max(self._start_id, self._trimmed.get(channel, 0)):
+                    backlog.append(_resync_event())
+                else:
+                    backlog.extend(e for e in self._history.get(channel, ()) if e['id'] > last_event_id)
+        return backlog
+
+    def forget(self, channel):
+        """释放频道的历史记录（站点被淘汰时）；之后重连的客户端全量刷新"""
+        with self._lock:
+            history = self._history.pop(channel, None)
+            if history:
+                self._trimmed[channel] = history[-1]['id']
+
+    def unsubscribe(self, subscriber, channel=None):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None and subscriber in subscribers:
+                subscribers.discard(subscriber)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+def _resync_event():
+    return {'id': None, 'type': 'resync', 'data': {}}
+
+
+class _ThreadSubscriber:
+    """Flask 回退模式的订阅者：普通线程队列"""
+
+    def __init__(self):
+        self.queue = queue.Queue(QUEUE_SIZE)
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            _drain(self.queue)
+            self.queue.put_nowait(_resync_event())
+
+
+class _AsyncSubscriber:
+    """推送服务器的订阅者：事件循环内的 asyncio 队列"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def push(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            _drain(self.queue)
+            self.queue.put_nowait(_resync_event())
+
+
+def _drain(q):
+    while True:
+        try:
+            q.get_nowait()
+        except (queue.Empty, asyncio.QueueEmpty):
+            return
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+hub = EventHub()
+
+
+@after_commit
+def _publish_commit(resource, action, item_id):
+    hub.publish(resource.name, action, item_id, tenants.current_tenant())
+
+
+@tenants.on_evict
+def _on_evict(name, path):
+    hub.forget(name)
+
+
+def stream_events(last_event_id=None, channel=None):
+    """Flask 回退模式的事件流生成器；订阅者过多时返回 None"""
+    if hub.subscriber_count() >= MAX_FALLBACK_SUBSCRIBERS:
+        return None
+    subscriber = _ThreadSubscriber()
+    backlog = hub.subscribe(subscriber, last_event_id, channel)
+    if backlog is None:
+        return None
+
+    def generate():
+        try:
+            yield f'retry: {RETRY_MS}\n\n'.encode()
+            for event in backlog:
+                yield format_event(event)
+            while True:
+                try:
+                    event = subscriber.queue.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield HEARTBEAT
+                    continue
+                yield format_event(event)
+        finally:
+            hub.unsubscribe(subscriber, channel)
+
+    return generate()
+
+
+class SSEServer:
+    """独立端口上的 SSE 推送服务器（单线程 asyncio）"""
+
+    def __init__(self, host='0.0.0.0', port=5001, allow_origin='*'):
+        self.host = host
+        self.port = port
+        self.allow_origin = allow_origin
+        self.loop = None
+        self._ready = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name='sse-server', daemon=True)
+        thread.start()
+        self._ready.wait(5)
+        return thread
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self.loop.run_forever()
+
+    def _cors_headers(self):
+        return (f'Access-Control-Allow-Origin: {self.allow_origin}\r\n'
+                f'Access-Control-Allow-Headers: Last-Event-ID, Cache-Control\r\n')
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        method, target = (request_line.split(' ') + ['', ''])[:2]
+        return method, target, headers
+
+    async def _handle(self, reader, writer):
+        try:
+            method, target, headers = await asyncio.wait_for(self._read_request(reader), 10)
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            writer.close()
+            return
+
+        url = urlsplit(target)
+        if method == 'OPTIONS':
+            writer.write(f'HTTP/1.1 204 No Content\r\n{self._cors_headers()}Content-Length: 0\r\n\r\n'.encode())
+            await self._close(writer)
+            return
+        if method != 'GET' or url.path != EVENTS_PATH:
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await self._close(writer)
+            return
+
+        query = parse_qs(url.query)
+        last_event_id = parse_last_event_id(headers.get('last-event-id') or query.get('lastEventId', [None])[0])
+        channel = query.get('tenant', [None])[0]
+        if channel is not None and not verify_channel(channel, query.get('sig', [None])[0]):
+            writer.write(b'HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await self._close(writer)
+            return
+        subscriber = _AsyncSubscriber(self.loop)
+        backlog = hub.subscribe(subscriber, last_event_id, channel)
+        if backlog is None:
+            writer.write(b'HTTP/1.1 503 Service Unavailable\r\nRetry-After: 10\r\nContent-Length: 0\r\n\r\n')
+            await self._close(writer)
+            return
+
+        # 客户端不会再发送数据，读到 EOF 即表示连接已断开
+        disconnected = asyncio.ensure_future(reader.read())
+        try:
+            writer.write((f'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n'
+                          f'Cache-Control: no-cache\r\nConnection: keep-alive\r\nX-Accel-Buffering: no\r\n'
+                          f'{self._cors_headers()}\r\nretry: {RETRY_MS}\n\n').encode())
+            for event in backlog:
+                writer.write(format_event(event))
+            await writer.drain()
+
+            while not disconnected.done():
+                getter = asyncio.ensure_future(subscriber.queue.get())
+                done, _ = await asyncio.wait({getter, disconnected}, timeout=HEARTBEAT_INTERVAL,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    writer.write(format_event(getter.result()))
+                else:
+                    getter.cancel()
+                    if disconnected in done:
+                        break
+                    writer.write(HEARTBEAT)
+                # 写缓冲迟迟无法清空说明客户端已失联
+                await asyncio.wait_for(writer.drain(), HEARTBEAT_INTERVAL)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            hub.unsubscribe(subscriber, channel)
+            disconnected.cancel()
+            await self._close(writer)
+
+    async def _close(self, writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+_server = None
+
+
+def start_server(host='0.0.0.0', port=5001):
+    """启动独立推送服务器（重复调用返回同一个实例）"""
+    global _server
+    if _server is None:
+        _server = SSEServer(host, port, os.environ.get('SSE_ALLOW_ORIGIN', '*'))
+        _server.start()
+    return _server
+
+
+def server_url(request):
+    """浏览器访问推送服务器的地址；在反向代理后面时用 SSE_PUBLIC_URL 指定"""
+    if _server is None:
+        return None
+    public = os.environ.get('SSE_PUBLIC_URL')
+    if public:
+        return public
+    hostname = request.host.rsplit(':', 1)[0] if ':' in request.host.split(']')[-1] else request.host
+    return f'{request.scheme}://{hostname}:{_server.port}{EVENTS_PATH}'
@@ -0,0 +1,242 @@
+"""
+请求级性能指标采集与 Prometheus 文本格式导出
+
+每个线程写入自己的分片（无需加锁），只有在 /metrics 被抓取时才合并所有分片。
+线程退出后其分片会被并入归档分片，避免每请求一线程的服务器下分片无限增长。
+"""
+
+import bisect
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+from database import add_query_listener
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 响应大小直方图的桶上界（字节）
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# 每请求SQL条数直方图的桶上界
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# 分片数量超过该值时触发一次归并
+MAX_LIVE_SHARDS = 256
+
+
+class _Histogram:
+    """非累积计数的直方图，导出时再转换为 Prometheus 的累积桶"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        self.counts[bisect.bisect_left(buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.sum += other.sum
+        self.count += other.count
+
+
+class _Shard:
+    """单个线程的指标分片"""
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.requests = {}        # (endpoint, method, status) -> count
+        self.latency = {}         # (endpoint, method) -> _Histogram
+        self.response_size = {}   # (endpoint,) -> _Histogram
+        self.db_time = {}         # (endpoint,) -> _Histogram
+        self.db_queries = {}      # (endpoint,) -> _Histogram
+        self.in_flight = 0
+
+    def merge(self, other):
+        # 其他线程可能正在写入，先复制条目（list() 在 GIL 下一次完成）再遍历
+        for key, value in list(other.requests.items()):
+            self.requests[key] = self.requests.get(key, 0) + value
+        for name in ('latency', 'response_size', 'db_time', 'db_queries'):
+            target = getattr(self, name)
+            for key, hist in list(getattr(other, name).items()):
+                if key not in target:
+                    target[key] = _Histogram(len(hist.counts) - 1)
+                target[key].merge(hist)
+
+
+class MetricsRegistry:
+    """按线程分片聚合的指标注册表"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = _Shard(None)
+        self.started_at = time.time()
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+                if len(self._shards) > MAX_LIVE_SHARDS:
+                    self._retire_dead_shards()
+        return shard
+
+    def _retire_dead_shards(self):
+        """把已退出线程的分片并入归档分片（调用方需持有锁）"""
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                self._retired.merge(shard)
+        self._shards = alive
+
+    def observe_request(self, endpoint, method, status, duration, size, db_time, db_queries):
+        shard = self.shard()
+        key = (endpoint, method, str(status))
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        _observe(shard.latency, (endpoint, method), LATENCY_BUCKETS, duration)
+        if size is not None:
+            _observe(shard.response_size, (endpoint,), SIZE_BUCKETS, size)
+        _observe(shard.db_time, (endpoint,), LATENCY_BUCKETS, db_time)
+        _observe(shard.db_queries, (endpoint,), QUERY_COUNT_BUCKETS, db_queries)
+
+    def snapshot(self):
+        """合并所有分片，返回 (合并后的分片, 当前进行中的请求数)"""
+        with self._lock:
+            self._retire_dead_shards()
+            shards = list(self._shards)
+            total = _Shard(None)
+            total.merge(self._retired)
+        in_flight = 0
+        for shard in shards:
+            total.merge(shard)
+            in_flight += shard.in_flight
+        return total, in_flight
+
+
+def _observe(histograms, key, buckets, value):
+    hist = histograms.get(key)
+    if hist is None:
+        hist = histograms[key] = _Histogram(len(buckets))
+    hist.observe(buckets, value)
+
+
+registry = MetricsRegistry()
+
+
+def _on_query(event):
+    """SQL监听器：累加当前请求的数据库耗时和查询次数"""
+    if has_request_context() and '_metrics_start' in g:
+        g._metrics_db_time += event.duration
+        g._metrics_db_queries += 1
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_db_time = 0.0
+    g._metrics_db_queries = 0
+    registry.shard().in_flight += 1
+
+
+def _after_request(response):
+    g._metrics_status = response.status_code
+    g._metrics_size = None if response.is_streamed else response.calculate_content_length()
+    return response
+
+
+def _teardown_request(exc):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    registry.shard().in_flight -= 1
+    registry.observe_request(
+        request.endpoint or 'unmatched',
+        request.method,
+        g.pop('_metrics_status', 500),
+        time.perf_counter() - start,
+        g.pop('_metrics_size', None),
+        g.pop('_metrics_db_time', 0.0),
+        g.pop('_metrics_db_queries', 0),
+    )
+
+
+def init_metrics(app):
+    """为应用注册请求钩子和SQL监听器"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    add_query_listener(_on_query)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_bound(bound):
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+INF_LABEL = 'le="+Inf"'
+
+
+def _render_histogram(lines, name, help_text, label_names, buckets, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key in sorted(histograms):
+        hist = histograms[key]
+        cumulative = 0
+        for bound, count in zip(buckets, hist.counts):
+            cumulative += count
+            le = 'le="%s"' % _format_bound(bound)
+            lines.append(f'{name}_bucket{_labels(label_names, key, le)} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(label_names, key, INF_LABEL)} {hist.count}')
+        lines.append(f'{name}_sum{_labels(label_names, key)} {hist.sum:.6f}')
+        lines.append(f'{name}_count{_labels(label_names, key)} {hist.count}')
+
+
+def render_prometheus():
+    """以 Prometheus 文本格式导出全部指标"""
+    total, in_flight = registry.snapshot()
+    lines = [
+        '# HELP http_requests_total Total HTTP requests by endpoint, method and status.',
+        '# TYPE http_requests_total counter',
+    ]
+    for key in sorted(total.requests):
+        lines.append(f'http_requests_total{_labels(("endpoint", "method", "status"), key)} {total.requests[key]}')
+
+    lines += [
+        '# HELP http_requests_in_flight Requests currently being served.',
+        '# TYPE http_requests_in_flight gauge',
+        f'http_requests_in_flight {in_flight}',
+    ]
+    _render_histogram(lines, 'http_request_duration_seconds', 'Request latency in seconds.',
+                      ('endpoint', 'method'), LATENCY_BUCKETS, total.latency)
+    _render_histogram(lines, 'http_response_size_bytes', 'Response body size in bytes.',
+                      ('endpoint',), SIZE_BUCKETS, total.response_size)
+    _render_histogram(lines, 'db_time_per_request_seconds', 'Time spent executing SQL per request.',
+                      ('endpoint',), LATENCY_BUCKETS, total.db_time)
+    _render_histogram(lines, 'db_queries_per_request', 'Number of SQL statements per request.',
+                      ('endpoint',), QUERY_COUNT_BUCKETS, total.db_queries)
+    lines += [
+        '# HELP process_uptime_seconds Seconds since the metrics registry was created.',
+        '# TYPE process_uptime_seconds gauge',
+        f'process_uptime_seconds {time.time() - registry.started_at:.3f}',
+    ]
+    return '\n'.join(lines) + '\n'
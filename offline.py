@@ -0,0 +1,67 @@
+"""
+离线优先的主页：内容版本号与 Service Worker
+
+content_version 表只有一行，任何内容写入都会让版本号加一（通过资源注册表的写入在同一事务内更新，
+批量导入和副本同步在提交后更新）。所有成功的 GET /api/ 响应都带有 X-Content-Version 头，
+/api/version 只返回当前版本号。
+
+Service Worker（templates/sw.js，由 /sw.js 输出）缓存页面外壳和接口响应：
+    页面外壳、静态资源   stale-while-revalidate：先返回缓存，后台更新
+    接口数据            按版本号判断：缓存的 X-Content-Version 与最新版本一致时直接返回缓存，不发请求；
+                       不一致时先返回缓存，后台重新获取，内容有变化再通知页面重新渲染对应部分
+页面渲染完成后才请求 /api/version 并告诉 Service Worker，再次访问时所有内容都先从缓存渲染，没有阻塞的网络请求。
+"""
+
+import os
+
+from flask import Response, render_template, request
+
+from database import pooled_connection
+from resources import after_commit, on_write
+
+VERSION_HEADER = 'X-Content-Version'
+
+
+def bump_version(conn):
+    """内容版本号加一（调用方负责提交）"""
+    conn.execute('UPDATE content_version SET version = version + 1 WHERE id = 1')
+
+
+def current_version(conn):
+    row = conn.execute('SELECT version FROM content_version WHERE id = 1').fetchone()
+    return str(row[0]) if row else '0'
+
+
+@on_write
+def _on_write(conn, resource, action, item_id, old, new):
+    bump_version(conn)
+
+
+@after_commit
+def _on_commit(resource, action, item_id):
+    # 批量导入和副本同步不经过写钩子
+    if action in ('import', 'replicate'):
+        with pooled_connection() as conn:
+            bump_version(conn)
+
+
+def _after_request(response):
+    if (request.method == 'GET' and response.status_code == 200 and request.path.startswith('/api/')
+            and response.mimetype == 'application/json'):
+        with pooled_connection() as conn:
+            response.headers[VERSION_HEADER] = current_version(conn)
+    return response
+
+
+def service_worker_response(excluded_prefixes=()):
+    """/sw.js：作用域为当前站点根路径的 Service Worker 脚本"""
+    body = render_template('sw.js', base=request.script_root, excluded=list(excluded_prefixes),
+                           version_header=VERSION_HEADER)
+    # 浏览器据此检查 Service Worker 是否有更新，不能被 HTTP 缓存
+    return Response(body, mimetype='application/javascript', headers={'Cache-Control': 'no-cache'})
+
+
+def init_offline(app):
+    """给接口响应加上内容版本号；OFFLINE_CACHE=0 时不注册 Service Worker（/sw.js 返回 404）"""
+    app.config.setdefault('OFFLINE_CACHE', os.environ.get('OFFLINE_CACHE', '1') == '1')
+    app.after_request(_after_request)
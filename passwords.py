@@ -0,0 +1,138 @@
+"""
+密码哈希
+
+新密码使用 bcrypt（未安装时退回标准库的 PBKDF2-SHA256），代价因子由 BCRYPT_ROUNDS 配置。
+慢哈希在固定大小的线程池中计算（bcrypt 和 hashlib 计算时都会释放 GIL），同时等待的校验数量有上限：
+超过上限或 HASH_TIMEOUT 秒内没有等到结果时抛出 HasherBusy，由调用方返回 503，
+避免大量登录请求把所有工作线程都卡在哈希计算上。
+
+旧版本的无盐 SHA-256 哈希仍然可以校验，verify_password 会提示需要重新哈希，
+登录成功后由调用方写回新哈希，用户无感知地完成升级；代价因子调整后的旧 bcrypt 哈希同样会被升级。
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+try:
+    import bcrypt
+    BCRYPT_AVAILABLE = True
+except ImportError:
+    BCRYPT_AVAILABLE = False
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', '600000'))
+# 哈希线程池大小（默认等于CPU核数）和同时等待的哈希任务上限
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '0')) or os.cpu_count() or 1
+MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '0')) or HASH_WORKERS * 4
+# 等待哈希结果的最长时间（秒）
+HASH_TIMEOUT = 30.0
+
+# bcrypt 只使用前 72 字节，显式截断以兼容拒绝超长输入的新版本
+BCRYPT_MAX_BYTES = 72
+
+
+class HasherBusy(Exception):
+    """等待中的哈希任务已达上限"""
+
+
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+_pending = threading.BoundedSemaphore(MAX_PENDING)
+
+
+def _is_legacy(hash_value):
+    return len(hash_value) == 64 and all(c in '0123456789abcdef' for c in hash_value)
+
+
+def _legacy_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def _bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password.encode()[:BCRYPT_MAX_BYTES], bcrypt.gensalt(rounds)).decode()
+
+
+def _bcrypt_rounds(hash_value):
+    try:
+        return int(hash_value.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+
+def _pbkdf2_hash(password, iterations):
+    salt = os.urandom(16)
+    digest = _pbkdf2(password, salt, iterations)
+    return (f'pbkdf2_sha256${iterations}${base64.b64encode(salt).decode()}$'
+            f'{base64.b64encode(digest).decode()}')
+
+
+def _verify(password, hash_value):
+    """在线程池中执行：返回 (是否匹配, 是否需要重新哈希)"""
+    if hash_value.startswith('$2'):
+        if not BCRYPT_AVAILABLE:
+            return False, False
+        ok = bcrypt.checkpw(password.encode()[:BCRYPT_MAX_BYTES], hash_value.encode())
+        return ok, ok and _bcrypt_rounds(hash_value) != BCRYPT_ROUNDS
+    if hash_value.startswith('pbkdf2_sha256$'):
+        _, iterations, salt, digest = hash_value.split('$')
+        ok = hmac.compare_digest(_pbkdf2(password, base64.b64decode(salt), int(iterations)),
+                                 base64.b64decode(digest))
+        return ok, ok and (BCRYPT_AVAILABLE or int(iterations) != PBKDF2_ITERATIONS)
+    if _is_legacy(hash_value):
+        ok = hmac.compare_digest(_legacy_hash(password), hash_value)
+        return ok, ok
+    return False, False
+
+
+def _hash(password):
+    if BCRYPT_AVAILABLE:
+        return _bcrypt_hash(password, BCRYPT_ROUNDS)
+    return _pbkdf2_hash(password, PBKDF2_ITERATIONS)
+
+
+def _submit(fn, *args):
+    if not _pending.acquire(blocking=False):
+        raise HasherBusy('Too many password hashing requests in progress')
+    try:
+        future = _pool.submit(fn, *args)
+    except Exception:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        raise HasherBusy('Timed out waiting for password hashing')
+
+
+def hash_password(password):
+    """生成密码哈希（bcrypt，或 PBKDF2-SHA256）"""
+    return _submit(_hash, password)
+
+
+def verify_password(password, hash_value):
+    """校验密码，返回 (是否匹配, 是否需要重新哈希)"""
+    if not hash_value:
+        return False, False
+    return _submit(_verify, password, hash_value)
+
+
+# 用户不存在时也做一次同等代价的校验，避免通过响应时间判断用户名是否存在；
+# 校验用的哈希在导入时提交到线程池预先计算，第一次请求不需要在请求线程中多算一次
+_dummy_hash = _pool.submit(_hash, 'dummy-password')
+
+
+def _verify_dummy(password):
+    return _verify(password, _dummy_hash.result())
+
+
+def verify_dummy(password):
+    _submit(_verify_dummy, password)
+    return False
@@ -0,0 +1,182 @@
+"""
+SQL 语句追踪与慢查询日志
+
+按语句文本汇总执行次数、耗时和行数；超过阈值的语句写入慢查询日志，并附带 EXPLAIN QUERY PLAN，
+全表扫描（SCAN）会被单独标记，随数据增长变慢的未建索引查询因此一目了然。
+追踪开关、慢查询阈值和 EXPLAIN 开关可以通过 /api/admin/query-trace 在运行时修改，无需重启；
+日志文件路径只能通过环境变量 SLOW_QUERY_LOG 设置（配置由进程内所有站点共用，不允许经由接口改写）。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+
+from database import add_query_listener, remove_query_listener
+
+# 最多追踪的不同语句数量，防止动态拼接的SQL撑爆内存
+MAX_STATEMENTS = 500
+# 内存中保留的最近慢查询条数
+RECENT_SLOW_LIMIT = 100
+# 缓存执行计划的语句数量
+MAX_PLANS = 500
+
+logger = logging.getLogger('academic.slow_query')
+
+_config = {
+    'enabled': os.environ.get('QUERY_TRACE', '1') == '1',
+    'slow_ms': float(os.environ.get('SLOW_QUERY_MS', '100')),
+    'explain': os.environ.get('SLOW_QUERY_EXPLAIN', '1') == '1',
+    'log_path': os.environ.get('SLOW_QUERY_LOG', os.path.join('logs', 'slow_queries.log')),
+}
+
+_lock = threading.Lock()
+_stats = {}
+_plans = {}
+_recent_slow = deque(maxlen=RECENT_SLOW_LIMIT)
+_handler = None
+
+
+def _normalize(sql):
+    return ' '.join(sql.split())
+
+
+def _explain(event):
+    """获取执行计划（按语句文本缓存），只对查询和修改语句执行"""
+    plan = _plans.get(event.sql)
+    if plan is not None:
+        return plan
+    head = event.sql.lstrip()[:6].upper()
+    if head not in ('SELECT', 'UPDATE', 'DELETE') or event.error:
+        return None
+    try:
+        # 直接调用基类方法，避免 EXPLAIN 本身再次触发追踪
+        rows = sqlite3.Connection.execute(event.connection, 'EXPLAIN QUERY PLAN ' + event.sql,
+                                          event.parameters).fetchall()
+    except sqlite3.Error:
+        return None
+    plan = [row[3] for row in rows]
+    if len(_plans) < MAX_PLANS:
+        _plans[event.sql] = plan
+    return plan
+
+
+def _has_full_scan(plan):
+    return any(step.startswith('SCAN ') and step != 'SCAN CONSTANT ROW' for step in plan or ())
+
+
+def _on_query(event):
+    """SQL监听器：汇总统计并记录慢查询"""
+    duration_ms = event.duration * 1000
+    with _lock:
+        stat = _stats.get(event.sql)
+        if stat is None:
+            if len(_stats) >= MAX_STATEMENTS:
+                stat = None
+            else:
+                stat = _stats[event.sql] = {
+                    'sql': _normalize(event.sql), 'count': 0, 'errors': 0, 'total_ms': 0.0,
+                    'max_ms': 0.0, 'rows': 0, 'slow': 0, 'plan': None, 'full_scan': False,
+                }
+        if stat is not None:
+            stat['count'] += 1
+            stat['total_ms'] += duration_ms
+            stat['max_ms'] = max(stat['max_ms'], duration_ms)
+            stat['rows'] += max(event.rows, 0)
+            if event.error:
+                stat['errors'] += 1
+
+    if duration_ms < _config['slow_ms']:
+        return
+
+    plan = _explain(event) if _config['explain'] else None
+    record = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'duration_ms': round(duration_ms, 3),
+        'rows': event.rows,
+        'params': len(event.parameters) if event.parameters else 0,
+        'sql': _normalize(event.sql),
+        'endpoint': request.endpoint if has_request_context() else None,
+        'plan': plan,
+        'full_scan': _has_full_scan(plan),
+        'error': event.error,
+    }
+    with _lock:
+        _recent_slow.append(record)
+        if stat is not None:
+            stat['slow'] += 1
+            if plan is not None:
+                stat['plan'] = plan
+                stat['full_scan'] = record['full_scan']
+    logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+def _configure_log_file(path):
+    global _handler
+    if _handler is not None:
+        logger.removeHandler(_handler)
+        _handler.close()
+        _handler = None
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        _handler = RotatingFileHandler(path, maxBytes=5 * 1024 * 1024, backupCount=3, encoding='utf-8')
+        _handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(_handler)
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+
+
+def configure(enabled=None, slow_ms=None, explain=None):
+    """运行时修改追踪配置"""
+    if slow_ms is not None:
+        _config['slow_ms'] = float(slow_ms)
+    if explain is not None:
+        _config['explain'] = bool(explain)
+    if enabled is not None:
+        _config['enabled'] = bool(enabled)
+    if _config['enabled']:
+        add_query_listener(_on_query)
+    else:
+        remove_query_listener(_on_query)
+    return get_config()
+
+
+def get_config():
+    return {k: _config[k] for k in ('enabled', 'slow_ms', 'explain', 'log_path')}
+
+
+def reset():
+    """清空统计数据和执行计划缓存"""
+    with _lock:
+        _stats.clear()
+        _plans.clear()
+        _recent_slow.clear()
+
+
+def report(limit=50, order_by='total_ms'):
+    """按指定字段排序的语句统计及最近的慢查询"""
+    with _lock:
+        statements = [dict(stat) for stat in _stats.values()]
+        slow = list(_recent_slow)
+    for stat in statements:
+        stat['avg_ms'] = round(stat['total_ms'] / stat['count'], 3) if stat['count'] else 0.0
+        stat['total_ms'] = round(stat['total_ms'], 3)
+        stat['max_ms'] = round(stat['max_ms'], 3)
+    statements.sort(key=lambda s: s.get(order_by, 0), reverse=True)
+    return {
+        'config': get_config(),
+        'statements': statements[:limit],
+        'recent_slow': slow[::-1],
+    }
+
+
+def init_query_trace():
+    """按环境变量初始化追踪与慢查询日志"""
+    _configure_log_file(_config['log_path'])
+    configure()
@@ -0,0 +1,170 @@
+"""
+请求限流与过载保护
+
+令牌桶限流：每个 (规则, 键) 一个桶，键可以是客户端 IP 或 (站点, 用户名)（登录请求取提交的用户名，
+其他请求取会话中的用户名）。桶只保存在内存中，空闲到已经回满的桶会被定期清理，内存占用只与活跃客户端数有关。
+超出限制时返回 429 和 Retry-After。
+
+登录、验证码等开销大的接口另有全局并发上限：已有 EXPENSIVE_CONCURRENCY 个请求在处理时，
+新请求直接返回 503，而不是排队占满所有工作线程。
+"""
+
+import math
+import os
+import threading
+import time
+
+from flask import current_app, g, jsonify, request, session
+
+import tenants
+
+# 清理空闲桶的间隔（秒）和桶数量上限（超过时立即清理）
+CLEANUP_INTERVAL = 60.0
+MAX_BUCKETS = 100000
+# 登录、验证码等开销大的接口同时处理的请求上限
+EXPENSIVE_CONCURRENCY = int(os.environ.get('RATE_LIMIT_EXPENSIVE_CONCURRENCY', '4'))
+EXPENSIVE_ENDPOINTS = {'login', 'get_captcha'}
+# 不参与默认限流的端点（副本同步、推送长连接、指标抓取）
+EXEMPT_ENDPOINTS = {'get_changes', 'get_changes_snapshot', 'events', 'metrics', 'static'}
+
+
+class Limit:
+    """限流规则：每 period 秒 count 次，允许 burst 次突发（默认等于 count）"""
+
+    def __init__(self, key, count, period, burst=None):
+        if key not in ('ip', 'username'):
+            raise ValueError(f'Unknown rate limit key: {key}')
+        self.key = key
+        self.rate = count / period
+        self.burst = burst or count
+
+    def __repr__(self):
+        return f'Limit({self.key!r}, rate={self.rate:.3f}/s, burst={self.burst})'
+
+
+class TokenBucketLimiter:
+    """按键分桶的令牌桶（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._last_cleanup = time.monotonic()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def hit(self, limit, key, now=None):
+        """消耗一个令牌；允许时返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic() if now is None else now
+        bucket_key = (id(limit), key)
+        with self._lock:
+            if now - self._last_cleanup > CLEANUP_INTERVAL or len(self._buckets) > MAX_BUCKETS:
+                self._cleanup(now)
+            tokens, updated, _ = self._buckets.get(bucket_key, (limit.burst, now, limit))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            if tokens >= 1:
+                self._buckets[bucket_key] = (tokens - 1, now, limit)
+                return 0.0
+            self._buckets[bucket_key] = (tokens, now, limit)
+            return (1 - tokens) / limit.rate
+
+    def _cleanup(self, now):
+        """删除已经回满的桶（再次访问时会以满桶重建，结果相同）"""
+        self._buckets = {
+            key: (tokens, updated, limit) for key, (tokens, updated, limit) in self._buckets.items()
+            if tokens + (now - updated) * limit.rate < limit.burst
+        }
+        self._last_cleanup = now
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# 各端点的限流规则；未列出的 /api/ 端点使用 DEFAULT_LIMITS
+ROUTE_LIMITS = {
+    'login': [Limit('ip', 10, 60), Limit('username', 5, 60)],
+    'get_captcha': [Limit('ip', 30, 60)],
+    'import_data': [Limit('ip', 5, 60)],
+    'export_data': [Limit('ip', 10, 60)],
+    'upload_file': [Limit('ip', 30, 60)],
+}
+DEFAULT_LIMITS = [Limit('ip', 600, 60, burst=120)]
+
+limiter = TokenBucketLimiter()
+_expensive = threading.BoundedSemaphore(EXPENSIVE_CONCURRENCY)
+
+
+def _client_ip():
+    # 只信任自己的代理追加的地址：最左边的条目由客户端任意填写，
+    # 经过 N 层代理时取从右数第 N 个（第一层代理看到的对端地址）
+    hops = current_app.config.get('RATE_LIMIT_TRUST_PROXY', 0)
+    if hops:
+        forwarded = [entry.strip() for entry in request.headers.get('X-Forwarded-For', '').split(',')]
+        if len(forwarded) >= hops and forwarded[-hops]:
+            return forwarded[-hops]
+    return request.remote_addr or 'unknown'
+
+
+def _username():
+    # 用户名只在所属站点内有意义：同名用户（例如默认的 admin）在各站点分别计数。
+    # 限流先于站点切换执行，站点名直接从请求得出
+    if request.endpoint == 'login':
+        data = request.get_json(silent=True) or {}
+        username = data.get('username')
+        username = str(username).lower() if username else None
+    else:
+        username = session.get('username')
+    return (tenants.requested_tenant(), username) if username else None
+
+
+def limits_for(endpoint):
+    if endpoint in ROUTE_LIMITS:
+        return ROUTE_LIMITS[endpoint]
+    if endpoint in EXEMPT_ENDPOINTS or not request.path.startswith('/api/'):
+        return ()
+    return DEFAULT_LIMITS
+
+
+def _too_many(retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({'error': 'Too many requests', 'retry_after': retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _before_request():
+    if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+        return None
+    endpoint = request.endpoint
+    wait = 0.0
+    for limit in limits_for(endpoint):
+        key = _client_ip() if limit.key == 'ip' else _username()
+        if key is None:
+            continue
+        wait = max(wait, limiter.hit(limit, key))
+    if wait:
+        return _too_many(wait)
+
+    if endpoint in EXPENSIVE_ENDPOINTS:
+        if not _expensive.acquire(blocking=False):
+            response = jsonify({'error': 'Server busy, please retry'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        g._ratelimit_slot = True
+    return None
+
+
+def _teardown_request(exc):
+    if g.pop('_ratelimit_slot', False):
+        _expensive.release()
+
+
+def init_rate_limits(app):
+    """注册限流钩子；RATE_LIMIT=0 关闭限流"""
+    app.config.setdefault('RATE_LIMIT_ENABLED', os.environ.get('RATE_LIMIT', '1') == '1')
+    app.config.setdefault('RATE_LIMIT_TRUST_PROXY', int(os.environ.get('RATE_LIMIT_TRUST_PROXY', '0')))
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,302 @@
+"""
+相关论文 / 相关项目推荐
+
+对论文（标题、摘要、关键词）和项目（标题、描述、技术、标签）分别建立 TF-IDF 向量，
+用 NumPy 分块计算余弦相似度，argpartition 取每条记录的前 RELATED_TOP_K 个邻居，
+结果（含展示用的标题等字段）以 JSON 存入 related_items 表，接口按主键读取后原样返回，不在请求中做任何计算。
+
+IDF 依赖整个语料，单条记录的变化会影响所有相似度，因此写入后不做逐条增量，而是标记资源为待更新，
+由后台线程在写入停止 RELATED_DELAY 秒后整体重算（连续导入、批量编辑只触发一次）。
+语料内容的摘要保存在 related_state 中，内容没有变化（如只调整了排序）时跳过重算。
+未安装 NumPy 时不计算推荐，接口返回空列表。
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from database import current_database_path, pooled_connection, use_database
+from resources import PROJECTS, PUBLICATIONS, after_commit
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 每条记录保留的相关条目数
+RELATED_TOP_K = int(os.environ.get('RELATED_TOP_K', '10'))
+# 写入停止多少秒后开始重算
+RELATED_DELAY = float(os.environ.get('RELATED_DELAY', '2'))
+# 参与计算的词项上限（按文档频率取前 N 个），决定相似度矩阵计算的内存占用：记录数 × N × 4 字节
+MAX_FEATURES = int(os.environ.get('RELATED_MAX_FEATURES', '4096'))
+# 出现在超过该比例文档中的词项区分度太低，不参与计算（语料少于 MIN_DOCS_FOR_MAX_DF 篇时不过滤）
+MAX_DF = 0.5
+MIN_DOCS_FOR_MAX_DF = 20
+# 相似度低于该值的条目不算相关
+MIN_SCORE = 0.05
+# 每次相似度矩阵乘法处理的行数
+BLOCK_ROWS = 512
+
+_WORD = re.compile(r'[a-z][a-z0-9+#]*|[\u4e00-\u9fff]+')
+_CJK = re.compile(r'[\u4e00-\u9fff]')
+_KEYWORD_SEPARATORS = re.compile(r'[,，;；、]')
+_STOPWORDS = frozenset('''
+    a an and are as at be by for from has have in into is it its of on or our over that the their this to
+    using via we with based towards toward new study approach method methods paper results
+'''.split())
+
+
+class _Corpus:
+    """参与推荐的资源：文本字段及权重（标题、关键词等短字段权重更高），以及返回给前端的展示字段"""
+
+    def __init__(self, resource, text_fields, keyword_fields, display_fields):
+        self.resource = resource
+        self.text_fields = text_fields
+        self.keyword_fields = keyword_fields
+        self.display_fields = display_fields
+        columns = ['id', *display_fields]
+        columns += [f for f, _ in text_fields + keyword_fields if f not in columns]
+        self.columns = columns
+        self.select_sql = f'SELECT {", ".join(columns)} FROM {resource.table} ORDER BY id'
+
+
+CORPORA = {
+    PUBLICATIONS.name: _Corpus(PUBLICATIONS, [('title', 2), ('abstract', 1)], [('keywords', 2)],
+                               ['title', 'authors', 'journal', 'year']),
+    PROJECTS.name: _Corpus(PROJECTS, [('title', 2), ('description', 1), ('detailed_description', 1)],
+                           [('technologies', 1), ('tags', 2)],
+                           ['title', 'role', 'start_date', 'status']),
+}
+
+
+def tokenize(text):
+    """英文按单词（去停用词），中文按相邻两字切分（单字词保留原字）"""
+    tokens = []
+    for match in _WORD.findall(str(text).lower()):
+        if _CJK.match(match):
+            if len(match) == 1:
+                tokens.append(match)
+            else:
+                tokens.extend(match[i:i + 2] for i in range(len(match) - 1))
+        elif len(match) > 1 and match not in _STOPWORDS:
+            tokens.append(match)
+    return tokens
+
+
+def _term_counts(corpus, row):
+    """一条记录的加权词频；关键词整体也作为一个词项（"kw:" 前缀），使完全相同的关键词获得额外权重"""
+    counts = Counter()
+    for field, weight in corpus.text_fields + corpus.keyword_fields:
+        value = row[field]
+        if not value:
+            continue
+        for token in tokenize(value):
+            counts[token] += weight
+    for field, weight in corpus.keyword_fields:
+        for keyword in _KEYWORD_SEPARATORS.split(row[field] or ''):
+            keyword = ' '.join(keyword.lower().split())
+            if keyword:
+                counts['kw:' + keyword] += weight
+    return counts
+
+
+def _fingerprint(rows):
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(json.dumps(row, ensure_ascii=False, default=str).encode())
+    return digest.hexdigest()
+
+
+def _tfidf_matrix(docs):
+    """返回 L2 归一化的 TF-IDF 矩阵（float32，行对应记录）
+
+    词频取 1 + log(tf)，IDF 取平滑形式 log((1 + n) / (1 + df)) + 1。只在一篇文档中出现的词项
+    对任何一对文档的相似度都没有贡献，不进入矩阵，但计入向量长度，保证余弦值与完整向量一致。
+    """
+    n = len(docs)
+    df = Counter()
+    for counts in docs:
+        df.update(counts.keys())
+    idf = {term: math.log((1 + n) / (1 + d)) + 1 for term, d in df.items()}
+
+    max_df = MAX_DF * n if n >= MIN_DOCS_FOR_MAX_DF else n
+    candidates = [term for term, d in df.items() if 2 <= d <= max_df]
+    candidates.sort(key=lambda t: (-df[t], t))
+    vocabulary = {term: i for i, term in enumerate(candidates[:MAX_FEATURES])}
+
+    matrix = np.zeros((n, len(vocabulary)), dtype=np.float32)
+    norms = np.zeros(n, dtype=np.float64)
+    for row, counts in enumerate(docs):
+        cols = []
+        values = []
+        total = 0.0
+        for term, tf in counts.items():
+            weight = (1 + math.log(tf)) * idf[term]
+            total += weight * weight
+            col = vocabulary.get(term)
+            if col is not None:
+                cols.append(col)
+                values.append(weight)
+        if cols:
+            matrix[row, cols] = values
+        norms[row] = math.sqrt(total)
+    norms[norms == 0] = 1.0
+    matrix /= norms[:, None].astype(np.float32)
+    return matrix
+
+
+def top_k_neighbours(matrix, k):
+    """每一行的前 k 个最相似的行（不含自身），返回 (索引, 相似度) 两个 n × k 数组，按相似度降序
+
+    相似度按 BLOCK_ROWS 行一块计算，峰值内存为 BLOCK_ROWS × n，而不是完整的 n × n 矩阵。
+    """
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    indices = np.zeros((n, max(k, 0)), dtype=np.int64)
+    scores = np.zeros((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+    for start in range(0, n, BLOCK_ROWS):
+        block = matrix[start:start + BLOCK_ROWS] @ matrix.T
+        rows = np.arange(block.shape[0])
+        block[rows, rows + start] = -1.0
+        part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(block, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind='stable')
+        indices[start:start + BLOCK_ROWS] = np.take_along_axis(part, order, axis=1)
+        scores[start:start + BLOCK_ROWS] = np.take_along_axis(part_scores, order, axis=1)
+    return indices, scores
+
+
+def rebuild(conn, corpus, force=False):
+    """重算一类资源的相关条目（调用方负责提交）；内容未变化且 force 为 False 时跳过，返回记录数或 None"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = [dict(zip(corpus.columns, row)) for row in cursor.execute(corpus.select_sql).fetchall()]
+    fingerprint = _fingerprint(rows)
+    if not force:
+        state = conn.execute('SELECT fingerprint FROM related_state WHERE resource = ?',
+                             (corpus.resource.name,)).fetchone()
+        if state is not None and state[0] == fingerprint:
+            return None
+
+    entries = []
+    if rows and NUMPY_AVAILABLE:
+        matrix = _tfidf_matrix([_term_counts(corpus, row) for row in rows])
+        indices, scores = top_k_neighbours(matrix, RELATED_TOP_K)
+        for i, row in enumerate(rows):
+            related = []
+            for j, score in zip(indices[i].tolist(), scores[i].tolist()):
+                if score < MIN_SCORE:
+                    break
+                other = rows[j]
+                related.append({'id': other['id'], **{f: other[f] for f in corpus.display_fields},
+                                'score': round(score, 4)})
+            entries.append((corpus.resource.name, row['id'], json.dumps(related, ensure_ascii=False)))
+
+    conn.execute('DELETE FROM related_items WHERE resource = ?', (corpus.resource.name,))
+    conn.executemany('INSERT INTO related_items (resource, item_id, related) VALUES (?, ?, ?)', entries)
+    conn.execute('INSERT OR REPLACE INTO related_state (resource, fingerprint, updated_at) '
+                 'VALUES (?, ?, CURRENT_TIMESTAMP)', (corpus.resource.name, fingerprint))
+    return len(rows)
+
+
+def related_json(conn, resource_name, item_id):
+    """按主键读取预先计算的相关条目（JSON 字节）；记录不存在返回 None，尚未计算返回空列表"""
+    row = conn.execute('SELECT CAST(related AS BLOB) FROM related_items WHERE resource = ? AND item_id = ?',
+                       (resource_name, item_id)).fetchone()
+    if row is not None:
+        return row[0]
+    corpus = CORPORA[resource_name]
+    if conn.execute(f'SELECT 1 FROM {corpus.resource.table} WHERE id = ?', (item_id,)).fetchone() is None:
+        return None
+    return b'[]'
+
+
+class _Worker:
+    """后台重算线程：写入只标记待更新的 (数据库文件, 资源)，停止写入 RELATED_DELAY 秒后统一重算"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._dirty = set()
+        self._last_change = 0.0
+        self._thread = None
+
+    def mark(self, name):
+        with self._lock:
+            self._dirty.add((current_database_path(), name))
+            self._last_change = time.monotonic()
+        self._wakeup.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='related-indexer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # 等到写入停止一段时间（去抖）
+            while True:
+                with self._lock:
+                    remaining = self._last_change + RELATED_DELAY - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(remaining)
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                self._wakeup.clear()
+            self._rebuild(dirty)
+
+    def flush(self):
+        """在调用线程中立即重算所有待更新的推荐（不等待去抖）"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        self._rebuild(dirty)
+
+    def _rebuild(self, dirty):
+        for path, name in sorted(dirty):
+            try:
+                start = time.perf_counter()
+                with use_database(path), pooled_connection() as conn:
+                    count = rebuild(conn, CORPORA[name])
+                if count is not None:
+                    print(f"Related {name} recomputed ({path}): {count} items in "
+                          f"{time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                print(f"Related {name} recompute failed ({path}): {e}")
+
+
+_worker = _Worker()
+
+
+@after_commit
+def _on_commit(resource, action, item_id):
+    if resource.name in CORPORA:
+        _worker.mark(resource.name)
+
+
+def flush():
+    """立即重算写入后尚未更新的推荐；命令行直接写库后在退出前调用（后台线程来不及去抖）"""
+    if NUMPY_AVAILABLE:
+        _worker.flush()
+
+
+def init_related():
+    """启动后台重算线程，并检查已有的推荐结果是否与当前内容一致（不一致时在后台重算）"""
+    if not NUMPY_AVAILABLE:
+        print("NumPy not installed, related items disabled")
+        return
+    _worker.start()
+    for name in CORPORA:
+        _worker.mark(name)
+
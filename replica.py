@@ -0,0 +1,190 @@
+"""
+只读副本同步
+
+副本首次启动（或落后太多、主节点变更）时从 /api/changes/snapshot 拉取全量数据：
+快照先完整导入到同目录下的临时数据库（缺少 end 记录或行数不符时放弃，本地数据不变），
+再在一个事务中整体替换各内容表并记录 seq，重新同步期间只读站点始终看到完整的旧数据或新数据。
+之后循环长轮询 /api/changes?since=<seq>&wait=...，主节点一有提交就会立即返回，
+每批变更连同新的 seq 在同一个事务中写入本地数据库。
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+import changelog
+import transfer
+from database import (current_database_path, get_db_connection, init_database, pooled_connection,
+                      use_database)
+from resources import REGISTRY, notify_commit
+
+DEFAULT_WAIT = 25.0
+DEFAULT_BATCH = 1000
+# 出错后的重试间隔（秒），逐步加倍到上限
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+
+class ResyncRequired(Exception):
+    """主节点已清理了副本需要的日志，需要重新拉取全量快照"""
+
+
+class Replica:
+    """从主节点增量同步到本地 SQLite 数据库"""
+
+    def __init__(self, primary, token=None, wait=DEFAULT_WAIT, batch=DEFAULT_BATCH):
+        self.primary = primary.rstrip('/')
+        self.token = token
+        self.wait = wait
+        self.batch = batch
+        self._behind = True
+
+    def _open(self, path, params=None, timeout=None):
+        url = f'{self.primary}{path}'
+        if params:
+            url += '?' + urlencode(params)
+        req = urllib.request.Request(url)
+        if self.token:
+            req.add_header('Authorization', f'Bearer {self.token}')
+        return urllib.request.urlopen(req, timeout=timeout or self.wait + 10)
+
+    def _get_state(self, conn, key):
+        row = conn.execute('SELECT value FROM replication_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO replication_state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def last_seq(self):
+        """已应用的最大 seq；尚未初始化或主节点变更时返回 None"""
+        with pooled_connection() as conn:
+            if self._get_state(conn, 'primary') != self.primary:
+                return None
+            seq = self._get_state(conn, 'last_seq')
+        return int(seq) if seq is not None else None
+
+    def bootstrap(self):
+        """拉取全量快照替换本地数据，返回快照对应的 seq"""
+        header = {}
+
+        def lines(response):
+            for raw in response:
+                if not header:
+                    header.update(json.loads(raw))
+                yield raw
+
+        path = current_database_path()
+        fd, staging = tempfile.mkstemp(prefix=f'{os.path.basename(path)}.bootstrap-',
+                                       dir=os.path.dirname(os.path.abspath(path)))
+        os.close(fd)
+        try:
+            with use_database(staging):
+                init_database()
+                with self._open('/api/changes/snapshot', timeout=300) as response:
+                    counts = transfer.import_ndjson(lines(response), mode='replace', record_changes=False,
+                                                    notify=False)
+            seq = int(header.get('seq') or 0)
+            self._swap_in(staging, header['tables'], seq)
+        finally:
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                try:
+                    os.unlink(staging + suffix)
+                except FileNotFoundError:
+                    pass
+        for table in header['tables']:
+            notify_commit(REGISTRY[table], 'import', None)
+        print(f"Replica bootstrapped from {self.primary}: {sum(counts.values())} rows, seq {seq}")
+        return seq
+
+    def _swap_in(self, staging, tables, seq):
+        """用临时数据库中的内容表整体替换本地数据，并在同一事务中记录 seq"""
+        conn = get_db_connection()
+        try:
+            conn.execute('ATTACH DATABASE ? AS staging', (staging,))
+            conn.execute('BEGIN IMMEDIATE')
+            for table in tables:
+                columns = ', '.join(transfer.table_columns(conn, table))
+                conn.execute(f'DELETE FROM main.{table}')
+                conn.execute(f'INSERT INTO main.{table} ({columns}) SELECT {columns} FROM staging.{table}')
+            self._set_state(conn, 'primary', self.primary)
+            self._set_state(conn, 'last_seq', seq)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def pull(self, since, wait=0):
+        """拉取并应用一批变更，返回 (新的 seq, 是否还有更多, 应用条数)"""
+        params = {'since': since, 'limit': self.batch}
+        if wait:
+            params['wait'] = wait
+        try:
+            with self._open('/api/changes', params) as response:
+                result = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 410:
+                raise ResyncRequired(e.read().decode('utf-8', 'replace'))
+            raise
+
+        changes = result['changes']
+        if changes:
+            with pooled_connection() as conn:
+                changelog.apply_changes(conn, changes)
+                self._set_state(conn, 'last_seq', result['last_seq'])
+            for change in changes:
+                resource = REGISTRY.get(change['table'])
+                if resource is None:
+                    continue
+                # 副本上的写入不经过 on_write 钩子，派生数据由提交后钩子补做
+                notify_commit(resource, 'import' if change['op'] == 'truncate' else 'replicate', change['id'])
+        return result['last_seq'], result['more'], len(changes)
+
+    def sync(self):
+        """追上主节点的最新状态，返回当前 seq"""
+        since = self.last_seq()
+        if since is None:
+            since = self.bootstrap()
+        while True:
+            try:
+                since, more, _ = self.pull(since)
+            except ResyncRequired:
+                since = self.bootstrap()
+                continue
+            if not more:
+                return since
+
+    def run(self, stop_event=None):
+        """持续同步，直到 stop_event 被设置；任何一步出错都按退避间隔重试，同步线程不会退出"""
+        delay = RETRY_DELAY
+        resync = False
+        while stop_event is None or not stop_event.is_set():
+            try:
+                since = None if resync else self.last_seq()
+                if since is None:
+                    self.bootstrap()
+                    resync = False
+                    continue
+                # 还有未拉取的变更时不等待，立即拉下一批
+                seq, more, count = self.pull(since, wait=0 if self._behind else self.wait)
+                self._behind = more
+                if count:
+                    print(f"Replica applied {count} changes up to seq {seq}")
+                delay = RETRY_DELAY
+            except ResyncRequired as e:
+                # 在下一轮循环中重新拉取快照，出错时同样重试
+                print(f"Replica must resync: {e}")
+                resync = True
+            except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+                print(f"Replication error: {e!r}; retrying in {delay:.0f}s")
+                if stop_event is not None:
+                    stop_event.wait(delay)
+                else:
+                    time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
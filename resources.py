@@ -0,0 +1,372 @@
+"""
+数据资源注册表
+
+每张内容表的字段、默认值和排序方式只在这里描述一次，CRUD 路由、SQL 语句和序列化所需的字段列表
+都在注册时生成。SQL 文本在进程内只拼接一次，配合线程复用的连接可以持续命中 SQLite 的语句缓存；
+查询结果按预先计算好的字段列表直接组装字典，不再经过 sqlite3.Row。
+
+列表和单条读取支持两种序列化方式（由应用配置 JSON_SERIALIZATION 决定）：
+    python  逐行取出后组装字典，再由 jsonify 编码
+    sqlite  在 SQLite 内用 json_object/json_group_array 生成 JSON，原样返回字节，不创建任何行对象
+
+写操作提供两类钩子，缓存、校验、索引维护等功能都应挂在这里而不是修改各个处理函数：
+    on_write(fn)      在事务内调用 fn(conn, resource, action, item_id, old, new)
+    after_commit(fn)  在事务提交后调用 fn(resource, action, item_id)，
+                      批量导入时 action 为 'import'、item_id 为 None；
+                      只读副本应用主节点的变更时 action 为 'replicate'（这类写入不经过 on_write 钩子，
+                      依赖写钩子维护的派生数据需要在这里补做）
+"""
+
+import sqlite3
+
+from flask import Response, current_app, jsonify, request
+
+from database import pooled_connection
+
+
+def _sqlite_json_supported():
+    """检查 SQLite 是否内置 JSON1 函数"""
+    try:
+        sqlite3.connect(':memory:').execute("SELECT json_object('a', 1)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+SQLITE_JSON_AVAILABLE = _sqlite_json_supported()
+
+
+def json_mode():
+    """当前请求使用的序列化方式"""
+    mode = current_app.config.get('JSON_SERIALIZATION', 'sqlite')
+    if mode == 'sqlite' and not SQLITE_JSON_AVAILABLE:
+        return 'python'
+    return mode
+
+
+def _json_object_expr(columns):
+    return 'json_object(' + ', '.join(f"'{c}', {c}" for c in columns) + ')'
+
+
+def _json_response(body):
+    return Response(body, mimetype='application/json')
+
+
+_write_hooks = []
+_commit_hooks = []
+
+
+def on_write(fn):
+    """注册事务内的写钩子（可用作装饰器）"""
+    _write_hooks.append(fn)
+    return fn
+
+
+def after_commit(fn):
+    """注册提交后的写钩子（可用作装饰器）"""
+    _commit_hooks.append(fn)
+    return fn
+
+
+def notify_commit(resource, action, item_id):
+    """运行提交后的钩子；批量导入等不经过路由的写入也应调用它（item_id 为 None 表示整表变化）"""
+    for hook in _commit_hooks:
+        try:
+            hook(resource, action, item_id)
+        except Exception as e:
+            # 提交后的钩子失败不影响已经成功的写入
+            print(f"after_commit hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+
+class Column:
+    """可写字段：名称和缺省值（请求中未提供时使用）"""
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.default = default
+
+
+class Resource:
+    """列表型资源：支持列表、创建、更新、删除"""
+
+    def __init__(self, name, singular, label, columns, order_by, where=None, tag_column=None):
+        self.name = name
+        self.table = name
+        self.singular = singular
+        self.label = label
+        self.columns = columns
+        self.order_by = order_by
+        self.where = where
+        self.tag_column = tag_column
+
+        names = [c.name for c in columns]
+        self.read_columns = ('id', *names, 'created_at')
+        select_list = ', '.join(self.read_columns)
+        where_clause = f' WHERE {where}' if where else ''
+
+        self.list_sql = f'SELECT {select_list} FROM {self.table}{where_clause} ORDER BY {order_by}'
+        self.get_sql = f'SELECT {select_list} FROM {self.table} WHERE id = ?'
+        self.insert_sql = (f'INSERT INTO {self.table} ({", ".join(names)}) '
+                           f'VALUES ({", ".join("?" for _ in names)})')
+        self.update_sql = f'UPDATE {self.table} SET {", ".join(f"{n} = ?" for n in names)} WHERE id = ?'
+        self.delete_sql = f'DELETE FROM {self.table} WHERE id = ?'
+        # CAST AS BLOB 让 sqlite3 直接返回 bytes，省去一次解码和重新编码
+        self.json_list_sql = self._json_array_sql(self.list_sql)
+        # ?tag= 过滤：通过标签索引定位记录，不扫描标签字段
+        if tag_column:
+            tag_filter = (f"id IN (SELECT item_id FROM item_tags WHERE resource = '{name}' "
+                          f"AND tag_id = (SELECT id FROM tags WHERE name = ?))")
+            self.tagged_list_sql = (f'SELECT {select_list} FROM {self.table} WHERE {tag_filter}'
+                                    f'{f" AND {where}" if where else ""} ORDER BY {order_by}')
+            self.json_tagged_list_sql = self._json_array_sql(self.tagged_list_sql)
+        else:
+            self.tagged_list_sql = self.json_tagged_list_sql = None
+
+    def _json_array_sql(self, select_sql):
+        return (f'SELECT CAST(json_group_array({_json_object_expr(self.read_columns)}) AS BLOB) '
+                f'FROM ({select_sql})')
+
+    def values(self, data):
+        return tuple(data.get(c.name, c.default) for c in self.columns)
+
+    def serialize(self, rows):
+        columns = self.read_columns
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetch_all(self, conn, tag=None):
+        if tag is not None and not self.tag_column:
+            return []
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        if tag is not None:
+            return self.serialize(cursor.execute(self.tagged_list_sql, (tag,)).fetchall())
+        return self.serialize(cursor.execute(self.list_sql).fetchall())
+
+    def fetch_all_json(self, conn, tag=None):
+        """在 SQLite 中生成整个列表的 JSON，返回 bytes"""
+        if tag is not None:
+            if not self.tag_column:
+                return b'[]'
+            return conn.execute(self.json_tagged_list_sql, (tag,)).fetchone()[0]
+        return conn.execute(self.json_list_sql).fetchone()[0]
+
+    def fetch_one(self, conn, item_id):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        row = cursor.execute(self.get_sql, (item_id,)).fetchone()
+        return dict(zip(self.read_columns, row)) if row else None
+
+    def _run_write_hooks(self, conn, action, item_id, old):
+        if not _write_hooks:
+            return
+        new = self.fetch_one(conn, item_id) if action != 'delete' else None
+        for hook in _write_hooks:
+            hook(conn, self, action, item_id, old, new)
+
+    def create(self, conn, data):
+        """插入一条记录，返回新记录ID（调用方负责提交）"""
+        item_id = conn.execute(self.insert_sql, self.values(data)).lastrowid
+        self._run_write_hooks(conn, 'create', item_id, None)
+        return item_id
+
+    def update(self, conn, item_id, data):
+        old = self.fetch_one(conn, item_id) if _write_hooks else None
+        conn.execute(self.update_sql, (*self.values(data), item_id))
+        self._run_write_hooks(conn, 'update', item_id, old)
+
+    def delete(self, conn, item_id):
+        old = self.fetch_one(conn, item_id) if _write_hooks else None
+        conn.execute(self.delete_sql, (item_id,))
+        self._run_write_hooks(conn, 'delete', item_id, old)
+
+
+class Singleton:
+    """单条记录资源（id = 1）：支持读取和更新"""
+
+    def __init__(self, name, label, columns, read_columns, partial, fallback=None):
+        self.name = name
+        self.table = name
+        self.label = label
+        self.columns = columns
+        self.read_columns = read_columns
+        self.partial = partial
+        self.fallback = fallback
+
+        names = [c.name for c in columns]
+        self.get_sql = f'SELECT {", ".join(read_columns)} FROM {self.table} WHERE id = 1'
+        self.json_get_sql = f'SELECT CAST({_json_object_expr(read_columns)} AS BLOB) FROM {self.table} WHERE id = 1'
+        self.exists_sql = f'SELECT id FROM {self.table} WHERE id = 1'
+        self.update_sql = (f'UPDATE {self.table} SET {", ".join(f"{n} = ?" for n in names)}, '
+                           f'updated_at = CURRENT_TIMESTAMP WHERE id = 1')
+        self.insert_sql = (f'INSERT INTO {self.table} (id, {", ".join(names)}) '
+                           f'VALUES (1, {", ".join("?" for _ in names)})')
+
+    def fetch_one(self, conn, item_id=1):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        row = cursor.execute(self.get_sql).fetchone()
+        return dict(zip(self.read_columns, row)) if row else None
+
+    def fetch_one_json(self, conn):
+        """在 SQLite 中生成记录的 JSON，记录不存在时返回 None"""
+        row = conn.execute(self.json_get_sql).fetchone()
+        return row[0] if row else None
+
+    def update(self, conn, data):
+        """更新记录；partial 为真时只更新请求中出现的字段，否则不存在则创建"""
+        old = self.fetch_one(conn) if _write_hooks else None
+        if self.partial:
+            fields = [c.name for c in self.columns if c.name in data]
+            if not fields:
+                return
+            sql = (f'UPDATE {self.table} SET {", ".join(f"{f} = ?" for f in fields)}, '
+                   f'updated_at = CURRENT_TIMESTAMP WHERE id = ?')
+            conn.execute(sql, (*(data[f] for f in fields), 1))
+        else:
+            values = tuple(data.get(c.name, c.default) for c in self.columns)
+            if conn.execute(self.exists_sql).fetchone():
+                conn.execute(self.update_sql, values)
+            else:
+                conn.execute(self.insert_sql, values)
+        if _write_hooks:
+            new = self.fetch_one(conn)
+            for hook in _write_hooks:
+                hook(conn, self, 'update', 1, old, new)
+
+
+# 教育背景
+EDUCATION = Resource('education', 'education', 'Education record', [
+    Column('degree'), Column('institution'), Column('field'), Column('start_year'), Column('end_year'),
+    Column('description'), Column('tags', ''), Column('order_index', 0),
+], order_by='order_index, start_year DESC', tag_column='tags')
+
+# 论文发表
+PUBLICATIONS = Resource('publications', 'publication', 'Publication', [
+    Column('title'), Column('authors'), Column('journal'), Column('year'), Column('volume'), Column('pages'),
+    Column('doi'), Column('url'), Column('abstract'), Column('keywords'), Column('type', 'journal'),
+    Column('order_index', 0),
+], order_by='order_index, year DESC', tag_column='keywords')
+
+# 项目经历
+PROJECTS = Resource('projects', 'project', 'Project', [
+    Column('title'), Column('description'), Column('detailed_description', ''), Column('role'),
+    Column('start_date'), Column('end_date'), Column('technologies'), Column('url'), Column('github_url'),
+    Column('status', 'completed'), Column('tags', ''), Column('order_index', 0),
+], order_by='order_index, start_date DESC', tag_column='tags')
+
+# 工作经历
+EXPERIENCE = Resource('experience', 'experience', 'Experience', [
+    Column('position'), Column('organization'), Column('start_date'), Column('end_date'),
+    Column('description'), Column('location'), Column('tags', ''), Column('order_index', 0),
+], order_by='order_index, start_date DESC', tag_column='tags')
+
+# 荣誉奖项
+AWARDS = Resource('awards', 'award', 'Award', [
+    Column('title'), Column('organization'), Column('year'), Column('description'), Column('tags', ''),
+    Column('order_index', 0),
+], order_by='order_index, year DESC', tag_column='tags')
+
+# 友情链接（前台只显示启用的链接）
+FRIENDS = Resource('friends', 'friend', 'Friend link', [
+    Column('name'), Column('url'), Column('description'), Column('avatar'), Column('order_index', 0),
+    Column('is_active', 1),
+], order_by='order_index, created_at DESC', where='is_active = 1')
+
+# 个人信息（部分更新）
+PROFILE = Singleton('profile', 'Profile', [
+    Column(name) for name in ('name', 'title', 'bio', 'avatar_url', 'email', 'phone', 'address',
+                              'website', 'linkedin', 'github', 'orcid', 'research_interests')
+], read_columns=('id', 'name', 'title', 'bio', 'avatar_url', 'email', 'phone', 'address', 'website',
+                 'linkedin', 'github', 'orcid', 'research_interests', 'updated_at'),
+    partial=True)
+
+# 系统设置（整体更新，不存在则创建）
+SETTINGS = Singleton('settings', 'Settings', [
+    Column(name) for name in ('beian', 'site_title', 'site_description', 'keywords', 'analytics_code')
+], read_columns=('id', 'beian', 'site_title', 'site_description', 'keywords', 'analytics_code',
+                 'show_tags', 'custom_css', 'footer_text', 'social_links', 'updated_at'),
+    partial=False, fallback={'beian': '', 'site_title': '个人学术主页', 'site_description': ''})
+
+RESOURCES = [EDUCATION, PUBLICATIONS, PROJECTS, EXPERIENCE, AWARDS, FRIENDS]
+SINGLETONS = [PROFILE, SETTINGS]
+REGISTRY = {r.name: r for r in RESOURCES + SINGLETONS}
+
+
+def _collection_views(resource, login_required):
+    def list_items():
+        tag = request.args.get('tag')
+        tag = tag.strip() if tag else None
+        with pooled_connection() as conn:
+            if json_mode() == 'sqlite':
+                return _json_response(resource.fetch_all_json(conn, tag))
+            items = resource.fetch_all(conn, tag)
+        return jsonify(items)
+
+    @login_required
+    def create_item():
+        data = request.get_json()
+        with pooled_connection() as conn:
+            item_id = resource.create(conn, data)
+        notify_commit(resource, 'create', item_id)
+        return jsonify({'message': f'{resource.label} created successfully', 'id': item_id})
+
+    @login_required
+    def update_item(item_id):
+        data = request.get_json()
+        with pooled_connection() as conn:
+            resource.update(conn, item_id, data)
+        notify_commit(resource, 'update', item_id)
+        return jsonify({'message': f'{resource.label} updated successfully'})
+
+    @login_required
+    def delete_item(item_id):
+        with pooled_connection() as conn:
+            resource.delete(conn, item_id)
+        notify_commit(resource, 'delete', item_id)
+        return jsonify({'message': f'{resource.label} deleted successfully'})
+
+    return list_items, create_item, update_item, delete_item
+
+
+def _singleton_views(resource, login_required):
+    def get_item():
+        with pooled_connection() as conn:
+            if json_mode() == 'sqlite':
+                body = resource.fetch_one_json(conn)
+                if body is not None:
+                    return _json_response(body)
+                item = None
+            else:
+                item = resource.fetch_one(conn)
+        if item:
+            return jsonify(item)
+        if resource.fallback is not None:
+            return jsonify(resource.fallback)
+        return jsonify({'error': f'{resource.label} not found'}), 404
+
+    @login_required
+    def update_item():
+        data = request.get_json()
+        with pooled_connection() as conn:
+            resource.update(conn, data)
+        notify_commit(resource, 'update', 1)
+        return jsonify({'message': f'{resource.label} updated successfully'})
+
+    return get_item, update_item
+
+
+def register_resources(app, login_required):
+    """为注册表中的所有资源生成路由（端点名称与原手写处理函数一致）"""
+    for resource in RESOURCES:
+        list_items, create_item, update_item, delete_item = _collection_views(resource, login_required)
+        base = f'/api/{resource.name}'
+        app.add_url_rule(base, f'get_{resource.name}', list_items, methods=['GET'])
+        app.add_url_rule(base, f'create_{resource.singular}', create_item, methods=['POST'])
+        app.add_url_rule(f'{base}/<int:item_id>', f'update_{resource.singular}', update_item, methods=['PUT'])
+        app.add_url_rule(f'{base}/<int:item_id>', f'delete_{resource.singular}', delete_item, methods=['DELETE'])
+
+    for resource in SINGLETONS:
+        get_item, update_item = _singleton_views(resource, login_required)
+        base = f'/api/{resource.name}'
+        app.add_url_rule(base, f'get_{resource.name}', get_item, methods=['GET'])
+        app.add_url_rule(base, f'update_{resource.name}', update_item, methods=['PUT'])
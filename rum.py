@@ -0,0 +1,231 @@
+"""
+真实用户性能数据（RUM）
+
+前台主页和管理后台用 navigator.sendBeacon 把页面和接口的耗时发到 POST /api/rum：
+    ttfb  导航请求的首字节时间
+    fcp   首次内容绘制
+    lcp   最大内容绘制
+    api   fetchAPI / apiCall 单次接口请求的耗时（name 为接口路径，数字 ID 归一为 :id）
+接口只做校验并把样本追加到内存缓冲区，立即返回 204，不访问数据库；缓冲区满时丢弃新样本并计数。
+后台线程每 RUM_FLUSH_INTERVAL 秒按数据库文件分组批量写入 rum_samples。
+
+rum_samples 是固定 RUM_RING_SIZE 行的环形表：第 seq 个样本写入 slot = seq % RUM_RING_SIZE，
+覆盖最旧的样本，表的大小不随访问量增长。每个整点过后，写入线程把上一小时的样本汇总为
+rum_hourly（每个页面、指标、接口一行：样本数和 p50/p75/p95/p99），汇总保留 RUM_ROLLUP_DAYS 天。
+环形表应至少能容纳一小时的样本，否则汇总只包含该小时内最近的部分样本。
+/api/admin/rum 返回汇总结果，尚未汇总的小时直接从环形表计算。
+"""
+
+import atexit
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+from database import current_database_path, pooled_connection, use_database
+
+# 内存缓冲区的样本上限（写入线程跟不上时丢弃新样本）
+RUM_BUFFER_SIZE = int(os.environ.get('RUM_BUFFER_SIZE', '10000'))
+# 批量写入间隔（秒）
+RUM_FLUSH_INTERVAL = float(os.environ.get('RUM_FLUSH_INTERVAL', '5'))
+# 环形表行数
+RUM_RING_SIZE = int(os.environ.get('RUM_RING_SIZE', '100000'))
+# 小时汇总保留天数
+RUM_ROLLUP_DAYS = int(os.environ.get('RUM_ROLLUP_DAYS', '90'))
+# 单个上报请求的大小和样本数上限
+MAX_BEACON_BYTES = 16384
+MAX_BEACON_SAMPLES = 100
+# 超过该值（毫秒）的样本视为异常数据
+MAX_VALUE_MS = 600000
+MAX_NAME_LENGTH = 200
+
+PAGES = ('home', 'admin')
+METRICS = ('ttfb', 'fcp', 'lcp', 'api')
+PERCENTILES = (50, 75, 95, 99)
+HOUR = 3600
+
+_NUMERIC_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+class BeaconError(ValueError):
+    """上报数据格式错误"""
+
+
+def _normalize_name(metric, name):
+    if metric != 'api':
+        return ''
+    path = str(name or '').split('?', 1)[0]
+    if not path.startswith('/api/'):
+        raise BeaconError('Invalid API path')
+    return _NUMERIC_SEGMENT.sub('/:id', path)[:MAX_NAME_LENGTH]
+
+
+def parse_beacon(data):
+    """校验上报内容，返回 [(page, metric, name, value), ...]"""
+    if not isinstance(data, dict):
+        raise BeaconError('Beacon must be a JSON object')
+    page = data.get('page')
+    if page not in PAGES:
+        raise BeaconError('Invalid page')
+    samples = data.get('samples')
+    if not isinstance(samples, list) or len(samples) > MAX_BEACON_SAMPLES:
+        raise BeaconError('Invalid samples')
+    parsed = []
+    for sample in samples:
+        if not isinstance(sample, dict) or sample.get('metric') not in METRICS:
+            raise BeaconError('Invalid metric')
+        value = sample.get('value')
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or not math.isfinite(value) or not 0 <= value <= MAX_VALUE_MS:
+            raise BeaconError('Invalid value')
+        metric = sample['metric']
+        parsed.append((page, metric, _normalize_name(metric, sample.get('name')), round(float(value), 1)))
+    return parsed
+
+
+def percentile(values, p):
+    """最近秩百分位数（values 已排序）"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _summarize(values):
+    values.sort()
+    return {'count': len(values), **{f'p{p}': percentile(values, p) for p in PERCENTILES}}
+
+
+def write_samples(conn, samples):
+    """把 [(recorded_at, page, metric, name, value), ...] 写入环形表（调用方负责提交）"""
+    if not samples:
+        return
+    # 先更新序号再读取：写锁在事务开始时取得，多个进程同时写入也不会分到相同的槽位
+    conn.execute('UPDATE rum_state SET next_seq = next_seq + ? WHERE id = 1', (len(samples),))
+    seq = conn.execute('SELECT next_seq FROM rum_state WHERE id = 1').fetchone()[0] - len(samples)
+    conn.executemany('INSERT OR REPLACE INTO rum_samples (slot, recorded_at, page, metric, name, value) '
+                     'VALUES (?, ?, ?, ?, ?, ?)',
+                     [((seq + i) % RUM_RING_SIZE, *sample) for i, sample in enumerate(samples)])
+
+
+def _hour_groups(conn, start, end):
+    """[start, end) 内的样本按 (小时, 页面, 指标, 接口) 分组"""
+    groups = defaultdict(list)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    for recorded_at, page, metric, name, value in cursor.execute(
+            'SELECT recorded_at, page, metric, name, value FROM rum_samples '
+            'WHERE recorded_at >= ? AND recorded_at < ?', (start, end)):
+        groups[(recorded_at - recorded_at % HOUR, page, metric, name)].append(value)
+    return groups
+
+
+def rollup(conn, now=None):
+    """汇总已经结束、尚未汇总的小时，并清理过期的汇总（调用方负责提交）；返回汇总的小时数"""
+    now = int(time.time() if now is None else now)
+    current_hour = now - now % HOUR
+    rolled_up_to = conn.execute('SELECT rolled_up_to FROM rum_state WHERE id = 1').fetchone()[0]
+    if rolled_up_to >= current_hour:
+        return 0
+    groups = _hour_groups(conn, rolled_up_to, current_hour)
+    conn.executemany(
+        'INSERT OR REPLACE INTO rum_hourly (hour, page, metric, name, count, p50, p75, p95, p99) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(*key, *_summarize(values).values()) for key, values in groups.items()])
+    conn.execute('UPDATE rum_state SET rolled_up_to = ? WHERE id = 1', (current_hour,))
+    conn.execute('DELETE FROM rum_hourly WHERE hour < ?', (current_hour - RUM_ROLLUP_DAYS * 24 * HOUR,))
+    # RUM_RING_SIZE 调小后多出的槽位
+    conn.execute('DELETE FROM rum_samples WHERE slot >= ?', (RUM_RING_SIZE,))
+    return len({key[0] for key in groups})
+
+
+def summary(conn, hours=24, now=None):
+    """最近 hours 小时每小时的百分位数（毫秒），未汇总的小时从环形表实时计算"""
+    now = int(time.time() if now is None else now)
+    since = now - now % HOUR - (hours - 1) * HOUR
+    rolled_up_to, next_seq = conn.execute('SELECT rolled_up_to, next_seq FROM rum_state WHERE id = 1').fetchone()
+    rows = [dict(row) for row in conn.execute(
+        'SELECT hour, page, metric, name, count, p50, p75, p95, p99 FROM rum_hourly WHERE hour >= ? AND hour < ?',
+        (since, rolled_up_to)).fetchall()]
+    for (hour, page, metric, name), values in _hour_groups(conn, max(since, rolled_up_to), now + HOUR).items():
+        rows.append({'hour': hour, 'page': page, 'metric': metric, 'name': name, **_summarize(values)})
+    rows.sort(key=lambda r: (-r['hour'], r['page'], METRICS.index(r['metric']), r['name']))
+    for row in rows:
+        row['hour'] = time.strftime('%Y-%m-%dT%H:00:00Z', time.gmtime(row['hour']))
+    return {
+        'hours': hours,
+        'samples_stored': min(next_seq, RUM_RING_SIZE),
+        'ring_size': RUM_RING_SIZE,
+        'buffer': collector.stats(),
+        'hourly': rows,
+    }
+
+
+class Collector:
+    """内存缓冲区和后台写入线程"""
+
+    def __init__(self, capacity=RUM_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._buffer = deque()
+        self._capacity = capacity
+        self._accepted = 0
+        self._dropped = 0
+        self._written = 0
+        self._thread = None
+
+    def add(self, samples, recorded_at=None):
+        """把样本追加到当前数据库文件的缓冲区；返回接收的样本数"""
+        recorded_at = int(time.time() if recorded_at is None else recorded_at)
+        path = current_database_path()
+        with self._lock:
+            room = self._capacity - len(self._buffer)
+            accepted = samples[:max(room, 0)]
+            self._buffer.extend((path, (recorded_at, *sample)) for sample in accepted)
+            self._accepted += len(accepted)
+            self._dropped += len(samples) - len(accepted)
+        return len(accepted)
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._buffer), 'accepted': self._accepted,
+                    'dropped': self._dropped, 'written': self._written}
+
+    def flush(self):
+        """写入缓冲区中的全部样本，并汇总这些数据库中已经结束的小时（没有新样本的数据库在下次收到样本时补汇总）"""
+        with self._lock:
+            batch, self._buffer = self._buffer, deque()
+        by_path = defaultdict(list)
+        for path, sample in batch:
+            by_path[path].append(sample)
+        for path, samples in sorted(by_path.items()):
+            try:
+                with use_database(path), pooled_connection() as conn:
+                    write_samples(conn, samples)
+                    rollup(conn)
+                with self._lock:
+                    self._written += len(samples)
+            except Exception as e:
+                print(f"RUM flush failed ({path}): {e}")
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='rum-writer', daemon=True)
+        self._thread.start()
+        # 进程退出时写入缓冲区中剩余的样本
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(RUM_FLUSH_INTERVAL)
+            self.flush()
+
+
+collector = Collector()
+
+
+def init_rum(app):
+    """RUM=0 时页面不再上报，/api/rum 收到的数据直接丢弃；写入线程由调用方启动（collector.start）"""
+    app.config.setdefault('RUM_ENABLED', os.environ.get('RUM', '1') == '1')
@@ -4,10 +4,13 @@
 个人学术主页系统启动脚本
 """
 
+import argparse
+import atexit
 import os
 import sys
+import threading
+import database
 from database import init_database, create_default_profile, create_default_data, create_admin_user
-from app import app
 
 def setup_database():
     """设置数据库"""
@@ -52,8 +55,8 @@ def create_default_admin():
         else:
             print("创建失败，请重试。")
 
-def main():
-    """主函数"""
+def serve(read_only=False, port=5000):
+    """初始化并启动服务器"""
     print("=== 个人学术主页系统 ===")
     print("正在启动系统...")
     
@@ -61,24 +64,307 @@ def main():
     os.makedirs('static/uploads', exist_ok=True)
     os.makedirs('static/images', exist_ok=True)
     
-    # 初始化数据库
-    setup_database()
+    # 初始化数据库（只读副本的数据全部来自主节点）
+    if read_only:
+        init_database()
+    else:
+        setup_database()
     
-    # 检查是否需要创建管理员账户
-    create_default_admin()
+        # 检查是否需要创建管理员账户
+        create_default_admin()
     
     print("\n=== 系统启动 ===")
     print("访问地址:")
-    print("- 学术主页: http://localhost:5000/")
-    print("- 管理后台: http://localhost:5000/admin")
+    print(f"- 学术主页: http://localhost:{port}/")
+    print(f"- 管理后台: http://localhost:{port}/admin")
     print("\n按 Ctrl+C 停止服务器\n")
     
     # 启动Flask应用
+    from app import app
     try:
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        # 只读副本关闭自动重载，避免同步线程随重载进程重复启动
+        app.run(debug=not read_only, host='0.0.0.0', port=port)
     except KeyboardInterrupt:
         print("\n服务器已停止")
         sys.exit(0)
 
+def load_write_hooks():
+    """导入维护派生数据的模块（导入时注册写钩子），命令行直接写库时派生数据与在服务器中保存一致"""
+    # 只为注册钩子而导入，模块名本身不使用
+    import analytics  # noqa: F401
+    import changelog  # noqa: F401
+    import image_cache  # noqa: F401
+    import offline  # noqa: F401
+    import related
+    import syndication  # noqa: F401
+    import tag_index  # noqa: F401
+
+    # 相关推荐由后台线程去抖后重算，命令行进程退出前直接补做
+    atexit.register(related.flush)
+
+def generate(args):
+    """批量生成合成测试数据"""
+    from data_generator import PRESETS, resolve_counts, generate_data
+
+    load_write_hooks()
+    init_database()
+    create_default_profile()
+    counts = resolve_counts(args.preset, publications=args.publications, projects=args.projects,
+                            experience=args.experience, education=args.education,
+                            awards=args.awards, friends=args.friends)
+    if not any(counts.values()):
+        print(f"请通过 --preset ({', '.join(PRESETS)}) 或各表数量参数指定生成规模")
+        return 1
+
+    print(f"正在生成合成数据 (seed={args.seed}): {counts}")
+    inserted = generate_data(counts, seed=args.seed, clear=args.clear)
+    for table, count in inserted.items():
+        print(f"  {table}: {count} 条")
+    print("合成数据生成完成！")
+    return 0
+
+def export_data(args):
+    """导出全部内容表为 NDJSON"""
+    import transfer
+
+    tables = args.tables.split(',') if args.tables else None
+    if args.output == '-':
+        transfer.export_to_file(sys.stdout, tables)
+        return 0
+    with open(args.output, 'w', encoding='utf-8') as f:
+        count = transfer.export_to_file(f, tables)
+    print(f"导出完成：{count} 行 -> {args.output}")
+    return 0
+
+def import_data(args):
+    """从 NDJSON 文件导入数据"""
+    import transfer
+
+    load_write_hooks()
+    init_database()
+    try:
+        if args.input == '-':
+            counts = transfer.import_ndjson(sys.stdin, mode=args.mode, batch_size=args.batch_size)
+        else:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                counts = transfer.import_ndjson(f, mode=args.mode, batch_size=args.batch_size)
+    except transfer.ImportFormatError as e:
+        print(f"导入失败：{e}")
+        return 1
+    for table, count in counts.items():
+        print(f"  {table}: {count} 条")
+    print("导入完成！")
+    return 0
+
+def snapshot(args):
+    """创建在线快照或列出已有快照"""
+    import snapshots
+
+    if args.list:
+        for item in snapshots.list_snapshots(args.dir):
+            print(f"{item['name']}  {item['size']:>12} bytes  {item['created_at']}")
+        return 0
+
+    init_database()
+    try:
+        info = snapshots.create_snapshot(args.dir, pages=args.pages)
+    except snapshots.SnapshotError as e:
+        print(f"快照失败：{e}")
+        return 1
+    print(f"快照已创建：{info['path']} ({info['size']} bytes, {info['duration_s']}s, {info['mode']})")
+    for name in snapshots.prune_snapshots(args.dir, args.keep, args.max_age_days):
+        print(f"已清理旧快照：{name}")
+    return 0
+
+def restore(args):
+    """从快照恢复数据库"""
+    import snapshots
+
+    path = args.snapshot
+    if not os.path.exists(path):
+        path = os.path.join(args.dir or snapshots.SNAPSHOT_DIR, args.snapshot)
+    if not os.path.exists(path):
+        print(f"快照不存在：{args.snapshot}")
+        return 1
+
+    if not args.yes:
+        answer = input(f"确认用 {path} 覆盖当前数据库 {database.DATABASE_PATH}？(y/N): ").strip().lower()
+        if answer != 'y':
+            print("已取消")
+            return 1
+    try:
+        safety = snapshots.restore_snapshot(path, args.dir)
+    except snapshots.SnapshotError as e:
+        print(f"恢复失败：{e}")
+        return 1
+    print(f"恢复完成！恢复前的数据已保存为 {safety['path']}")
+    return 0
+
+def tenant(args):
+    """创建站点或列出已有站点（多站点模式）"""
+    import tenants
+
+    if args.tenant_command == 'list':
+        for name in tenants.list_tenants():
+            print(f"{name:<40} {os.path.getsize(tenants.tenant_path(name)):>12} bytes")
+        return 0
+
+    try:
+        path = tenants.tenant_path(args.name)
+    except ValueError as e:
+        print(e)
+        return 1
+    if os.path.exists(path):
+        print(f"站点已存在：{args.name} ({path})")
+        return 1
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    database.DATABASE_PATH = path
+    setup_database()
+    if args.password:
+        if not create_admin_user(args.username, args.password, args.email):
+            return 1
+    else:
+        create_default_admin()
+    print(f"站点已创建：{args.name} ({path})")
+    return 0
+
+def enrich(args):
+    """按 DOI 补全论文的期刊、卷、页码、年份和作者"""
+    import doi
+
+    load_write_hooks()
+    init_database()
+    stats = doi.enrich(overwrite=args.overwrite, refresh=args.refresh)
+    print(f"论文 {stats['publications']} 篇（无效 DOI {stats['invalid']} 个）："
+          f"缓存命中 {stats['cached']}，网络获取 {stats['fetched']}（不存在 {stats['not_found']}），"
+          f"失败 {stats['failed']}")
+    print(f"已更新 {stats['updated']} 篇论文")
+    return 1 if stats['failed'] else 0
+
+def replicate(args):
+    """作为只读副本从主节点同步数据"""
+    os.environ['READ_ONLY'] = '1'
+    # 首次追赶和同步线程在导入 app 之前就会提交变更，派生数据的钩子需要先注册
+    load_write_hooks()
+    init_database()
+    from replica import Replica
+
+    replica = Replica(args.primary, token=args.token, wait=args.wait)
+    seq = replica.sync()
+    print(f"已同步到 seq {seq}")
+    if args.once:
+        return 0
+
+    thread = threading.Thread(target=replica.run, name='replica-sync', daemon=True)
+    thread.start()
+    if args.no_serve:
+        try:
+            thread.join()
+        except KeyboardInterrupt:
+            print("\n同步已停止")
+        return 0
+    serve(read_only=True, port=args.port)
+    return 0
+
+def build_parser():
+    """命令行参数定义"""
+    from data_generator import PRESETS
+
+    parser = argparse.ArgumentParser(description='个人学术主页系统')
+    parser.add_argument('--db', help='数据库文件路径（默认 academic_homepage.db）')
+    parser.add_argument('--tenant', help='多站点模式下操作指定站点的数据库（TENANTS_DIR/<站点名>.db）')
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('serve', help='启动服务器（默认）')
+
+    gen_parser = subparsers.add_parser('generate', help='生成大规模合成数据')
+    gen_parser.add_argument('--preset', choices=sorted(PRESETS), help='预设规模')
+    gen_parser.add_argument('--seed', type=int, default=42, help='随机种子（相同种子生成相同数据）')
+    gen_parser.add_argument('--clear', action='store_true', help='生成前清空已有内容数据')
+    for table in ('publications', 'projects', 'experience', 'education', 'awards', 'friends'):
+        gen_parser.add_argument(f'--{table}', type=int, help=f'{table} 表的记录数（覆盖预设）')
+
+    export_parser = subparsers.add_parser('export', help='导出全部内容为 NDJSON')
+    export_parser.add_argument('-o', '--output', default='-', help='输出文件（默认标准输出）')
+    export_parser.add_argument('--tables', help='逗号分隔的表名（默认全部内容表）')
+
+    import_parser = subparsers.add_parser('import', help='从 NDJSON 导入内容')
+    import_parser.add_argument('input', help="导出文件路径，'-' 表示标准输入")
+    import_parser.add_argument('--mode', choices=['merge', 'replace'], default='merge',
+                               help='merge: 按 id 合并；replace: 先清空导入数据涉及的表')
+    import_parser.add_argument('--batch-size', type=int, default=500, help='merge 模式每个事务提交的行数（replace 模式整体在一个事务中完成）')
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='创建在线快照（不阻塞读写）')
+    snapshot_parser.add_argument('--dir', help='快照目录（默认 SNAPSHOT_DIR 或 snapshots/）')
+    snapshot_parser.add_argument('--pages', type=int, help='每步复制的页数')
+    snapshot_parser.add_argument('--keep', type=int, help='保留的快照数量')
+    snapshot_parser.add_argument('--max-age-days', type=float, help='快照最长保留天数')
+    snapshot_parser.add_argument('--list', action='store_true', help='列出已有快照')
+
+    restore_parser = subparsers.add_parser('restore', help='从快照恢复数据库')
+    restore_parser.add_argument('snapshot', help='快照文件路径或快照目录中的文件名')
+    restore_parser.add_argument('--dir', help='快照目录')
+    restore_parser.add_argument('--yes', action='store_true', help='跳过确认')
+
+    enrich_parser = subparsers.add_parser('enrich', help='按 DOI 补全论文信息（期刊、卷、页码、年份、作者）')
+    enrich_parser.add_argument('--overwrite', action='store_true', help='用获取到的元数据覆盖已有内容（默认只填写空字段）')
+    enrich_parser.add_argument('--refresh', action='store_true', help='忽略本地缓存，重新获取全部 DOI')
+
+    replicate_parser = subparsers.add_parser('replicate', help='作为只读副本从主节点增量同步')
+    replicate_parser.add_argument('primary', help='主节点地址，例如 http://primary:5000')
+    replicate_parser.add_argument('--token', default=os.environ.get('REPLICATION_TOKEN'),
+                                  help='主节点的 REPLICATION_TOKEN')
+    replicate_parser.add_argument('--wait', type=float, default=25.0, help='长轮询等待秒数')
+    replicate_parser.add_argument('--port', type=int, default=5000, help='只读服务监听端口')
+    replicate_parser.add_argument('--once', action='store_true', help='同步到最新后退出')
+    replicate_parser.add_argument('--no-serve', action='store_true', help='只同步，不启动只读服务')
+
+    tenant_parser = subparsers.add_parser('tenant', help='多站点模式的站点管理')
+    tenant_subparsers = tenant_parser.add_subparsers(dest='tenant_command', required=True)
+    tenant_create_parser = tenant_subparsers.add_parser('create', help='创建站点（数据库、默认资料和管理员账户）')
+    tenant_create_parser.add_argument('name', help='站点名（域名模式下为子域名或完整域名，路径模式下为 /~ 之后的部分）')
+    tenant_create_parser.add_argument('--username', default='admin', help='管理员用户名')
+    tenant_create_parser.add_argument('--password', help='管理员密码（不指定时交互输入）')
+    tenant_create_parser.add_argument('--email', help='管理员邮箱')
+    tenant_subparsers.add_parser('list', help='列出已有站点')
+
+    return parser
+
+def main(argv=None):
+    """主函数"""
+    args = build_parser().parse_args(argv)
+    if args.db:
+        database.DATABASE_PATH = args.db
+    if args.tenant:
+        import snapshots
+        import tenants
+        try:
+            database.DATABASE_PATH = tenants.tenant_path(args.tenant)
+        except ValueError as e:
+            print(e)
+            return 1
+        # 各站点的快照放在各自的子目录中，轮转时不会删除其他站点的快照
+        if args.command in ('snapshot', 'restore') and not args.dir:
+            args.dir = os.path.join(snapshots.SNAPSHOT_DIR, args.tenant)
+
+    if args.command == 'generate':
+        return generate(args)
+    if args.command == 'export':
+        return export_data(args)
+    if args.command == 'import':
+        return import_data(args)
+    if args.command == 'snapshot':
+        return snapshot(args)
+    if args.command == 'restore':
+        return restore(args)
+    if args.command == 'enrich':
+        return enrich(args)
+    if args.command == 'replicate':
+        return replicate(args)
+    if args.command == 'tenant':
+        return tenant(args)
+    serve()
+    return 0
+
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    sys.exit(main())
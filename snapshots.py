@@ -0,0 +1,213 @@
+"""
+在线数据库快照（SQLite backup API）
+
+每次只复制少量页面并在步骤之间短暂休眠，复制期间读写请求照常进行。
+其他连接在复制过程中写入会使备份从头开始；连续重启次数过多时改为一次性复制整个数据库
+（WAL 模式下一次性复制只占用读事务，不会阻塞写入）。
+每个快照都会通过 PRAGMA integrity_check 校验，校验通过后才会出现在快照目录中。
+定时快照（SNAPSHOT_INTERVAL）依次备份默认数据库和 TENANTS_DIR 中的每个站点，站点快照放在 SNAPSHOT_DIR/<站点名>/ 下，
+按站点分别轮转。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import database
+import tenants
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+# 每一步复制的页数和步骤间的休眠时间（秒）
+SNAPSHOT_PAGES = int(os.environ.get('SNAPSHOT_PAGES', '128'))
+SNAPSHOT_SLEEP = float(os.environ.get('SNAPSHOT_SLEEP', '0.01'))
+# 保留的快照数量和最长保留天数（0 表示不按时间清理）
+SNAPSHOT_KEEP = int(os.environ.get('SNAPSHOT_KEEP', '10'))
+SNAPSHOT_MAX_AGE_DAYS = float(os.environ.get('SNAPSHOT_MAX_AGE_DAYS', '30'))
+# 分步复制允许的最大重启次数
+MAX_RESTARTS = 5
+
+SNAPSHOT_PREFIX = 'snapshot-'
+SNAPSHOT_SUFFIX = '.db'
+
+
+class SnapshotError(Exception):
+    """快照创建或校验失败"""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _snapshot_dir(directory=None):
+    directory = directory or SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def integrity_check(path):
+    """返回 PRAGMA integrity_check 的结果列表，正常时为 ['ok']"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return [row[0] for row in conn.execute('PRAGMA integrity_check').fetchall()]
+    finally:
+        conn.close()
+
+
+def _copy(source, target, pages, sleep):
+    """分步复制，返回重启次数；重启过多时抛出 _TooManyRestarts"""
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+
+    source.backup(target, pages=pages, progress=progress, sleep=sleep)
+    return state['restarts']
+
+
+def create_snapshot(directory=None, label=None, pages=None, sleep=None):
+    """创建一个快照并校验，返回快照信息"""
+    directory = _snapshot_dir(directory)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    name = f'{SNAPSHOT_PREFIX}{stamp}{"-" + label if label else ""}{SNAPSHOT_SUFFIX}'
+    path = os.path.join(directory, name)
+    partial = path + '.partial'
+
+    started = time.perf_counter()
+    source = sqlite3.connect(database.current_database_path())
+    target = sqlite3.connect(partial)
+    mode = 'incremental'
+    try:
+        try:
+            restarts = _copy(source, target, pages or SNAPSHOT_PAGES, SNAPSHOT_SLEEP if sleep is None else sleep)
+        except _TooManyRestarts:
+            # 写入太频繁，分步复制无法完成，改为一次性复制
+            mode = 'single-step'
+            restarts = MAX_RESTARTS
+            source.backup(target)
+        # 快照文件使用传统日志模式，单个文件即可完整恢复
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+
+    result = integrity_check(partial)
+    if result != ['ok']:
+        os.remove(partial)
+        raise SnapshotError(f"Integrity check failed: {'; '.join(result[:5])}")
+    os.replace(partial, path)
+
+    return {
+        'name': name,
+        'path': path,
+        'size': os.path.getsize(path),
+        'mode': mode,
+        'restarts': restarts,
+        'duration_s': round(time.perf_counter() - started, 3),
+    }
+
+
+def list_snapshots(directory=None):
+    """按时间倒序列出快照"""
+    directory = _snapshot_dir(directory)
+    snapshots = []
+    for name in os.listdir(directory):
+        if not (name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        stat = os.stat(path)
+        snapshots.append({
+            'name': name,
+            'path': path,
+            'size': stat.st_size,
+            'created_at': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+            'mtime': stat.st_mtime,
+        })
+    snapshots.sort(key=lambda s: s['name'], reverse=True)
+    return snapshots
+
+
+def prune_snapshots(directory=None, keep=None, max_age_days=None):
+    """按数量和时间清理旧快照（最新的一个永远保留），返回被删除的文件名"""
+    keep = SNAPSHOT_KEEP if keep is None else keep
+    max_age_days = SNAPSHOT_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+
+    removed = []
+    for index, snapshot in enumerate(list_snapshots(directory)):
+        if index == 0:
+            continue
+        if index >= keep or (cutoff is not None and snapshot['mtime'] < cutoff):
+            os.remove(snapshot['path'])
+            removed.append(snapshot['name'])
+    return removed
+
+
+def restore_snapshot(path, directory=None):
+    """用快照覆盖当前数据库
+
+    恢复前先为当前数据库创建一个 pre-restore 快照；恢复通过 backup API 写入，
+    其他连接随后读到的就是快照中的数据，无需停止应用。
+    """
+    result = integrity_check(path)
+    if result != ['ok']:
+        raise SnapshotError(f"Snapshot is corrupted: {'; '.join(result[:5])}")
+
+    safety = create_snapshot(directory, label='pre-restore')
+    source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    target = sqlite3.connect(database.current_database_path(), timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    return safety
+
+
+_scheduler = None
+
+
+def _scheduled_snapshot(directory=None, tenant=None):
+    try:
+        snapshot = create_snapshot(directory)
+        prune_snapshots(directory)
+        print(f"Snapshot created{f' ({tenant})' if tenant else ''}: {snapshot['name']} "
+              f"({snapshot['size']} bytes, {snapshot['duration_s']}s)")
+    except Exception as e:
+        print(f"Snapshot failed{f' ({tenant})' if tenant else ''}: {e}")
+
+
+def _run_scheduler(interval, stop_event):
+    while not stop_event.wait(interval):
+        _scheduled_snapshot()
+        # 多站点模式下的每个站点各自快照到 SNAPSHOT_DIR/<站点名>/（与 run.py --tenant <站点名> snapshot 相同）
+        for name in tenants.list_tenants():
+            if stop_event.is_set():
+                break
+            with tenants.activate(name, tenants.tenant_path(name)):
+                _scheduled_snapshot(os.path.join(SNAPSHOT_DIR, name), name)
+
+
+def start_snapshot_scheduler(interval):
+    """启动后台定时快照线程（重复调用不会创建多个线程）"""
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+    stop_event = threading.Event()
+    thread = threading.Thread(target=_run_scheduler, args=(interval, stop_event),
+                              name='snapshot-scheduler', daemon=True)
+    thread.start()
+    _scheduler = (thread, stop_event)
+    return _scheduler
+
+
+def stop_snapshot_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler[1].set()
+        _scheduler = None
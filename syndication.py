@@ -0,0 +1,347 @@
+"""
+面向搜索引擎和订阅器的内容：sitemap.xml、Atom / RSS 订阅、页面内嵌的 schema.org JSON-LD
+
+每张内容表在 table_versions 中有一个版本号，资源写入时在同一事务内加一（批量导入和副本同步在提交后更新）。
+每个产物按 (产物, 站点地址) 生成一次后连同来源版本、ETag 和 Last-Modified 保存在 artifacts 表中：
+    sitemap   /sitemap.xml    主页地址和内容最后修改时间
+    atom      /feed.xml       最新的论文和项目（Atom 1.0）
+    rss       /rss.xml        同上（RSS 2.0）
+    jsonld    首页 <head>      Person（个人信息、教育背景、奖项）以及论文、项目的结构化数据
+请求时只比较来源表的当前版本与保存的版本：一致时直接返回保存的内容（支持 304），
+不一致时（来源表有写入）重新生成一次并保存，之后的请求又只是一次查表。
+写入后还会入队一个 syndication.warm 后台任务（连续写入合并为一次），提前重新生成已经生成过的产物。
+
+产物中的绝对链接使用由配置得出的站点地址（site_url），任意 Host 头都不会写入保存的内容：
+    默认站点          SITE_URL；未设置时在域名模式下为 TENANT_DOMAIN
+    路径模式的站点    SITE_URL + /~<站点名>/
+    域名模式的站点    经 TENANT_DOMAIN 访问时为 <站点名>.<TENANT_DOMAIN>，否则（独立域名）为站点名本身
+协议取 SITE_URL 中的协议，未设置时为 https。同一站点可能有两个地址（www.alice 与 www.alice.<TENANT_DOMAIN>），
+各自保存一份，交替访问不会反复重新生成。无法由配置确定地址时（单站点或路径模式且未设置 SITE_URL）
+按请求地址逐次生成，不保存；生产环境应设置 SITE_URL。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from urllib.parse import urlsplit
+
+import tenants
+from analytics import parse_authors
+from database import pooled_connection
+from jobs import enqueue, job
+from resources import after_commit, on_write
+
+# 站点的公开地址，例如 https://homepage.example.edu/
+SITE_URL = os.environ.get('SITE_URL', '').strip().rstrip('/')
+# 订阅中的条目数（论文和项目合计，按加入时间倒序）
+FEED_ENTRIES = 50
+# JSON-LD 中最多列出的论文数
+JSONLD_MAX_PUBLICATIONS = 100
+# 浏览器和爬虫缓存时间（秒），过期后用 ETag / Last-Modified 再次验证
+MAX_AGE = 300
+# 写入后多久开始预先生成（秒），期间的连续写入只生成一次
+WARM_DELAY = 2
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+_lock = threading.Lock()
+
+
+def bump(conn, table):
+    """内容表版本号加一（调用方负责提交）"""
+    conn.execute('''
+        INSERT INTO table_versions (table_name, version, changed_at) VALUES (?, 1, ?)
+        ON CONFLICT (table_name) DO UPDATE SET version = version + 1, changed_at = excluded.changed_at
+    ''', (table, int(time.time())))
+
+
+@on_write
+def _on_write(conn, resource, action, item_id, old, new):
+    bump(conn, resource.table)
+    enqueue(conn, 'syndication.warm', delay=WARM_DELAY)
+
+
+@after_commit
+def _on_commit(resource, action, item_id):
+    # 批量导入和副本同步不经过写钩子
+    if action in ('import', 'replicate'):
+        with pooled_connection() as conn:
+            bump(conn, resource.table)
+            enqueue(conn, 'syndication.warm', delay=WARM_DELAY)
+
+
+def _timestamp(value):
+    """SQLite CURRENT_TIMESTAMP（UTC）转为 datetime"""
+    try:
+        return datetime.strptime(str(value)[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def _rows(conn, sql, params=()):
+    return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def _site(conn):
+    profile = conn.execute('SELECT * FROM profile WHERE id = 1').fetchone()
+    settings = conn.execute('SELECT * FROM settings WHERE id = 1').fetchone()
+    profile = dict(profile) if profile else {}
+    settings = dict(settings) if settings else {}
+    title = settings.get('site_title') or profile.get('name') or '个人学术主页'
+    return profile, settings, title
+
+
+def _publication_link(pub, base_url):
+    if pub.get('url'):
+        return pub['url']
+    if pub.get('doi'):
+        return f"https://doi.org/{pub['doi']}"
+    return f'{base_url}#publications'
+
+
+def _project_link(project, base_url):
+    return project.get('url') or project.get('github_url') or f'{base_url}#projects'
+
+
+def _feed_entries(conn, base_url):
+    """最新的论文和项目：(id, 标题, 链接, 摘要, 加入时间, 分类)"""
+    entries = []
+    for pub in _rows(conn, 'SELECT id, title, authors, journal, year, doi, url, abstract, created_at '
+                           'FROM publications ORDER BY created_at DESC, id DESC LIMIT ?', (FEED_ENTRIES,)):
+        venue = ', '.join(str(v) for v in (pub['journal'], pub['year']) if v)
+        summary = ' — '.join(v for v in (pub['authors'], venue) if v)
+        if pub['abstract']:
+            summary = f"{summary}\n\n{pub['abstract']}" if summary else pub['abstract']
+        entries.append((f'{base_url}#publication-{pub["id"]}', pub['title'], _publication_link(pub, base_url),
+                        summary, _timestamp(pub['created_at']), 'publication'))
+    for project in _rows(conn, 'SELECT id, title, description, url, github_url, created_at '
+                               'FROM projects ORDER BY created_at DESC, id DESC LIMIT ?', (FEED_ENTRIES,)):
+        entries.append((f'{base_url}#project-{project["id"]}', project['title'], _project_link(project, base_url),
+                        project['description'] or '', _timestamp(project['created_at']), 'project'))
+    epoch = datetime.fromtimestamp(0, timezone.utc)
+    entries.sort(key=lambda e: e[4] or epoch, reverse=True)
+    return entries[:FEED_ENTRIES]
+
+
+def _xml(root):
+    return ET.tostring(root, encoding='utf-8', xml_declaration=True)
+
+
+def render_sitemap(conn, base_url, last_modified):
+    root = ET.Element('urlset', xmlns=SITEMAP_NS)
+    url = ET.SubElement(root, 'url')
+    ET.SubElement(url, 'loc').text = base_url
+    ET.SubElement(url, 'lastmod').text = last_modified.strftime('%Y-%m-%dT%H:%M:%SZ')
+    ET.SubElement(url, 'changefreq').text = 'weekly'
+    return _xml(root)
+
+
+def render_atom(conn, base_url, last_modified):
+    profile, settings, title = _site(conn)
+    root = ET.Element('feed', xmlns=ATOM_NS)
+    ET.SubElement(root, 'title').text = title
+    if settings.get('site_description'):
+        ET.SubElement(root, 'subtitle').text = settings['site_description']
+    ET.SubElement(root, 'id').text = base_url
+    ET.SubElement(root, 'link', href=base_url)
+    ET.SubElement(root, 'link', rel='self', type='application/atom+xml', href=f'{base_url}feed.xml')
+    ET.SubElement(root, 'updated').text = last_modified.strftime('%Y-%m-%dT%H:%M:%SZ')
+    author = ET.SubElement(root, 'author')
+    ET.SubElement(author, 'name').text = profile.get('name') or title
+    for entry_id, entry_title, link, summary, created, category in _feed_entries(conn, base_url):
+        entry = ET.SubElement(root, 'entry')
+        ET.SubElement(entry, 'id').text = entry_id
+        ET.SubElement(entry, 'title').text = entry_title
+        ET.SubElement(entry, 'link', href=link)
+        ET.SubElement(entry, 'updated').text = (created or last_modified).strftime('%Y-%m-%dT%H:%M:%SZ')
+        ET.SubElement(entry, 'category', term=category)
+        if summary:
+            ET.SubElement(entry, 'summary').text = summary
+    return _xml(root)
+
+
+def render_rss(conn, base_url, last_modified):
+    profile, settings, title = _site(conn)
+    root = ET.Element('rss', version='2.0')
+    channel = ET.SubElement(root, 'channel')
+    ET.SubElement(channel, 'title').text = title
+    ET.SubElement(channel, 'link').text = base_url
+    ET.SubElement(channel, 'description').text = settings.get('site_description') or title
+    ET.SubElement(channel, 'lastBuildDate').text = format_datetime(last_modified, usegmt=True)
+    for entry_id, entry_title, link, summary, created, category in _feed_entries(conn, base_url):
+        item = ET.SubElement(channel, 'item')
+        ET.SubElement(item, 'title').text = entry_title
+        ET.SubElement(item, 'link').text = link
+        ET.SubElement(item, 'guid', isPermaLink='false').text = entry_id
+        ET.SubElement(item, 'category').text = category
+        if created:
+            ET.SubElement(item, 'pubDate').text = format_datetime(created, usegmt=True)
+        if summary:
+            ET.SubElement(item, 'description').text = summary
+    return _xml(root)
+
+
+def render_json_ld(conn, base_url, last_modified):
+    profile, settings, title = _site(conn)
+    person = {'@type': 'Person', '@id': f'{base_url}#person', 'name': profile.get('name') or title, 'url': base_url}
+    for key, field in (('jobTitle', 'title'), ('description', 'research_interests'), ('email', 'email')):
+        if profile.get(field):
+            person[key] = profile[field]
+    avatar = profile.get('avatar_url')
+    if avatar:
+        person['image'] = avatar if avatar.startswith(('http://', 'https://')) else base_url + avatar.lstrip('/')
+    same_as = [profile[f] for f in ('website', 'linkedin', 'github', 'orcid') if profile.get(f)]
+    if same_as:
+        person['sameAs'] = same_as
+    schools = [row['institution'] for row in _rows(conn, 'SELECT institution FROM education ORDER BY order_index')
+               if row['institution']]
+    if schools:
+        person['alumniOf'] = [{'@type': 'EducationalOrganization', 'name': name} for name in dict.fromkeys(schools)]
+    awards = [row['title'] for row in _rows(conn, 'SELECT title FROM awards ORDER BY order_index, year DESC')
+              if row['title']]
+    if awards:
+        person['award'] = awards
+
+    graph = [{'@type': 'ProfilePage', '@id': base_url, 'url': base_url, 'name': title,
+              'dateModified': last_modified.strftime('%Y-%m-%dT%H:%M:%SZ'), 'mainEntity': {'@id': person['@id']}},
+             person]
+    for pub in _rows(conn, 'SELECT id, title, authors, journal, year, doi, url, abstract, keywords FROM publications '
+                           'ORDER BY order_index, year DESC LIMIT ?', (JSONLD_MAX_PUBLICATIONS,)):
+        article = {'@type': 'ScholarlyArticle', '@id': f'{base_url}#publication-{pub["id"]}',
+                   'headline': pub['title'], 'url': _publication_link(pub, base_url)}
+        if pub['authors']:
+            article['author'] = [{'@type': 'Person', 'name': name} for name in parse_authors(pub['authors'])]
+        if pub['year']:
+            article['datePublished'] = str(pub['year'])
+        if pub['journal']:
+            article['isPartOf'] = {'@type': 'Periodical', 'name': pub['journal']}
+        if pub['doi']:
+            article['identifier'] = {'@type': 'PropertyValue', 'propertyID': 'DOI', 'value': pub['doi']}
+        if pub['abstract']:
+            article['abstract'] = pub['abstract']
+        if pub['keywords']:
+            article['keywords'] = pub['keywords']
+        graph.append(article)
+    for project in _rows(conn, 'SELECT id, title, description, url, github_url, technologies FROM projects '
+                               'ORDER BY order_index, start_date DESC'):
+        work = {'@type': 'CreativeWork', '@id': f'{base_url}#project-{project["id"]}', 'name': project['title'],
+                'url': _project_link(project, base_url), 'creator': {'@id': person['@id']}}
+        if project['description']:
+            work['description'] = project['description']
+        if project['technologies']:
+            work['keywords'] = project['technologies']
+        graph.append(work)
+
+    body = json.dumps({'@context': 'https://schema.org', '@graph': graph}, ensure_ascii=False)
+    # 内嵌在 <script> 中，不能出现 </script>
+    return body.replace('</', '<\\/').encode()
+
+
+class _Artifact:
+    def __init__(self, name, tables, content_type, render):
+        self.name = name
+        self.tables = tables
+        self.content_type = content_type
+        self.render = render
+
+
+ARTIFACTS = {a.name: a for a in (
+    _Artifact('sitemap', ('profile', 'settings', 'education', 'publications', 'projects', 'experience',
+                          'awards', 'friends'), 'application/xml', render_sitemap),
+    _Artifact('atom', ('profile', 'settings', 'publications', 'projects'), 'application/atom+xml', render_atom),
+    _Artifact('rss', ('profile', 'settings', 'publications', 'projects'), 'application/rss+xml', render_rss),
+    _Artifact('jsonld', ('profile', 'settings', 'education', 'publications', 'projects', 'awards'),
+              'application/ld+json', render_json_ld),
+)}
+
+
+def site_url(host=None):
+    """当前站点由配置得出的公开地址（以 / 结尾）；无法由配置确定时返回 None
+
+    host 为请求的 Host 头，只用来判断域名模式下的站点是否经 TENANT_DOMAIN 访问。
+    """
+    scheme = urlsplit(SITE_URL).scheme if SITE_URL else 'https'
+    tenant = tenants.current_tenant()
+    if tenant is None:
+        if SITE_URL:
+            return SITE_URL + '/'
+        if tenants.TENANT_MODE == 'host' and tenants.TENANT_DOMAIN:
+            return f'{scheme}://{tenants.TENANT_DOMAIN}/'
+        return None
+    if tenants.TENANT_MODE == 'path':
+        return f'{SITE_URL}{tenants.TENANT_PATH_PREFIX}{tenant}/' if SITE_URL else None
+    # 与 tenant_from_host 相同的规则：经 TENANT_DOMAIN 访问时站点名是去掉该后缀的部分（可能含 .）
+    if host is not None:
+        via_domain = tenants.TENANT_DOMAIN and \
+            host.lower().rsplit(':', 1)[0].rstrip('.') == f'{tenant}.{tenants.TENANT_DOMAIN}'
+    else:
+        via_domain = tenants.TENANT_DOMAIN and '.' not in tenant
+    if via_domain:
+        return f'{scheme}://{tenant}.{tenants.TENANT_DOMAIN}/'
+    return f'{scheme}://{tenant}/'
+
+
+def _source_state(conn, artifact):
+    """来源表的当前版本和最后修改时间"""
+    placeholders = ', '.join('?' for _ in artifact.tables)
+    rows = {name: (version, changed_at) for name, version, changed_at in conn.execute(
+        f'SELECT table_name, version, changed_at FROM table_versions WHERE table_name IN ({placeholders})',
+        artifact.tables).fetchall()}
+    version = ','.join(f'{t}:{rows.get(t, (0, 0))[0]}' for t in artifact.tables)
+    return version, max((changed for _, changed in rows.values()), default=0)
+
+
+def _render(conn, artifact, base_url, changed_at):
+    last_modified = changed_at or int(time.time())
+    body = artifact.render(conn, base_url, datetime.fromtimestamp(last_modified, timezone.utc))
+    return body, hashlib.sha1(body).hexdigest()[:20], last_modified
+
+
+def get_artifact(conn, name, base_url):
+    """返回 (内容, Content-Type, ETag, 最后修改时间)；来源表有变化时重新生成并保存
+
+    base_url 必须来自配置（site_url），每个地址保存一份。
+    """
+    artifact = ARTIFACTS[name]
+    version, changed_at = _source_state(conn, artifact)
+    select_sql = 'SELECT version, body, etag, last_modified FROM artifacts WHERE name = ? AND base_url = ?'
+    row = conn.execute(select_sql, (name, base_url)).fetchone()
+    if row is None or row[0] != version:
+        # 同时到达的请求只生成一次
+        with _lock:
+            row = conn.execute(select_sql, (name, base_url)).fetchone()
+            if row is None or row[0] != version:
+                body, etag, last_modified = _render(conn, artifact, base_url, changed_at)
+                conn.execute('INSERT OR REPLACE INTO artifacts (name, base_url, version, body, etag, last_modified, '
+                             'generated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (name, base_url, version, body, etag, last_modified, int(time.time())))
+                conn.commit()
+                row = (version, body, etag, last_modified)
+    _, body, etag, last_modified = row
+    return bytes(body), artifact.content_type, etag, datetime.fromtimestamp(last_modified, timezone.utc)
+
+
+def request_artifact(conn, name, host, url_root):
+    """请求中使用的产物：站点地址可由配置得出时取保存的内容，否则按请求地址生成（不保存）"""
+    base_url = site_url(host)
+    if base_url is not None:
+        return get_artifact(conn, name, base_url)
+    artifact = ARTIFACTS[name]
+    _, changed_at = _source_state(conn, artifact)
+    body, etag, last_modified = _render(conn, artifact, url_root, changed_at)
+    return body, artifact.content_type, etag, datetime.fromtimestamp(last_modified, timezone.utc)
+
+
+@job('syndication.warm', max_attempts=3)
+def warm(payload):
+    """重新生成已经生成过、来源表已有变化的产物"""
+    with pooled_connection() as conn:
+        for name, base_url in conn.execute('SELECT name, base_url FROM artifacts').fetchall():
+            if name in ARTIFACTS:
+                get_artifact(conn, name, base_url)
@@ -0,0 +1,132 @@
+"""
+标签索引
+
+各内容表的 tags（论文为 keywords）字段是逗号分隔的字符串，这里把它们规范化到 tags / item_tags 两张表：
+    tags       每个标签一行（名称不区分大小写）
+    item_tags  (tag_id, resource, item_id) 关联
+通过资源注册表写入时在同一事务内同步；批量导入和副本同步在提交后重建或补做。
+/api/tags 的计数和列表接口的 ?tag= 过滤都直接走索引。
+"""
+
+import re
+
+from database import get_db_connection, pooled_connection
+from resources import RESOURCES, after_commit, on_write
+
+# 中英文逗号、分号、顿号都视为分隔符
+_SEPARATORS = re.compile(r'[,，;；、]')
+
+TAGGED_RESOURCES = [r for r in RESOURCES if r.tag_column]
+
+
+def split_tags(value):
+    """拆分标签字符串：去除首尾空白、合并内部空白、按不区分大小写去重（保留首次出现的写法）"""
+    if not value:
+        return []
+    tags = []
+    seen = set()
+    for part in _SEPARATORS.split(str(value)):
+        tag = ' '.join(part.split())
+        if tag and tag.lower() not in seen:
+            seen.add(tag.lower())
+            tags.append(tag)
+    return tags
+
+
+def _tag_ids(conn, names):
+    """返回标签名对应的ID，不存在的标签会被创建"""
+    if not names:
+        return {}
+    conn.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', [(n,) for n in names])
+    placeholders = ', '.join('?' for _ in names)
+    return {row[1].lower(): row[0] for row in
+            conn.execute(f'SELECT id, name FROM tags WHERE name IN ({placeholders})', names).fetchall()}
+
+
+def _delete_orphans(conn, tag_ids=None):
+    """删除不再被任何内容引用的标签"""
+    if tag_ids is None:
+        conn.execute('DELETE FROM tags WHERE id NOT IN (SELECT tag_id FROM item_tags)')
+    elif tag_ids:
+        conn.executemany('DELETE FROM tags WHERE id = ? AND NOT EXISTS '
+                         '(SELECT 1 FROM item_tags WHERE tag_id = ?)', [(t, t) for t in tag_ids])
+
+
+def sync_item(conn, resource, item_id, value):
+    """按标签字符串同步单条记录的关联（value 为 None 表示记录已删除）"""
+    current = {row[0] for row in conn.execute(
+        'SELECT tag_id FROM item_tags WHERE resource = ? AND item_id = ?', (resource.name, item_id)).fetchall()}
+    wanted = set(_tag_ids(conn, split_tags(value)).values())
+    removed = current - wanted
+    if removed:
+        conn.executemany('DELETE FROM item_tags WHERE tag_id = ? AND resource = ? AND item_id = ?',
+                         [(t, resource.name, item_id) for t in removed])
+        _delete_orphans(conn, removed)
+    added = wanted - current
+    if added:
+        conn.executemany('INSERT OR IGNORE INTO item_tags (tag_id, resource, item_id) VALUES (?, ?, ?)',
+                         [(t, resource.name, item_id) for t in added])
+
+
+def rebuild(conn, resources=None):
+    """从标签字段重建索引（调用方负责提交），返回每个资源的关联数"""
+    counts = {}
+    for resource in resources or TAGGED_RESOURCES:
+        conn.execute('DELETE FROM item_tags WHERE resource = ?', (resource.name,))
+        rows = conn.execute(f'SELECT id, {resource.tag_column} FROM {resource.table} '
+                            f"WHERE {resource.tag_column} IS NOT NULL AND {resource.tag_column} != ''").fetchall()
+        parsed = [(item_id, split_tags(value)) for item_id, value in rows]
+        names = list({t.lower(): t for _, tags in parsed for t in tags}.values())
+        ids = {}
+        # 分批查询，避免超出 SQLite 的参数数量上限
+        for start in range(0, len(names), 500):
+            ids.update(_tag_ids(conn, names[start:start + 500]))
+        links = [(ids[t.lower()], resource.name, item_id) for item_id, tags in parsed for t in tags]
+        conn.executemany('INSERT OR IGNORE INTO item_tags (tag_id, resource, item_id) VALUES (?, ?, ?)', links)
+        counts[resource.name] = len(links)
+    _delete_orphans(conn)
+    return counts
+
+
+@on_write
+def _on_write(conn, resource, action, item_id, old, new):
+    if getattr(resource, 'tag_column', None):
+        sync_item(conn, resource, item_id, new[resource.tag_column] if new else None)
+
+
+@after_commit
+def _on_commit(resource, action, item_id):
+    if not getattr(resource, 'tag_column', None) or action not in ('import', 'replicate'):
+        return
+    with pooled_connection() as conn:
+        if item_id is None:
+            rebuild(conn, [resource])
+        else:
+            row = conn.execute(f'SELECT {resource.tag_column} FROM {resource.table} WHERE id = ?',
+                               (item_id,)).fetchone()
+            sync_item(conn, resource, item_id, row[0] if row else None)
+
+
+def tag_counts(conn, resource=None):
+    """每个标签的使用次数（按资源细分），按总数降序"""
+    sql = ('SELECT t.name, it.resource, COUNT(*) FROM item_tags it JOIN tags t ON t.id = it.tag_id'
+           + (' WHERE it.resource = ?' if resource else '') + ' GROUP BY it.tag_id, it.resource')
+    tags = {}
+    for name, res, count in conn.execute(sql, (resource,) if resource else ()).fetchall():
+        entry = tags.setdefault(name, {'name': name, 'count': 0, 'resources': {}})
+        entry['count'] += count
+        entry['resources'][res] = count
+    return sorted(tags.values(), key=lambda t: (-t['count'], t['name']))
+
+
+def init_tag_index():
+    """索引为空而内容表中已有标签时（首次升级或直接写库生成的数据）回填索引"""
+    conn = get_db_connection()
+    try:
+        if conn.execute('SELECT 1 FROM item_tags LIMIT 1').fetchone() is None:
+            counts = rebuild(conn)
+            conn.commit()
+            if any(counts.values()):
+                print(f"Tag index backfilled: {counts}")
+    finally:
+        conn.close()
@@ -0,0 +1,57 @@
+        // 真实用户性能数据：TTFB、FCP、LCP 和每次接口请求的耗时，攒够一批或页面隐藏时用 sendBeacon 发送到 /api/rum
+        const rum = (() => {
+            const enabled = {{ rum_enabled|tojson }} && 'sendBeacon' in navigator;
+            const page = {{ rum_page|tojson }};
+            const queue = [];
+            // 在后台标签页中打开的页面，绘制时间没有意义
+            const hiddenAtStart = document.visibilityState === 'hidden';
+            let lcp = null;
+
+            function record(metric, value, name) {
+                if (!enabled || !(value >= 0)) return;
+                queue.push({ metric, value: Math.round(value * 10) / 10, name });
+                if (queue.length >= 50) flush();
+            }
+
+            function flush() {
+                if (!queue.length) return;
+                navigator.sendBeacon(BASE_PATH + '/api/rum', JSON.stringify({ page, samples: queue.splice(0) }));
+            }
+
+            function observe(type, callback) {
+                try {
+                    new PerformanceObserver(list => list.getEntries().forEach(callback))
+                        .observe({ type, buffered: true });
+                } catch (error) {
+                    // 浏览器不支持该类型
+                }
+            }
+
+            if (enabled) {
+                const navigation = performance.getEntriesByType('navigation')[0];
+                if (navigation) record('ttfb', navigation.responseStart);
+                if (!hiddenAtStart) {
+                    observe('paint', entry => {
+                        if (entry.name === 'first-contentful-paint') record('fcp', entry.startTime);
+                    });
+                    // LCP 在页面首次隐藏时取最后一个候选值
+                    observe('largest-contentful-paint', entry => { lcp = entry.startTime; });
+                }
+                document.addEventListener('visibilitychange', () => {
+                    if (document.visibilityState !== 'hidden') return;
+                    if (lcp !== null) {
+                        record('lcp', lcp);
+                        lcp = null;
+                    }
+                    flush();
+                });
+                window.addEventListener('pagehide', flush);
+            }
+
+            return {
+                // 接口耗时（毫秒），url 为不含站点前缀的接口路径
+                api(url, duration) {
+                    record('api', duration, url);
+                }
+            };
+        })();
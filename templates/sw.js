@@ -0,0 +1,160 @@
+// 学术主页 Service Worker：页面外壳和接口数据的离线缓存（stale-while-revalidate）
+// 接口缓存按服务器的内容版本号判断是否过期，版本号未变化时不发任何请求
+
+const BASE = {{ base|tojson }};
+const SHELL_CACHE = 'homepage-shell-v1';
+const API_CACHE = 'homepage-api-v1';
+const META_CACHE = 'homepage-meta-v1';
+const CACHES = [SHELL_CACHE, API_CACHE, META_CACHE];
+const VERSION_HEADER = {{ version_header|tojson }};
+const VERSION_KEY = BASE + '/__content-version';
+// 登录状态、验证码、推送、版本号等接口不缓存
+const API_BYPASS = ['/api/version', '/api/events', '/api/check-auth', '/api/captcha', '/api/changes',
+                    '/api/export', '/api/admin'];
+// 同一域名下不归本站点管理的路径（路径模式多站点的其他站点）
+const EXCLUDED = {{ excluded|tojson }};
+
+const revalidating = new Map();
+let contentVersion;
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then(cache => cache.add(BASE + '/'))
+            .catch(() => {})
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(key => !CACHES.includes(key)).map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        // 第三方样式、脚本、字体（CDN）
+        if (['script', 'style', 'font'].includes(request.destination)) {
+            event.respondWith(staleWhileRevalidate(event, SHELL_CACHE));
+        }
+        return;
+    }
+    if (url.pathname !== BASE && !url.pathname.startsWith(BASE + '/')) return;
+    const path = url.pathname.slice(BASE.length) || '/';
+    if (EXCLUDED.some(prefix => path.startsWith(prefix))) return;
+
+    if (request.mode === 'navigate') {
+        if (path === '/') event.respondWith(staleWhileRevalidate(event, SHELL_CACHE));
+        return;
+    }
+    if (path.startsWith('/static/') || path.startsWith('/media/')) {
+        event.respondWith(staleWhileRevalidate(event, SHELL_CACHE));
+    } else if (path.startsWith('/api/') && !API_BYPASS.some(prefix => path.startsWith(prefix))) {
+        event.respondWith(apiResponse(event, path));
+    }
+});
+
+// 页面把最新的内容版本号发过来：记录下来，并在后台更新所有过期的接口缓存
+self.addEventListener('message', event => {
+    const data = event.data || {};
+    if (data.type === 'content-version' && data.version) {
+        event.waitUntil(setContentVersion(String(data.version)).then(revalidateStale));
+    }
+});
+
+async function staleWhileRevalidate(event, cacheName) {
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(event.request);
+    const network = fetch(event.request).then(response => {
+        if (response.ok || response.type === 'opaque') {
+            return cache.put(event.request, response.clone()).then(() => response);
+        }
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(network.catch(() => {}));
+        return cached;
+    }
+    return network;
+}
+
+// 只缓存前台主页发出的接口请求，管理后台总是直接访问服务器
+async function fromHomepage(event) {
+    const client = event.clientId ? await self.clients.get(event.clientId) : null;
+    return !!client && new URL(client.url).pathname === BASE + '/';
+}
+
+async function apiResponse(event, path) {
+    if (!(await fromHomepage(event))) return fetch(event.request);
+    const cache = await caches.open(API_CACHE);
+    const cached = await cache.match(event.request);
+    if (!cached) {
+        const response = await fetch(event.request);
+        if (response.ok) await cache.put(event.request, response.clone());
+        return response;
+    }
+    const version = await getContentVersion();
+    if (!version || cached.headers.get(VERSION_HEADER) !== version) {
+        event.waitUntil(revalidate(event.request.url, cached));
+    }
+    return cached;
+}
+
+// 重新获取一个接口，内容有变化时通知所有页面
+function revalidate(url, cached) {
+    if (revalidating.has(url)) return revalidating.get(url);
+    const task = (async () => {
+        try {
+            const response = await fetch(url, { credentials: 'same-origin' });
+            if (!response.ok) return;
+            const cache = await caches.open(API_CACHE);
+            const [body, oldBody] = await Promise.all([response.clone().text(), cached.clone().text()]);
+            await cache.put(url, response);
+            if (body !== oldBody) {
+                const path = new URL(url).pathname.slice(BASE.length);
+                const clients = await self.clients.matchAll({ type: 'window' });
+                clients.forEach(client => client.postMessage({ type: 'content-updated', path }));
+            }
+        } catch (error) {
+            // 离线时保留旧缓存
+        } finally {
+            revalidating.delete(url);
+        }
+    })();
+    revalidating.set(url, task);
+    return task;
+}
+
+async function revalidateStale() {
+    const version = await getContentVersion();
+    const cache = await caches.open(API_CACHE);
+    const requests = await cache.keys();
+    await Promise.all(requests.map(async request => {
+        const cached = await cache.match(request);
+        if (cached && cached.headers.get(VERSION_HEADER) !== version) {
+            await revalidate(request.url, cached);
+        }
+    }));
+}
+
+async function getContentVersion() {
+    if (contentVersion === undefined) {
+        const cache = await caches.open(META_CACHE);
+        const stored = await cache.match(VERSION_KEY);
+        contentVersion = stored ? await stored.text() : null;
+    }
+    return contentVersion;
+}
+
+async function setContentVersion(version) {
+    contentVersion = version;
+    const cache = await caches.open(META_CACHE);
+    await cache.put(VERSION_KEY, new Response(version));
+}
@@ -0,0 +1,219 @@
+"""
+多站点托管
+
+一个进程同时服务多个学术主页，每个站点一个独立的 SQLite 文件：TENANTS_DIR/<站点名>.db。
+TENANT_MODE 决定如何从请求确定站点：
+    host  按域名：设置了 TENANT_DOMAIN=homepages.example.edu 时 alice.homepages.example.edu → alice，
+          其他域名整体作为站点名（www.alice-lab.org → tenants/www.alice-lab.org.db）
+    path  按路径前缀：/~alice/api/profile → 站点 alice，前缀之后的部分交给正常路由；
+          SCRIPT_NAME 设为 /~alice，页面中的接口地址据此加上前缀
+没有指向任何站点的请求（TENANT_DOMAIN 本身、不带前缀的路径）使用默认数据库 DATABASE_PATH；
+站点文件不存在时返回 404。站点只能通过 run.py tenant create 创建，任意 Host 头不会在磁盘上创建文件。
+
+站点在首次被访问时才初始化（建表和迁移、默认资料、标签索引、统计表、相关推荐检查），
+最近使用的 TENANT_CACHE_SIZE 个站点的状态保存在 LRU 中，被淘汰的站点再次访问时重新初始化（初始化是幂等的）；
+淘汰时调用 on_evict 注册的钩子，释放为该站点保留的后台状态。
+连接由 database.pooled_connection 按线程复用，每个线程最多保留 TENANT_CONNECTIONS_PER_THREAD 个，
+站点连接的页缓存为 TENANT_PAGE_CACHE_KB，打开的文件数（每个连接 3 个：数据库、WAL、共享内存）
+和缓存占用的内存都与工作线程数成正比，而与站点总数无关。
+"""
+
+import contextvars
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from flask import g, jsonify, request
+
+import database
+
+# 站点路由方式：空（单站点）、host、path
+TENANT_MODE = os.environ.get('TENANT_MODE', '')
+TENANTS_DIR = os.environ.get('TENANTS_DIR', 'tenants')
+TENANT_DOMAIN = os.environ.get('TENANT_DOMAIN', '').strip('.').lower()
+TENANT_PATH_PREFIX = os.environ.get('TENANT_PATH_PREFIX', '/~')
+# 保留初始化状态的站点数
+TENANT_CACHE_SIZE = int(os.environ.get('TENANT_CACHE_SIZE', '256'))
+
+# 站点名：小写字母、数字、连字符，可以是多级域名
+_NAME = re.compile(r'^[a-z0-9](?:[a-z0-9-]*[a-z0-9])?(?:\.[a-z0-9](?:[a-z0-9-]*[a-z0-9])?)*$')
+MAX_NAME_LENGTH = 253
+# 路径模式下中间件把站点名写入 WSGI environ 的键
+ENVIRON_KEY = 'homepage.tenant'
+
+_current = contextvars.ContextVar('tenant', default=None)
+# 站点被淘汰出 LRU 时调用的函数：fn(name, path)
+_evict_hooks = []
+
+
+def valid_name(name):
+    return bool(name) and len(name) <= MAX_NAME_LENGTH and _NAME.match(name) is not None
+
+
+def tenant_path(name, directory=None):
+    """站点数据库文件路径"""
+    if not valid_name(name):
+        raise ValueError(f'Invalid site name: {name!r}')
+    return os.path.join(directory or TENANTS_DIR, f'{name}.db')
+
+
+def list_tenants(directory=None):
+    """已创建的站点名（按名称排序）"""
+    directory = directory or TENANTS_DIR
+    if not os.path.isdir(directory):
+        return []
+    return sorted(entry[:-3] for entry in os.listdir(directory)
+                  if entry.endswith('.db') and valid_name(entry[:-3]))
+
+
+def on_evict(fn):
+    """注册站点淘汰钩子（装饰器）：为站点保留的后台状态（任务轮询等）随站点一起释放"""
+    _evict_hooks.append(fn)
+    return fn
+
+
+def current_tenant():
+    """当前上下文的站点名，默认站点为 None"""
+    return _current.get()
+
+
+@contextmanager
+def activate(name, path):
+    """在 with 块内切换到指定站点（数据库文件和站点名）"""
+    token = _current.set(name)
+    try:
+        with database.use_database(path):
+            yield
+    finally:
+        _current.reset(token)
+
+
+class Tenant:
+    __slots__ = ('name', 'path', 'lock', 'initialized')
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.lock = threading.Lock()
+        self.initialized = False
+
+
+class TenantRegistry:
+    """站点注册表：LRU 保存最近使用的站点，首次访问时调用 initializer 初始化"""
+
+    def __init__(self, initializer, size=TENANT_CACHE_SIZE, directory=None):
+        self._initializer = initializer
+        self._size = size
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._tenants = OrderedDict()
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def get(self, name):
+        """返回已初始化的站点；站点不存在时返回 None"""
+        evicted = []
+        with self._lock:
+            tenant = self._tenants.get(name)
+            if tenant is None:
+                path = tenant_path(name, self._directory)
+                if not os.path.exists(path):
+                    return None
+                tenant = self._tenants[name] = Tenant(name, path)
+                while len(self._tenants) > self._size:
+                    evicted.append(self._tenants.popitem(last=False)[1])
+            else:
+                self._tenants.move_to_end(name)
+        for old in evicted:
+            for hook in _evict_hooks:
+                hook(old.name, old.path)
+        if not tenant.initialized:
+            # 每个站点单独加锁，初始化较慢的站点不影响其他站点的请求
+            with tenant.lock:
+                if not tenant.initialized:
+                    with activate(tenant.name, tenant.path):
+                        self._initializer()
+                    tenant.initialized = True
+        return tenant
+
+
+class PathPrefixMiddleware:
+    """路径模式：把 /~alice/rest 拆成 SCRIPT_NAME=/~alice、PATH_INFO=/rest"""
+
+    def __init__(self, wsgi_app, prefix=TENANT_PATH_PREFIX):
+        self.wsgi_app = wsgi_app
+        self.prefix = prefix
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(self.prefix):
+            name, _, rest = path[len(self.prefix):].partition('/')
+            if name:
+                environ[ENVIRON_KEY] = name
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + self.prefix + name
+                environ['PATH_INFO'] = '/' + rest
+        return self.wsgi_app(environ, start_response)
+
+
+def tenant_from_host(host):
+    """域名模式下由 Host 头得到站点名；TENANT_DOMAIN 本身返回 None（默认站点）"""
+    host = host.lower()
+    if host.startswith('['):
+        host = host.split(']')[0] + ']'
+    else:
+        host = host.rsplit(':', 1)[0]
+    host = host.rstrip('.')
+    if TENANT_DOMAIN:
+        if host == TENANT_DOMAIN:
+            return None
+        if host.endswith('.' + TENANT_DOMAIN):
+            return host[:-len(TENANT_DOMAIN) - 1]
+    return host
+
+
+registry = None
+
+
+def requested_tenant():
+    """当前请求指向的站点名（不检查站点是否存在）；单站点模式或默认站点返回 None"""
+    if not TENANT_MODE:
+        return None
+    if TENANT_MODE == 'path':
+        return request.environ.get(ENVIRON_KEY)
+    return tenant_from_host(request.host)
+
+
+def _before_request():
+    name = requested_tenant()
+    if name is None:
+        return None
+    tenant = registry.get(name) if valid_name(name) else None
+    if tenant is None:
+        return jsonify({'error': 'Site not found'}), 404
+    scope = ExitStack()
+    scope.enter_context(activate(tenant.name, tenant.path))
+    g._tenant_scope = scope
+    return None
+
+
+def _teardown_request(exc):
+    scope = g.pop('_tenant_scope', None)
+    if scope is not None:
+        scope.close()
+
+
+def init_tenants(app, initializer):
+    """启用多站点模式（TENANT_MODE 为空时不做任何事）；initializer 在每个站点首次访问时调用"""
+    global registry
+    if not TENANT_MODE:
+        return
+    if TENANT_MODE not in ('host', 'path'):
+        raise ValueError(f'Unknown TENANT_MODE: {TENANT_MODE}')
+    registry = TenantRegistry(initializer)
+    if TENANT_MODE == 'path':
+        app.wsgi_app = PathPrefixMiddleware(app.wsgi_app, TENANT_PATH_PREFIX)
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,128 @@
+"""
+只读副本同步的往返测试：主节点导出 → 副本全量初始化 → 增量变更
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def primary(tmp_path_factory):
+    """在临时目录中启动主节点（真实 HTTP 服务），返回 (地址, 主节点数据库路径)"""
+    workdir = tmp_path_factory.mktemp('primary')
+    os.makedirs(workdir / 'static' / 'uploads', exist_ok=True)
+    os.environ.update(WERKZEUG_RUN_MAIN='false', RUM='0', IMAGE_PROXY='0')
+    os.environ.pop('REPLICATION_TOKEN', None)
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    import database
+    database.DATABASE_PATH = str(workdir / 'primary.db')
+    from app import app
+    from data_generator import generate_data, resolve_counts
+    from werkzeug.serving import make_server
+
+    app.config['RATE_LIMIT_ENABLED'] = False
+    generate_data(resolve_counts('small-lab'), seed=7)
+    with database.pooled_connection() as conn:
+        # 主节点上为空的表也要在副本上清空
+        conn.execute('DELETE FROM awards')
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}', database.DATABASE_PATH
+    server.shutdown()
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def replica_db(tmp_path):
+    """已有过期内容的副本数据库"""
+    import database
+    path = str(tmp_path / 'replica.db')
+    with database.use_database(path):
+        database.init_database()
+        with database.pooled_connection() as conn:
+            conn.execute("INSERT INTO awards (title) VALUES ('Stale award')")
+            conn.execute("INSERT INTO publications (title, authors) VALUES ('Stale paper', 'Nobody')")
+    return path
+
+
+def _table_rows(path, table):
+    import database
+    with database.use_database(path), database.pooled_connection() as conn:
+        return [tuple(row) for row in conn.execute(f'SELECT * FROM {table} ORDER BY id').fetchall()]
+
+
+def test_bootstrap_then_changes_round_trip(primary, replica_db):
+    import database
+    import transfer
+    from replica import Replica
+    from resources import PUBLICATIONS, notify_commit
+
+    url, primary_db = primary
+    replica = Replica(url, wait=0)
+    with database.use_database(replica_db):
+        seq = replica.sync()
+        assert replica.last_seq() == seq
+
+    for table in transfer.EXPORT_TABLES:
+        assert _table_rows(replica_db, table) == _table_rows(primary_db, table), table
+    assert _table_rows(replica_db, 'awards') == []
+
+    with database.use_database(primary_db), database.pooled_connection() as conn:
+        item_id = PUBLICATIONS.create(conn, {'title': 'Fresh paper', 'authors': 'Dr. Academic'})
+    notify_commit(PUBLICATIONS, 'create', item_id)
+
+    with database.use_database(replica_db):
+        new_seq = replica.sync()
+    assert new_seq > seq
+    assert _table_rows(replica_db, 'publications') == _table_rows(primary_db, 'publications')
+
+
+def test_truncated_snapshot_leaves_replica_untouched(primary, replica_db, monkeypatch):
+    import database
+    import transfer
+    from replica import Replica
+
+    url, _ = primary
+    replica = Replica(url, wait=0)
+    before = {table: _table_rows(replica_db, table) for table in transfer.EXPORT_TABLES}
+
+    original_open = Replica._open
+
+    def truncated_open(self, path, params=None, timeout=None):
+        response = original_open(self, path, params, timeout)
+        if path != '/api/changes/snapshot':
+            return response
+        lines = response.read().splitlines(keepends=True)
+        response.close()
+        return _Lines(lines[:len(lines) // 2])
+
+    monkeypatch.setattr(Replica, '_open', truncated_open)
+    with database.use_database(replica_db):
+        with pytest.raises(transfer.ImportFormatError):
+            replica.bootstrap()
+        assert replica.last_seq() is None
+
+    assert {table: _table_rows(replica_db, table) for table in transfer.EXPORT_TABLES} == before
+    leftovers = [name for name in os.listdir(os.path.dirname(replica_db)) if '.bootstrap-' in name]
+    assert leftovers == []
+
+
+class _Lines(list):
+    """模拟中途断开的响应：可迭代的行列表，支持 with 语句"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
@@ -0,0 +1,215 @@
+"""
+全库 NDJSON 流式导出与导入
+
+导出格式（每行一个 JSON 对象）：
+    {"type": "header", "format": "academic-homepage-ndjson", "version": 1, "exported_at": "...", "tables": [...], "seq": 42}
+    {"type": "row", "table": "publications", "data": {...}}
+    ...
+    {"type": "end", "rows": 1234}
+
+导出时逐行读取游标，不会把整张表载入内存；导入时按批次写入，内存占用只与批大小有关。
+导入要求流以 end 记录结束且行数一致，传输中断的文件会被拒绝。
+管理员账户（users 表）不在导出范围内。
+header 中的 seq 是导出时刻变更日志的位置，只读副本用全量导出初始化后从这里开始拉取增量。
+"""
+
+import json
+from datetime import datetime
+
+import changelog
+from database import get_db_connection
+from resources import REGISTRY, SQLITE_JSON_AVAILABLE, notify_commit
+
+FORMAT_NAME = 'academic-homepage-ndjson'
+FORMAT_VERSION = 1
+
+# 导出顺序：单条记录在前，列表型内容在后
+EXPORT_TABLES = ['profile', 'settings', 'education', 'publications', 'projects', 'experience', 'awards', 'friends']
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class ImportFormatError(ValueError):
+    """导入数据格式错误"""
+
+
+def table_columns(conn, table):
+    """读取表的实际字段（按定义顺序）"""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+
+
+def _row_lines(conn, table, columns):
+    """逐行产出某张表的 NDJSON 行"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    if SQLITE_JSON_AVAILABLE:
+        # 每行 JSON 直接在 SQLite 中生成
+        fields = ', '.join(f"'{c}', {c}" for c in columns)
+        sql = (f"SELECT json_object('type', 'row', 'table', '{table}', 'data', json_object({fields})) "
+               f"FROM {table} ORDER BY id")
+        for (line,) in cursor.execute(sql):
+            yield line + '\n'
+    else:
+        for row in cursor.execute(f'SELECT {", ".join(columns)} FROM {table} ORDER BY id'):
+            yield json.dumps({'type': 'row', 'table': table, 'data': dict(zip(columns, row))},
+                             ensure_ascii=False) + '\n'
+
+
+def iter_export(tables=None):
+    """生成导出流（逐行产出字符串）
+
+    整个导出在同一个读事务中完成，保证各表数据来自同一时刻的快照；
+    数据库使用 WAL 模式，导出期间写操作不会被阻塞。
+    """
+    tables = tables or EXPORT_TABLES
+    unknown = [t for t in tables if t not in EXPORT_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN')
+        yield json.dumps({
+            'type': 'header', 'format': FORMAT_NAME, 'version': FORMAT_VERSION,
+            'exported_at': datetime.now().isoformat(timespec='seconds'), 'tables': tables,
+            'seq': changelog.current_seq(conn),
+        }, ensure_ascii=False) + '\n'
+
+        total = 0
+        for table in tables:
+            for line in _row_lines(conn, table, table_columns(conn, table)):
+                total += 1
+                yield line
+        yield json.dumps({'type': 'end', 'rows': total}) + '\n'
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def export_to_file(fileobj, tables=None):
+    """把导出流写入文本文件对象，返回写入的行数"""
+    count = 0
+    for line in iter_export(tables):
+        fileobj.write(line)
+        count += 1
+    return count
+
+
+def import_ndjson(lines, mode='merge', batch_size=DEFAULT_BATCH_SIZE, record_changes=True, notify=True):
+    """导入 NDJSON 流
+
+    lines 可以是任意逐行产出 str 或 bytes 的可迭代对象（文件、请求流等）。
+    mode='merge'   按 id 覆盖或新增记录，保留导入数据中没有的记录；每 batch_size 行提交一次事务，
+                   中途失败时已提交的批次保留（按 id 合并，重新导入同一文件即可补齐）
+    mode='replace' 清空 header 中列出的所有表（包括导出时为空的表）后再写入，整个导入在一个事务中完成，
+                   失败时数据库保持原样
+    流必须以 end 记录结束且其中的行数与读到的行数一致，否则视为数据不完整（例如传输中断）并报错，
+    最后一批不会写入。
+    record_changes 为真时导入的行同时写入变更日志（只读副本初始化时关闭）。
+    notify 为假时不运行提交后钩子（导入到临时数据库时由调用方在数据生效后自行通知）。
+    返回每张表导入的行数。
+    """
+    if mode not in ('merge', 'replace'):
+        raise ValueError("mode must be 'merge' or 'replace'")
+
+    conn = get_db_connection()
+    counts = {}
+    columns_cache = {}
+    pending = {}
+    pending_rows = 0
+    total_rows = 0
+    header_seen = False
+    end_record = None
+    # 已写入数据库（已提交）的表，失败时也要为它们运行提交后钩子
+    committed = set()
+    written = set()
+
+    def flush(commit):
+        nonlocal pending_rows
+        for (table, columns), rows in pending.items():
+            placeholders = ', '.join('?' for _ in columns)
+            conn.executemany(f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', rows)
+            if record_changes:
+                # 没有 id 字段时无法定位新行，记录整张表
+                ids = [row[columns.index('id')] for row in rows] if 'id' in columns else None
+                changelog.record_rows(conn, table, ids)
+            written.add(table)
+        if commit:
+            conn.commit()
+            committed.update(written)
+        pending.clear()
+        pending_rows = 0
+
+    try:
+        for line_no, raw in enumerate(lines, 1):
+            if isinstance(raw, bytes):
+                raw = raw.decode('utf-8')
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                raise ImportFormatError(f'Line {line_no}: invalid JSON')
+
+            kind = record.get('type')
+            if not header_seen:
+                if kind != 'header' or record.get('format') != FORMAT_NAME:
+                    raise ImportFormatError('Missing export header')
+                if record.get('version', 0) > FORMAT_VERSION:
+                    raise ImportFormatError(f"Unsupported format version {record.get('version')}")
+                header_seen = True
+                if mode == 'replace':
+                    tables = record.get('tables')
+                    if not isinstance(tables, list) or any(t not in EXPORT_TABLES for t in tables):
+                        raise ImportFormatError('Invalid table list in export header')
+                    for table in tables:
+                        conn.execute(f'DELETE FROM {table}')
+                        if record_changes:
+                            changelog.record_truncate(conn, table)
+                        counts[table] = 0
+                        written.add(table)
+                continue
+            if kind == 'end':
+                end_record = record
+                break
+            if kind != 'row':
+                continue
+
+            table = record.get('table')
+            if table not in EXPORT_TABLES:
+                raise ImportFormatError(f'Line {line_no}: unknown table {table!r}')
+            if mode == 'replace' and table not in counts:
+                raise ImportFormatError(f'Line {line_no}: table {table!r} not listed in export header')
+
+            if table not in columns_cache:
+                columns_cache[table] = set(table_columns(conn, table))
+                counts.setdefault(table, 0)
+
+            data = record.get('data') or {}
+            # 只写入当前表结构中存在的字段，兼容旧版本导出的数据
+            columns = tuple(c for c in data if c in columns_cache[table])
+            pending.setdefault((table, columns), []).append(tuple(data[c] for c in columns))
+            counts[table] += 1
+            total_rows += 1
+            pending_rows += 1
+            if pending_rows >= batch_size:
+                flush(commit=mode == 'merge')
+
+        if not header_seen:
+            raise ImportFormatError('Empty import stream')
+        if end_record is None:
+            raise ImportFormatError(f'Import stream ended without end record after {total_rows} rows (truncated?)')
+        if end_record.get('rows') != total_rows:
+            raise ImportFormatError(f"End record expects {end_record.get('rows')} rows, got {total_rows}")
+        flush(commit=True)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+        # 提交后钩子（标签索引、统计、订阅等派生数据）只针对确实提交了的表
+        for table in EXPORT_TABLES:
+            if notify and table in committed:
+                notify_commit(REGISTRY[table], 'import', None)
+    return counts